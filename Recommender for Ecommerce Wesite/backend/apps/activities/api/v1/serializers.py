@@ -1,12 +1,16 @@
 from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
 from django.utils import timezone
+from ...conf import ingest_setting
 
 ACTION_CHOICES = ("view", "add_to_cart", "checkout", "purchase")
+# UserActivity.BookID is a signed 32-bit INT
+MAX_BOOK_ID = 2 ** 31 - 1
 
 class ActivityIn(serializers.Serializer):
-    book_id = serializers.IntegerField()
+    book_id = serializers.IntegerField(min_value=1, max_value=MAX_BOOK_ID)
     action = serializers.ChoiceField(choices=ACTION_CHOICES)
-    activity_time = serializers.DateTimeField(required=False)
+    activity_time = serializers.DateTimeField(required=False, allow_null=True)
 
     def to_internal_value(self, data):
         v = super().to_internal_value(data)
@@ -14,5 +18,56 @@ class ActivityIn(serializers.Serializer):
         v["activity_time"] = v.get("activity_time") or timezone.now()
         return v
 
+# ActivityIn's own fields, bound once: bulk and stream events are checked
+# against them directly, without building a serializer per event
+EVENT_FIELDS = ActivityIn().fields
+
+
+def check_event(e):
+    """The ActivityIn checks for one event as a plain dict; returns (value, errors)."""
+    if not isinstance(e, dict):
+        return None, {"non_field_errors": ["Expected an object."]}
+    value, errors = {}, {}
+    for name, field in EVENT_FIELDS.items():
+        try:
+            value[name] = field.run_validation(e.get(name, empty))
+        except serializers.ValidationError as exc:
+            errors[name] = exc.detail
+        except SkipField:
+            pass
+    if errors:
+        return None, errors
+    value["activity_time"] = value.get("activity_time") or timezone.now()
+    return value, None
+
+
+class ActivityStatsIn(serializers.Serializer):
+    book_id = serializers.IntegerField(required=False)
+    action = serializers.ChoiceField(choices=ACTION_CHOICES, required=False)
+    days = serializers.IntegerField(min_value=1, max_value=366, default=30)
+    granularity = serializers.ChoiceField(choices=("day", "hour"), default="day")
+
+    def validate(self, attrs):
+        if attrs["granularity"] == "hour" and attrs["days"] > 7:
+            raise serializers.ValidationError("Hourly series are limited to 7 days.")
+        return attrs
+
 class ActivityBulkIn(serializers.Serializer):
-    events = ActivityIn(many=True)
+    # items are checked by validate_events in one pass instead of one nested
+    # ActivityIn per event, which dominated the cost of large batches
+    events = serializers.ListField(allow_empty=False)
+
+    def validate_events(self, events):
+        limit = ingest_setting('BULK_MAX_EVENTS')
+        if len(events) > limit:
+            raise serializers.ValidationError(f"Too many events (max {limit}).")
+        valid, errors = [], {}
+        for i, e in enumerate(events):
+            value, error = check_event(e)
+            if error:
+                errors[i] = error
+            else:
+                valid.append(value)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return valid
@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import create_activity, create_activity_bulk
+from .views import create_activity, create_activity_bulk, create_activity_stream, ingest_status, activity_stats
 
 urlpatterns = [
     path("", create_activity, name="activity-create"),
     path("bulk/", create_activity_bulk, name="activity-bulk-create"),
+    path("stream/", create_activity_stream, name="activity-stream-create"),
+    path("ingest-status/", ingest_status, name="activity-ingest-status"),
+    path("stats/", activity_stats, name="activity-stats"),
 ]
@@ -1,16 +1,33 @@
+import json
+from datetime import timedelta
+from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiResponse
-from ...services.log_activity import log_event
-from .serializers import ActivityIn, ActivityBulkIn
+from apps.common.permissions import IsStaff
+from ...services.ingest import ingest_stats
+from ...services.log_activity import ActivityNotRecorded, log_event, log_event_stream, log_events
+from ...services.rollups import event_counts, event_series, watermark
+from .serializers import ActivityIn, ActivityBulkIn, ActivityStatsIn, check_event
+
+NDJSON = "application/x-ndjson"
+# longest accepted line; one event is well under 1 KB
+MAX_LINE_BYTES = 64 * 1024
+# rejected lines listed in the response (all of them are counted)
+MAX_REPORTED_ERRORS = 100
 
 @extend_schema(
     summary="Create one activity (requires login)",
     tags=["Activities"],
     request=ActivityIn,
-    responses={201: OpenApiResponse(description="Created, returns id")}
+    responses={
+        201: OpenApiResponse(description="Created, returns id"),
+        202: OpenApiResponse(description="Queued for a buffered write (ACTIVITY_INGEST mode 'buffered')"),
+        200: OpenApiResponse(description="Repeat of a recent identical event, not written"),
+        503: OpenApiResponse(description="Could not be written, queued or spooled; retry later"),
+    }
 )
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -31,13 +48,21 @@ def create_activity(request):
     if hasattr(request, "session") and request.session.session_key is None:
         request.session.create()
 
-    ua = log_event(
-        customer_id=customer_id,
-        book_id=serializer.validated_data["book_id"],
-        action=serializer.validated_data["action"],
-        session_id=request.session.session_key if hasattr(request, "session") else None,
-        when=serializer.validated_data["activity_time"],
-    )
+    try:
+        ua = log_event(
+            customer_id=customer_id,
+            book_id=serializer.validated_data["book_id"],
+            action=serializer.validated_data["action"],
+            session_id=request.session.session_key if hasattr(request, "session") else None,
+            when=serializer.validated_data["activity_time"],
+        )
+    except ActivityNotRecorded:
+        return Response({"detail": "Activity could not be recorded, retry later"},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if ua is None:
+        return Response({"id": None, "duplicate": True}, status=status.HTTP_200_OK)
+    if ua.ActivityID is None:
+        return Response({"id": None, "queued": True}, status=status.HTTP_202_ACCEPTED)
     return Response({"id": ua.ActivityID}, status=status.HTTP_201_CREATED)
 
 
@@ -45,7 +70,7 @@ def create_activity(request):
     summary="Create many activities in bulk (requires login)",
     tags=["Activities"],
     request=ActivityBulkIn,
-    responses={201: OpenApiResponse(description="Created count")}
+    responses={201: OpenApiResponse(description="Created count and per-chunk INSERT timings")}
 )
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -64,19 +89,135 @@ def create_activity_bulk(request):
         request.session.create()
     sid = request.session.session_key if hasattr(request, "session") else None
 
-    items = serializer.validated_data["events"]
-    if len(items) > 500:
-        return Response({"detail": "Too many events"}, status=status.HTTP_400_BAD_REQUEST)
+    # size cap (ACTIVITY_INGEST['BULK_MAX_EVENTS']) is enforced by the serializer
+    created, chunks = log_events(
+        customer_id=customer_id,
+        events=serializer.validated_data["events"],
+        session_id=sid,
+    )
+    return Response({"created": created, "chunks": chunks}, status=status.HTTP_201_CREATED)
 
-    created = 0
-    for e in items:
-        log_event(
-            customer_id=customer_id,
-            book_id=e["book_id"],
-            action=e["action"],
-            session_id=sid,
-            when=e["activity_time"],
-        )
-        created += 1
 
-    return Response({"created": created}, status=status.HTTP_201_CREATED)
+def _ndjson_events(stream, report):
+    """Yield validated events from an NDJSON body, reading one line at a time.
+
+    Invalid lines are skipped and recorded in ``report``.
+    """
+    def reject(line_no, error):
+        report["rejected"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_no, "errors": error})
+
+    line_no = 0
+    while stream is not None:
+        line = stream.readline(MAX_LINE_BYTES + 1)
+        if not line:
+            return
+        line_no += 1
+        if len(line) > MAX_LINE_BYTES and not line.endswith(b"\n"):
+            # skip the rest of an over-long line without buffering it
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(MAX_LINE_BYTES)
+            reject(line_no, {"non_field_errors": [f"Line longer than {MAX_LINE_BYTES} bytes."]})
+            continue
+        if not line.strip():
+            continue
+        try:
+            e = json.loads(line)
+        except ValueError:
+            reject(line_no, {"non_field_errors": ["Invalid JSON."]})
+            continue
+        value, error = check_event(e)
+        if error:
+            reject(line_no, error)
+        else:
+            yield value
+
+
+@extend_schema(
+    summary="Stream activities as NDJSON, one event per line (requires login)",
+    description=(
+        "Body is `application/x-ndjson`: one ActivityIn object per line. The body is read "
+        "incrementally and written in batches of ACTIVITY_INGEST['BULK_CHUNK_SIZE'] rows, "
+        "so upload size is not limited by memory. Invalid lines are skipped and reported."
+    ),
+    tags=["Activities"],
+    request={NDJSON: {"type": "string", "format": "binary"}},
+    responses={
+        201: OpenApiResponse(description="Created and rejected counts, first rejected lines"),
+        415: OpenApiResponse(description="Content-Type is not application/x-ndjson"),
+    }
+)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def create_activity_stream(request):
+    customer_id = getattr(request.user, 'id', None)
+    if customer_id is None:
+        customer_id = request.session.get("customer_id")
+    if customer_id is None:
+        return Response({"detail": "Login required"}, status=status.HTTP_401_UNAUTHORIZED)
+    if request.content_type.split(";")[0].strip() != NDJSON:
+        return Response({"detail": f"Content-Type must be {NDJSON}"}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    if hasattr(request, "session") and request.session.session_key is None:
+        request.session.create()
+    sid = request.session.session_key if hasattr(request, "session") else None
+
+    # request.data is never touched: DRF would read and parse the whole body
+    report = {"rejected": 0, "errors": []}
+    created, batches = log_event_stream(
+        customer_id=customer_id,
+        events=_ndjson_events(request.stream, report),
+        session_id=sid,
+    )
+    return Response({"created": created, "batches": batches, **report}, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    summary="Activity ingestion counters of this worker process (staff only)",
+    tags=["Activities"],
+    responses={200: OpenApiResponse(description="Queue depth, flush latency, dropped events")}
+)
+@api_view(["GET"])
+@permission_classes([IsStaff])
+def ingest_status(request):
+    return Response(ingest_stats())
+
+
+@extend_schema(
+    summary="Activity counts from the hourly/daily rollups (staff only)",
+    description=(
+        "Reads activityrollup_daily / activityrollup_hourly, never raw UserActivity. "
+        "Counts cover rows up to the rollup watermark (update_rollups)."
+    ),
+    tags=["Activities"],
+    parameters=[ActivityStatsIn],
+    responses={200: OpenApiResponse(description="Totals per action and a time series")}
+)
+@api_view(["GET"])
+@permission_classes([IsStaff])
+def activity_stats(request):
+    q = ActivityStatsIn(data=request.query_params)
+    q.is_valid(raise_exception=True)
+    p = q.validated_data
+    until = timezone.now()
+    since = until - timedelta(days=p["days"])
+    book_ids = [p["book_id"]] if "book_id" in p else None
+    actions = [p["action"]] if "action" in p else None
+
+    by_action = {}
+    for (_, action), n in event_counts(since, until, book_ids, actions).items():
+        by_action[action] = by_action.get(action, 0) + n
+    last_id, updated_at = watermark()
+    return Response({
+        "since": since,
+        "until": until,
+        "granularity": p["granularity"],
+        "total": sum(by_action.values()),
+        "by_action": by_action,
+        "series": [
+            {"bucket": bucket, "count": n}
+            for bucket, n in event_series(since, until, p["granularity"], book_ids, actions)
+        ],
+        "watermark": {"activity_id": last_id, "updated_at": updated_at},
+    })
@@ -0,0 +1,25 @@
+from django.conf import settings
+
+DEFAULTS = {
+    'MODE': 'sync',
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'BULK_MAX_EVENTS': 20000,
+    'BULK_CHUNK_SIZE': 1000,
+    'ARCHIVE_DIR': 'var/activity_archive',
+    'DEDUPE_WINDOW': 10.0,
+    'DEDUPE_ACTIONS': ('view',),
+    'DEDUPE_MAX_KEYS': 100000,
+    'SPOOL_DIR': 'var/activity_spool',
+    'SPOOL_LATENCY_BUDGET_MS': 250.0,
+    'SPOOL_COOLDOWN': 30.0,
+    'SPOOL_FSYNC_INTERVAL': 0.5,
+    'SPOOL_SEGMENT_BYTES': 4 * 1024 * 1024,
+    'SETTLE_SECONDS': 30.0,
+}
+
+
+def ingest_setting(name):
+    """Return an ACTIVITY_INGEST setting, falling back to the defaults above."""
+    return getattr(settings, 'ACTIVITY_INGEST', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,31 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.activities.services.archive import archive_dir, export_days
+
+
+class Command(BaseCommand):
+    help = 'Write UserActivity into compressed columnar day files (one .npz per UTC day)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='First day (YYYY-MM-DD, UTC)')
+        parser.add_argument('--until', type=date.fromisoformat, help='Day after the last one (default: today)')
+        parser.add_argument('--days', type=int, default=1, help='Days before --until when --since is omitted')
+        parser.add_argument('--overwrite', action='store_true', help='Rewrite days that are already archived')
+
+    def handle(self, *args, **options):
+        # today is still being written, so by default the last full day is yesterday
+        until = options['until'] or timezone.now().date()
+        since = options['since'] or until - timedelta(days=options['days'])
+        if since >= until:
+            raise CommandError("--since must be before --until")
+        started = time.perf_counter()
+        written = export_days(since, until, overwrite=options['overwrite'], stdout=self.stdout)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {written} activity rows for {since}..{until - timedelta(days=1)} "
+            f"into {archive_dir()} in {elapsed:.1f}s"
+        ))
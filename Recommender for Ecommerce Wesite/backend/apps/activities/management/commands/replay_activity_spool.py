@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.activities.services.spool import replay_spool
+
+
+class Command(BaseCommand):
+    help = 'Insert spooled activity segments into UserActivity (exactly once) and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help='Keep draining, sleeping this long between passes')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            replayed = replay_spool(stdout=self.stdout)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f"Replayed {replayed} activity rows in {elapsed:.1f}s"))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
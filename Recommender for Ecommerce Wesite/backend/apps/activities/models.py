@@ -14,3 +14,42 @@ class UserActivity(models.Model):
 
     def __str__(self):
         return f"Activity {self.ActivityID} - Customer {self.CustomerID} - {self.Action}"
+
+
+class ActivityRollupHourly(models.Model):
+    """UserActivity counts per (BookID, Action, hour), maintained by ``update_rollups``."""
+    RollupID = models.BigAutoField(primary_key=True, db_column="RollupID")
+    BookID = models.IntegerField(db_column="BookID")
+    Action = models.CharField(db_column="Action", max_length=20)
+    BucketStart = models.DateTimeField(db_column="BucketStart")
+    EventCount = models.IntegerField(db_column="EventCount")
+
+    class Meta:
+        managed = False
+        db_table = "activityrollup_hourly"
+        unique_together = (("BookID", "Action", "BucketStart"),)
+
+
+class ActivityRollupDaily(models.Model):
+    """UserActivity counts per (BookID, Action, UTC day), maintained by ``update_rollups``."""
+    RollupID = models.BigAutoField(primary_key=True, db_column="RollupID")
+    BookID = models.IntegerField(db_column="BookID")
+    Action = models.CharField(db_column="Action", max_length=20)
+    BucketDate = models.DateField(db_column="BucketDate")
+    EventCount = models.IntegerField(db_column="EventCount")
+
+    class Meta:
+        managed = False
+        db_table = "activityrollup_daily"
+        unique_together = (("BookID", "Action", "BucketDate"),)
+
+
+class EtlWatermark(models.Model):
+    """Last source row folded into a derived table, one row per job."""
+    Name = models.CharField(primary_key=True, db_column="Name", max_length=50)
+    LastID = models.BigIntegerField(db_column="LastID", default=0)
+    UpdatedAt = models.DateTimeField(db_column="UpdatedAt", null=True, blank=True)
+
+    class Meta:
+        managed = False
+        db_table = "etl_watermark"
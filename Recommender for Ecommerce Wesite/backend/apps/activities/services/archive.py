@@ -0,0 +1,183 @@
+"""Columnar, day-partitioned archive of UserActivity for offline jobs.
+
+Each UTC day is one compressed ``.npz`` file under ``ARCHIVE_DIR``
+(``<dir>/YYYY-MM/YYYY-MM-DD.npz``) holding one array per column:
+
+* ``activity_id`` int64, ``customer_id`` / ``book_id`` int32;
+* ``action`` uint8, a code into the ``actions`` vocabulary stored alongside;
+* ``ts`` int64 microseconds since the epoch (UTC);
+* ``session`` int32, a code into ``sessions`` (-1 for no SessionID);
+* ``high_id`` the largest ActivityID in UserActivity when the day was read.
+
+Days are cut by ActivityTime, so a day file is complete only for rows that
+existed when it was written: ``high_id`` tells readers which ids that covers
+(see :func:`covered_through`).
+
+Files are written to a temporary name and renamed, so readers never see a
+partial day. Reading decompresses only the requested columns, one day at a
+time, so memory is bounded by the largest day rather than the archive.
+"""
+import os
+from datetime import date, datetime, time as dtime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.common.db import stream_rows
+from ..conf import ingest_setting
+from ..models import UserActivity
+
+# Code order for the ``action`` column; the vocabulary is also stored per file.
+ACTIONS = ('view', 'add_to_cart', 'checkout', 'purchase')
+COLUMNS = ('activity_id', 'customer_id', 'book_id', 'action', 'ts', 'session')
+
+
+def archive_dir() -> Path:
+    return Path(ingest_setting('ARCHIVE_DIR'))
+
+
+def partition_path(day: date, root: Path = None) -> Path:
+    root = root or archive_dir()
+    return root / f"{day:%Y-%m}" / f"{day:%Y-%m-%d}.npz"
+
+
+def partitions(start: date = None, end: date = None, root: Path = None):
+    """``[(day, path), ...]`` of archived days with ``start <= day < end``, oldest first."""
+    root = root or archive_dir()
+    found = []
+    for path in sorted(root.glob('*/*.npz')):
+        day = date.fromisoformat(path.stem)
+        if (start is None or day >= start) and (end is None or day < end):
+            found.append((day, path))
+    return found
+
+
+def _day_sql():
+    qn = connection.ops.quote_name
+    return (
+        f"SELECT {qn('ActivityID')}, {qn('CustomerID')}, {qn('BookID')}, {qn('Action')}, "
+        f"{qn('ActivityTime')}, {qn('SessionID')} FROM {qn(UserActivity._meta.db_table)} "
+        f"WHERE {qn('ActivityTime')} >= %s AND {qn('ActivityTime')} < %s ORDER BY {qn('ActivityID')}"
+    )
+
+
+def _encode(values, vocabulary: dict) -> np.ndarray:
+    """Dictionary-encode ``values`` in place of the vocabulary (None -> -1)."""
+    return np.fromiter(
+        (-1 if v is None else vocabulary.setdefault(v, len(vocabulary)) for v in values),
+        dtype=np.int32, count=len(values),
+    )
+
+
+def day_columns(day: date, chunk_size: int = 50000) -> dict:
+    """Column arrays of one UTC day of UserActivity, in ActivityID order."""
+    lo = datetime.combine(day, dtime.min, tzinfo=dt_timezone.utc)
+    params = [connection.ops.adapt_datetimefield_value(d) for d in (lo, lo + timedelta(days=1))]
+    action_codes = {a: i for i, a in enumerate(ACTIONS)}
+    sessions = {}
+    parts = {c: [] for c in COLUMNS}
+    # read before the day's rows, so every id up to it is in the file if it is in the day
+    high_id = UserActivity.objects.aggregate(m=Max('ActivityID'))['m'] or 0
+    for rows in stream_rows(_day_sql(), params, chunk_size=chunk_size):
+        ids, customers, books, actions, times, session_ids = zip(*rows)
+        parts['activity_id'].append(np.array(ids, dtype=np.int64))
+        parts['customer_id'].append(np.array(customers, dtype=np.int32))
+        parts['book_id'].append(np.array(books, dtype=np.int32))
+        # unknown actions are kept, appended to the vocabulary
+        parts['action'].append(_encode(actions, action_codes).astype(np.uint8))
+        parts['ts'].append(np.array(
+            [timezone.make_naive(t, dt_timezone.utc) if timezone.is_aware(t) else t for t in times],
+            dtype='datetime64[us]',
+        ).astype(np.int64))
+        parts['session'].append(_encode(session_ids, sessions))
+    empty = {'activity_id': np.int64, 'customer_id': np.int32, 'book_id': np.int32,
+             'action': np.uint8, 'ts': np.int64, 'session': np.int32}
+    columns = {c: np.concatenate(parts[c]) if parts[c] else np.empty(0, empty[c]) for c in COLUMNS}
+    columns['actions'] = np.array(list(action_codes), dtype=str)
+    columns['sessions'] = np.array(list(sessions), dtype=str) if sessions else np.empty(0, dtype='U1')
+    columns['high_id'] = np.array(high_id, dtype=np.int64)
+    return columns
+
+
+def write_partition(day: date, columns: dict, root: Path = None) -> Path:
+    path = partition_path(day, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp.npz")
+    np.savez_compressed(tmp, **columns)
+    os.replace(tmp, path)
+    return path
+
+
+def export_days(start: date, end: date, overwrite: bool = False, root: Path = None, stdout=None) -> int:
+    """Archive every day in ``[start, end)``; returns the number of rows written.
+
+    Days already archived are skipped unless ``overwrite`` is set.
+    """
+    written = 0
+    day = start
+    while day < end:
+        path = partition_path(day, root)
+        if overwrite or not path.exists():
+            columns = day_columns(day)
+            write_partition(day, columns, root)
+            n = len(columns['activity_id'])
+            written += n
+            if stdout:
+                stdout.write(f"{day}: {n} rows, {path.stat().st_size} bytes")
+        day += timedelta(days=1)
+    return written
+
+
+def read_partition(path: Path, columns=COLUMNS) -> dict:
+    """Load the requested columns (plus vocabularies) of one day file."""
+    with np.load(path, allow_pickle=False) as data:
+        out = {c: data[c] for c in columns}
+        out['actions'] = data['actions']
+        if 'session' in columns:
+            out['sessions'] = data['sessions']
+    return out
+
+
+def covered_through(paths) -> int:
+    """ActivityID up to which the given day files hold every row dated on their days.
+
+    The smallest ``high_id`` among them; files written without one count as 0.
+    """
+    high = None
+    for path in paths:
+        with np.load(path, allow_pickle=False) as data:
+            h = int(data['high_id']) if 'high_id' in data.files else 0
+        high = h if high is None else min(high, h)
+    return high or 0
+
+
+def missing_days(days):
+    """Days between the first and last of ``days`` that have no partition."""
+    days = sorted(days)
+    have = set(days)
+    out = []
+    if days:
+        day = days[0]
+        while day < days[-1]:
+            if day not in have:
+                out.append(day)
+            day += timedelta(days=1)
+    return out
+
+
+def iter_archive(start: date = None, end: date = None, columns=COLUMNS, batch_size: int = None, root: Path = None):
+    """Yield ``(day, batch)`` column dicts day by day, optionally cut into ``batch_size`` rows.
+
+    Vocabulary arrays (``actions``, ``sessions``) are whole in every batch.
+    """
+    for day, path in partitions(start, end, root):
+        data = read_partition(path, columns)
+        n = len(data[columns[0]]) if columns else 0
+        step = batch_size or max(n, 1)
+        for s in range(0, n, step):
+            yield day, {
+                k: v if k in ('actions', 'sessions') else v[s:s + step] for k, v in data.items()
+            }
@@ -0,0 +1,102 @@
+"""Drop repeated activity events before they reach the database.
+
+A refresh of a product page fires the same ``view`` again within seconds. The
+suppressor remembers when each ``(CustomerID, BookID, Action)`` key was last
+written, in insertion order; a repeat inside ``DEDUPE_WINDOW`` seconds of the
+written event is counted and not inserted. Because the window runs from the
+written event (a repeat does not extend it), entries expire in insertion order
+and are evicted from the front. ``DEDUPE_MAX_KEYS`` bounds memory; when full,
+the oldest keys go first. The key is marked when the event is checked; a
+caller whose write then fails calls ``forget`` so a retry is not suppressed.
+
+State is per process, so with several workers a repeat landing on another
+worker is still written; the window only needs to catch the common case.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from ..conf import ingest_setting
+
+
+class RepeatSuppressor:
+    def __init__(self, window: float, max_keys: int, actions=('view',), clock=time.monotonic):
+        self.window = window
+        self.max_keys = max_keys
+        self.actions = frozenset(actions)
+        self.clock = clock
+        self._seen = OrderedDict()  # key -> time the written event was seen
+        self._lock = threading.Lock()
+        self.checked = self.suppressed = self.evicted = 0
+        self.suppressed_by_action = {}
+
+    def is_repeat(self, customer_id, book_id, action) -> bool:
+        """True if the event repeats a written one within the window (and counts it)."""
+        if action not in self.actions or self.window <= 0:
+            return False
+        key = (customer_id, book_id, action)
+        with self._lock:
+            now = self.clock()
+            self.checked += 1
+            self._expire(now)
+            seen = self._seen.get(key)
+            if seen is not None and now - seen < self.window:
+                self.suppressed += 1
+                self.suppressed_by_action[action] = self.suppressed_by_action.get(action, 0) + 1
+                return True
+            self._seen.pop(key, None)
+            self._seen[key] = now
+            if len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+                self.evicted += 1
+            return False
+
+    def forget(self, customer_id, book_id, action):
+        """Drop the mark left by ``is_repeat`` for an event that was not written."""
+        with self._lock:
+            self._seen.pop((customer_id, book_id, action), None)
+
+    def _expire(self, now):
+        while self._seen:
+            key, seen = next(iter(self._seen.items()))
+            if now - seen < self.window:
+                return
+            del self._seen[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'window_seconds': self.window,
+                'actions': sorted(self.actions),
+                'keys': len(self._seen),
+                'checked': self.checked,
+                'suppressed': self.suppressed,
+                'suppressed_by_action': dict(self.suppressed_by_action),
+                'evicted': self.evicted,
+                # every suppressed event is one INSERT not executed
+                'writes_saved': self.suppressed,
+            }
+
+
+_suppressor = None
+_suppressor_lock = threading.Lock()
+
+
+def get_suppressor() -> RepeatSuppressor:
+    global _suppressor
+    if _suppressor is None:
+        with _suppressor_lock:
+            if _suppressor is None:
+                _suppressor = RepeatSuppressor(
+                    ingest_setting('DEDUPE_WINDOW'), ingest_setting('DEDUPE_MAX_KEYS'),
+                    ingest_setting('DEDUPE_ACTIONS'),
+                )
+    return _suppressor
+
+
+def is_repeat(customer_id, book_id, action) -> bool:
+    return get_suppressor().is_repeat(customer_id, book_id, action)
+
+
+def forget(customer_id, book_id, action):
+    get_suppressor().forget(customer_id, book_id, action)
@@ -0,0 +1,182 @@
+"""Buffered activity ingestion: a bounded in-process queue drained by one thread.
+
+With ``ACTIVITY_INGEST['MODE'] = 'buffered'`` a logged event is only enqueued;
+the flusher thread writes batches with ``bulk_create`` once ``BATCH_SIZE``
+events are waiting or ``FLUSH_INTERVAL`` seconds have passed. When the queue is
+full the event is rejected and counted (``dropped``) rather than blocking the
+request; ``log_event`` then spools it (see ``services.spool``). The
+queue is drained at interpreter exit, so a graceful restart loses nothing;
+a hard kill loses at most one queue's worth of events.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.db import close_old_connections
+
+from ..conf import ingest_setting
+from ..models import UserActivity
+from ..signals import notify_logged
+from .dedupe import get_suppressor
+from .spool import UNAVAILABLE, spool, spool_stats
+
+logger = logging.getLogger(__name__)
+
+# seconds the exit hook waits for the final flush
+SHUTDOWN_TIMEOUT = 10.0
+
+
+class ActivityBuffer:
+    def __init__(self, maxsize: int, batch_size: int, flush_interval: float):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counts = threading.Lock()
+        self.enqueued = self.written = self.dropped = self.failed = self.spooled = self.flushes = 0
+        self.last_flush_ms = self.max_flush_ms = 0.0
+        self.last_lag_ms = self.max_lag_ms = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+                self._thread.start()
+
+    def put(self, activity: UserActivity) -> bool:
+        """Enqueue without blocking; returns False (and counts a drop) when full."""
+        self.start()
+        try:
+            self.queue.put_nowait((time.monotonic(), activity))
+        except queue.Full:
+            with self._counts:
+                self.dropped += 1
+            return False
+        with self._counts:
+            self.enqueued += 1
+        return True
+
+    def _take_batch(self):
+        """Block until one event arrives, then gather more until full or the interval ends."""
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self.flush(batch)
+        self.drain()
+
+    def drain(self):
+        """Write everything still queued (used by the exit hook)."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self.flush(batch)
+
+    def flush(self, batch):
+        close_old_connections()
+        started = time.monotonic()
+        activities = [activity for _, activity in batch]
+        try:
+            UserActivity.objects.bulk_create(activities, batch_size=self.batch_size)
+        except UNAVAILABLE:
+            logger.warning(f"Database unavailable; spooling {len(batch)} buffered activities", exc_info=True)
+            try:
+                spool(activities)
+            except OSError:
+                # spool unwritable too; losing the batch must not kill the flusher thread
+                self.failed += len(batch)
+                logger.exception(f"Failed to spool {len(batch)} buffered activities")
+                return
+            self.spooled += len(batch)
+            return
+        except Exception:
+            self.failed += len(batch)
+            logger.exception(f"Failed to write {len(batch)} buffered activities")
+            return
+        done = time.monotonic()
+        self.written += len(batch)
+        self.flushes += 1
+        self.last_flush_ms = (done - started) * 1000
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+        # queued-to-written time of the oldest event in the batch
+        self.last_lag_ms = (done - batch[0][0]) * 1000
+        self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+        # robust: a failing receiver must not kill the flusher thread
+        notify_logged(activities)
+
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        else:
+            self.drain()
+
+    def stats(self) -> dict:
+        return {
+            'mode': 'buffered',
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'spooled': self.spooled,
+            'flushes': self.flushes,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+            'max_flush_ms': round(self.max_flush_ms, 3),
+            'last_lag_ms': round(self.last_lag_ms, 3),
+            'max_lag_ms': round(self.max_lag_ms, 3),
+        }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> ActivityBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ActivityBuffer(
+                    ingest_setting('QUEUE_SIZE'), ingest_setting('BATCH_SIZE'), ingest_setting('FLUSH_INTERVAL'),
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def buffered() -> bool:
+    return ingest_setting('MODE') == 'buffered'
+
+
+def ingest_stats() -> dict:
+    stats = {'mode': ingest_setting('MODE')} if _buffer is None else _buffer.stats()
+    stats['dedupe'] = get_suppressor().stats()
+    stats['spool'] = spool_stats()
+    return stats
@@ -1,10 +1,29 @@
+import time
+from django.db import transaction
 from django.utils import timezone
+from ..conf import ingest_setting
 from ..models import UserActivity
+from ..signals import activity_logged, notify_logged
+from .dedupe import forget, is_repeat
+from .ingest import buffered, get_buffer
+from .spool import save_or_spool, spool
 from typing import Optional
 
-def log_event(*, customer_id: Optional[int], book_id: int, action: str, session_id: Optional[str], when=None) -> UserActivity:
+
+class ActivityNotRecorded(Exception):
+    """The event could be neither written, queued nor spooled; the client should retry."""
+
+
+def log_event(*, customer_id: Optional[int], book_id: int, action: str, session_id: Optional[str], when=None) -> Optional[UserActivity]:
+    """Record one activity; returns None when it repeats a recent one (see services.dedupe).
+
+    Batch uploads (log_events, log_event_stream) are not filtered: they carry
+    client-side timestamps spanning far more than the suppression window.
+    """
     if customer_id is None:
         raise ValueError("Login required to log activity")
+    if is_repeat(customer_id, book_id, action):
+        return None
     ua = UserActivity(
         CustomerID=customer_id,
         BookID=book_id,
@@ -12,6 +31,96 @@ def log_event(*, customer_id: Optional[int], book_id: int, action: str, session_
         ActivityTime=when or timezone.now(),
         SessionID=session_id,
     )
-    # force_insert ensures an INSERT is executed (no migrations/manipulation of schema)
-    ua.save(force_insert=True)
+    try:
+        if buffered():
+            # written later by the flusher thread, which then sends activity_logged
+            if not get_buffer().put(ua):
+                # queue full: spooled instead; the replayer inserts it and sends activity_logged
+                spool([ua])
+            return ua
+        if not save_or_spool(ua):
+            # the replayer sends activity_logged once the spooled row is inserted
+            return ua
+    except OSError as e:
+        # the spool directory is unwritable (disk full, permissions)
+        forget(customer_id, book_id, action)
+        raise ActivityNotRecorded(str(e)) from e
+    except Exception:
+        # not recorded, so a retry of the same event must not count as a repeat
+        forget(customer_id, book_id, action)
+        raise
+    activity_logged.send(
+        sender=UserActivity,
+        activity_id=ua.ActivityID,
+        customer_id=customer_id,
+        book_id=book_id,
+        action=action,
+        session_id=session_id,
+        when=ua.ActivityTime,
+    )
     return ua
+
+
+def log_events(*, customer_id: Optional[int], events, session_id: Optional[str], chunk_size: int = None):
+    """Insert already-validated events with multi-row INSERTs in one transaction.
+
+    ``events`` are dicts with book_id, action and activity_time. Returns
+    ``(created, chunks)`` where chunks lists ``{"rows", "ms"}`` per INSERT.
+    """
+    if customer_id is None:
+        raise ValueError("Login required to log activity")
+    chunk_size = chunk_size or ingest_setting('BULK_CHUNK_SIZE')
+    activities = [
+        UserActivity(
+            CustomerID=customer_id,
+            BookID=e["book_id"],
+            Action=e["action"],
+            ActivityTime=e["activity_time"],
+            SessionID=session_id,
+        )
+        for e in events
+    ]
+    chunks = []
+    with transaction.atomic():
+        for s in range(0, len(activities), chunk_size):
+            batch = activities[s:s + chunk_size]
+            started = time.perf_counter()
+            UserActivity.objects.bulk_create(batch, batch_size=chunk_size)
+            chunks.append({"rows": len(batch), "ms": round((time.perf_counter() - started) * 1000, 3)})
+    notify_logged(activities)
+    return len(activities), chunks
+
+
+def log_event_stream(*, customer_id: Optional[int], events, session_id: Optional[str], batch_size: int = None):
+    """Insert validated events from an iterator, one multi-row INSERT per batch.
+
+    Only one batch is held in memory. Each batch commits on its own, so an
+    interrupted upload keeps the batches already written. Returns
+    ``(created, batches)``.
+    """
+    if customer_id is None:
+        raise ValueError("Login required to log activity")
+    batch_size = batch_size or ingest_setting('BULK_CHUNK_SIZE')
+    created = batches = 0
+    batch = []
+
+    def write():
+        with transaction.atomic():
+            UserActivity.objects.bulk_create(batch, batch_size=batch_size)
+        notify_logged(batch)
+
+    for e in events:
+        batch.append(UserActivity(
+            CustomerID=customer_id,
+            BookID=e["book_id"],
+            Action=e["action"],
+            ActivityTime=e["activity_time"],
+            SessionID=session_id,
+        ))
+        if len(batch) >= batch_size:
+            write()
+            created, batches, batch = created + len(batch), batches + 1, []
+    if batch:
+        write()
+        created, batches = created + len(batch), batches + 1
+    return created, batches
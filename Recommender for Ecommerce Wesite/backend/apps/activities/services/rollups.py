@@ -0,0 +1,174 @@
+"""Hourly and daily UserActivity counts per (BookID, Action).
+
+``update_rollups`` reads UserActivity past the ``etl_watermark`` row in
+ActivityID windows, counts each window in Python and upserts the counts into
+``activityrollup_hourly`` and ``activityrollup_daily``. The upserts and the new
+watermark commit in the same transaction (with the watermark row locked), so
+a crash or a concurrent run never counts a row twice.
+
+A run stops at the settled ActivityID (see ``services.watermarks``), so rows
+that commit after a higher id was already visible are not skipped.
+
+Buckets are UTC. Readers combine daily rows for whole days with hourly rows
+for partial days at the edges, so a 30-day count for one book touches about
+30 daily rows plus at most 46 hourly rows per action.
+"""
+from collections import Counter
+from datetime import datetime, time as dtime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.common.db import stream_rows
+from ..models import ActivityRollupDaily, ActivityRollupHourly, EtlWatermark, UserActivity
+from .watermarks import settled_mark
+
+WATERMARK = 'activity_rollups'
+# ActivityIDs folded per transaction
+WINDOW = 100_000
+# rows per multi-row upsert statement
+UPSERT_ROWS = 1000
+
+
+def _window_sql():
+    qn = connection.ops.quote_name
+    return (
+        f"SELECT {qn('BookID')}, {qn('Action')}, {qn('ActivityTime')} "
+        f"FROM {qn(UserActivity._meta.db_table)} "
+        f"WHERE {qn('ActivityID')} > %s AND {qn('ActivityID')} <= %s"
+    )
+
+
+def _utc_naive(value):
+    """Datetimes are stored as naive UTC; raw cursors may return either form."""
+    if timezone.is_aware(value):
+        value = value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def count_window(rows):
+    """``(hourly, daily)`` Counters keyed by ``(book_id, action, bucket)``."""
+    hourly = Counter()
+    for book_id, action, when in rows:
+        hourly[(book_id, action, _utc_naive(when).replace(minute=0, second=0, microsecond=0))] += 1
+    daily = Counter()
+    for (book_id, action, hour), n in hourly.items():
+        daily[(book_id, action, hour.date())] += n
+    return hourly, daily
+
+
+def _upsert(model, bucket_column, counts):
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = ", ".join(qn(c) for c in ('BookID', 'Action', bucket_column, 'EventCount'))
+    count = qn('EventCount')
+    if connection.vendor == 'mysql':
+        conflict = f"ON DUPLICATE KEY UPDATE {count} = {count} + VALUES({count})"
+    else:
+        key = ", ".join(qn(c) for c in ('BookID', 'Action', bucket_column))
+        conflict = f"ON CONFLICT ({key}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}"
+    adapt = (connection.ops.adapt_datetimefield_value if bucket_column == 'BucketStart'
+             else connection.ops.adapt_datefield_value)
+    rows = [(book_id, action, adapt(bucket), n) for (book_id, action, bucket), n in counts.items()]
+    with connection.cursor() as cursor:
+        for s in range(0, len(rows), UPSERT_ROWS):
+            batch = rows[s:s + UPSERT_ROWS]
+            values = ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {values} {conflict}",
+                [value for row in batch for value in row],
+            )
+
+
+def update_rollups(window: int = WINDOW, settle: float = None, stdout=None) -> int:
+    """Fold settled UserActivity rows past the watermark into the rollups; returns rows applied."""
+    EtlWatermark.objects.get_or_create(Name=WATERMARK)
+    high, _ = settled_mark(settle)
+    applied = 0
+    while True:
+        with transaction.atomic():
+            mark = EtlWatermark.objects.select_for_update().get(Name=WATERMARK)
+            lo = mark.LastID
+            if lo >= high:
+                break
+            hi = min(lo + window, high)
+            hourly, daily = Counter(), Counter()
+            for rows in stream_rows(_window_sql(), (lo, hi)):
+                h, d = count_window(rows)
+                hourly.update(h)
+                daily.update(d)
+            _upsert(ActivityRollupHourly, 'BucketStart', hourly)
+            _upsert(ActivityRollupDaily, 'BucketDate', daily)
+            mark.LastID, mark.UpdatedAt = hi, timezone.now()
+            mark.save(update_fields=['LastID', 'UpdatedAt'])
+        n = sum(daily.values())
+        applied += n
+        if stdout:
+            stdout.write(f"ActivityID ({lo}, {hi}]: {n} rows, {len(hourly)} hourly / {len(daily)} daily buckets")
+    return applied
+
+
+def _filtered(qs, book_ids, actions):
+    if book_ids is not None:
+        qs = qs.filter(BookID__in=book_ids)
+    if actions is not None:
+        qs = qs.filter(Action__in=actions)
+    return qs
+
+
+def _split(since: datetime, until: datetime):
+    """Split ``[since, until)`` into hourly edges and whole days: ``(days, hour ranges)``."""
+    since = _utc_naive(since).replace(minute=0, second=0, microsecond=0)
+    until = _utc_naive(until)
+    first_day = datetime.combine(since.date(), dtime.min)
+    if first_day < since:
+        first_day += timedelta(days=1)
+    last_day = datetime.combine(until.date(), dtime.min)
+    if first_day >= last_day:
+        return None, [(since, until)]
+    return (first_day.date(), last_day.date()), [(since, first_day), (last_day, until)]
+
+
+def event_counts(since: datetime, until: datetime, book_ids=None, actions=None) -> dict:
+    """``{(book_id, action): count}`` for activity in ``[since, until)`` from the rollups.
+
+    The range is widened to whole hours (``since`` down, ``until`` up); rows
+    past the watermark are not included.
+    """
+    days, hour_ranges = _split(since, until)
+    totals = Counter()
+    parts = []
+    if days:
+        parts.append(_filtered(ActivityRollupDaily.objects, book_ids, actions)
+                     .filter(BucketDate__gte=days[0], BucketDate__lt=days[1]))
+    for lo, hi in hour_ranges:
+        if lo < hi:
+            parts.append(_filtered(ActivityRollupHourly.objects, book_ids, actions)
+                         .filter(BucketStart__gte=timezone.make_aware(lo, dt_timezone.utc),
+                                 BucketStart__lt=timezone.make_aware(hi, dt_timezone.utc)))
+    for qs in parts:
+        for row in qs.values('BookID', 'Action').annotate(n=Sum('EventCount')):
+            totals[(row['BookID'], row['Action'])] += row['n']
+    return dict(totals)
+
+
+def event_series(since: datetime, until: datetime, granularity: str = 'day', book_ids=None, actions=None):
+    """``[(bucket, count), ...]`` in time order, summed over the selected books and actions.
+
+    Buckets overlapping ``[since, until)`` are returned whole.
+    """
+    if granularity == 'hour':
+        qs = _filtered(ActivityRollupHourly.objects, book_ids, actions).filter(
+            BucketStart__gte=since.replace(minute=0, second=0, microsecond=0), BucketStart__lt=until)
+        column = 'BucketStart'
+    else:
+        qs = _filtered(ActivityRollupDaily.objects, book_ids, actions).filter(
+            BucketDate__gte=_utc_naive(since).date(), BucketDate__lte=_utc_naive(until).date())
+        column = 'BucketDate'
+    return list(qs.values_list(column).annotate(n=Sum('EventCount')).order_by(column))
+
+
+def watermark():
+    mark = EtlWatermark.objects.filter(Name=WATERMARK).first()
+    return (mark.LastID, mark.UpdatedAt) if mark else (0, None)
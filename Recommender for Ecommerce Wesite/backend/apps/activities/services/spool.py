@@ -0,0 +1,270 @@
+"""Local spool for activity events the database cannot take right now.
+
+When a synchronous insert fails with a connection-level error, or inserts keep
+exceeding ``SPOOL_LATENCY_BUDGET_MS``, a per-process circuit breaker opens and
+events are appended to an NDJSON segment under ``SPOOL_DIR`` instead, until
+``SPOOL_COOLDOWN`` seconds have passed and the next insert is tried again. The
+buffered flusher spools a batch it failed to write.
+
+Segments are named ``<UTC time>-<pid>-<seq>``; the one being written ends in
+``.open`` and is renamed to ``.ndjson`` when it reaches ``SPOOL_SEGMENT_BYTES``
+or ``SEGMENT_AGE`` seconds. Writes are flushed to the OS on every append and
+fsynced at most every ``SPOOL_FSYNC_INTERVAL`` seconds, so a process crash
+loses nothing and a power loss at most that interval. A segment is never
+appended to once it is older than ``SEGMENT_AGE``, so an ``.open`` segment left
+untouched for ``STALE_SEGMENT_SECONDS`` belongs to a dead or idle writer and the
+replayer may take it.
+
+``replay_spool`` inserts one segment per transaction together with an
+``etl_watermark`` marker named after the segment, then deletes the file; a
+replay interrupted after the commit finds the marker and only deletes.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.db import InterfaceError, OperationalError, transaction
+from django.utils import timezone
+
+from ..conf import ingest_setting
+from ..models import EtlWatermark, UserActivity
+from ..signals import notify_logged
+
+logger = logging.getLogger(__name__)
+
+# seconds after which the current segment is closed on the next append
+SEGMENT_AGE = 10.0
+# an .open segment not written for this long is taken by the replayer
+STALE_SEGMENT_SECONDS = 600
+# consecutive over-budget inserts that open the breaker
+SLOW_LIMIT = 3
+MARKER_PREFIX = 'spool:'
+# errors that mean "database unavailable" rather than "bad row"
+UNAVAILABLE = (OperationalError, InterfaceError)
+
+
+def _line(ua: UserActivity) -> bytes:
+    return (json.dumps({
+        'customer_id': ua.CustomerID,
+        'book_id': ua.BookID,
+        'action': ua.Action,
+        'session_id': ua.SessionID,
+        'time': ua.ActivityTime.isoformat(),
+    }, separators=(',', ':')) + '\n').encode()
+
+
+class SpoolWriter:
+    def __init__(self, directory: Path, segment_bytes: int, fsync_interval: float):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = self._path = None
+        self._opened = self._synced = 0.0
+        self._seq = 0
+        self.spooled = self.segments = self.fsyncs = 0
+
+    def append(self, activities):
+        with self._lock:
+            now = time.monotonic()
+            if self._file is not None and (
+                now - self._opened >= SEGMENT_AGE or self._file.tell() >= self.segment_bytes
+            ):
+                self._close()
+            if self._file is None:
+                self._open(now)
+            self._file.write(b''.join(_line(ua) for ua in activities))
+            self._file.flush()
+            if now - self._synced >= self.fsync_interval:
+                self._sync(now)
+            self.spooled += len(activities)
+
+    def _open(self, now):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._seq += 1
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+        self._path = self.directory / f"{stamp}-{os.getpid()}-{self._seq:04d}.open"
+        self._file = open(self._path, 'ab')
+        self._opened = now
+        self.segments += 1
+
+    def _sync(self, now):
+        os.fsync(self._file.fileno())
+        self._synced = now
+        self.fsyncs += 1
+
+    def _close(self):
+        self._sync(time.monotonic())
+        self._file.close()
+        try:
+            os.replace(self._path, self._path.with_suffix('.ndjson'))
+        except FileNotFoundError:
+            pass  # taken by the replayer as stale
+        self._file = self._path = None
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._close()
+
+
+class WriteBreaker:
+    """Closed: insert. Open: spool until the cooldown ends, then try one insert."""
+
+    def __init__(self, budget_ms: float, cooldown: float, clock=time.monotonic):
+        self.budget_ms = budget_ms
+        self.cooldown = cooldown
+        self.clock = clock
+        self.opened_at = None
+        self.slow = 0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            return self.opened_at is None or self.clock() - self.opened_at >= self.cooldown
+
+    def record(self, ms: float = None, failed: bool = False) -> bool:
+        """Record one insert; returns True when this closes a previously open breaker."""
+        with self._lock:
+            if failed or ms > self.budget_ms:
+                self.slow = SLOW_LIMIT if failed else self.slow + 1
+                if self.slow >= SLOW_LIMIT:
+                    if self.opened_at is None:
+                        self.trips += 1
+                    self.opened_at = self.clock()
+                return False
+            self.slow = 0
+            was_open, self.opened_at = self.opened_at is not None, None
+            return was_open
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.clock() - self.opened_at >= self.cooldown else 'open'
+
+
+_writer = _breaker = None
+_init_lock = threading.Lock()
+
+
+def get_writer() -> SpoolWriter:
+    global _writer
+    if _writer is None:
+        with _init_lock:
+            if _writer is None:
+                _writer = SpoolWriter(
+                    ingest_setting('SPOOL_DIR'), ingest_setting('SPOOL_SEGMENT_BYTES'),
+                    ingest_setting('SPOOL_FSYNC_INTERVAL'),
+                )
+                atexit.register(_writer.close)
+    return _writer
+
+
+def get_breaker() -> WriteBreaker:
+    global _breaker
+    if _breaker is None:
+        with _init_lock:
+            if _breaker is None:
+                _breaker = WriteBreaker(ingest_setting('SPOOL_LATENCY_BUDGET_MS'), ingest_setting('SPOOL_COOLDOWN'))
+    return _breaker
+
+
+def spool(activities):
+    get_writer().append(activities)
+
+
+def save_or_spool(ua: UserActivity) -> bool:
+    """Insert ``ua``, or spool it when the database is unavailable or too slow; True if inserted."""
+    breaker = get_breaker()
+    if not breaker.allow():
+        spool([ua])
+        return False
+    started = time.perf_counter()
+    try:
+        # force_insert ensures an INSERT is executed (no migrations/manipulation of schema)
+        ua.save(force_insert=True)
+    except UNAVAILABLE:
+        logger.warning("Activity insert failed; spooling", exc_info=True)
+        breaker.record(failed=True)
+        spool([ua])
+        return False
+    if breaker.record((time.perf_counter() - started) * 1000):
+        # recovered: hand what was spooled so far to the replayer
+        get_writer().close()
+    return True
+
+
+def _read_segment(path: Path):
+    """Activities of one segment; a torn last line (crash mid-append) is ignored."""
+    activities = []
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                logger.warning(f"Ignoring incomplete last line of spool segment {path.name}")
+                break
+            e = json.loads(line)
+            activities.append(UserActivity(
+                CustomerID=e['customer_id'], BookID=e['book_id'], Action=e['action'],
+                SessionID=e['session_id'], ActivityTime=datetime.fromisoformat(e['time']),
+            ))
+    return activities
+
+
+def ready_segments(directory: Path = None):
+    """Closed segments plus stale ``.open`` ones (claimed by renaming), oldest first."""
+    directory = Path(directory or ingest_setting('SPOOL_DIR'))
+    if not directory.exists():
+        return []
+    for path in directory.glob('*.open'):
+        try:
+            if time.time() - path.stat().st_mtime > STALE_SEGMENT_SECONDS:
+                os.replace(path, path.with_suffix('.ndjson'))
+        except FileNotFoundError:
+            pass  # closed by its writer or claimed by another replayer meanwhile
+    return sorted(directory.glob('*.ndjson'))
+
+
+def replay_segment(path: Path, batch_size: int = 1000) -> int:
+    """Insert one segment exactly once and delete it; returns rows inserted (0 if already done)."""
+    marker = MARKER_PREFIX + path.stem
+    activities = _read_segment(path)
+    inserted = 0
+    with transaction.atomic():
+        if not EtlWatermark.objects.filter(Name=marker).exists():
+            UserActivity.objects.bulk_create(activities, batch_size=batch_size)
+            # unique Name: a concurrent replay of the same segment fails here and rolls back
+            EtlWatermark.objects.create(Name=marker, LastID=len(activities), UpdatedAt=timezone.now())
+            inserted = len(activities)
+    if inserted:
+        notify_logged(activities)
+    path.unlink(missing_ok=True)
+    EtlWatermark.objects.filter(Name=marker).delete()
+    return inserted
+
+
+def replay_spool(directory: Path = None, stdout=None) -> int:
+    """Drain every ready segment into UserActivity; returns rows inserted."""
+    total = 0
+    for path in ready_segments(directory):
+        n = replay_segment(path, ingest_setting('BULK_CHUNK_SIZE'))
+        total += n
+        if stdout:
+            stdout.write(f"{path.name}: {n} rows")
+    return total
+
+
+def spool_stats() -> dict:
+    directory = Path(ingest_setting('SPOOL_DIR'))
+    pending = list(directory.glob('*.ndjson')) + list(directory.glob('*.open')) if directory.exists() else []
+    stats = {'pending_segments': len(pending)}
+    if _breaker is not None:
+        stats.update(breaker=_breaker.state(), trips=_breaker.trips)
+    if _writer is not None:
+        stats.update(spooled=_writer.spooled, segments=_writer.segments, fsyncs=_writer.fsyncs)
+    return stats
@@ -0,0 +1,52 @@
+"""The largest ActivityID that incremental readers of UserActivity may trust.
+
+ActivityIDs are allocated at insert but become visible at commit, so a lower
+id can appear after a higher one: a long bulk or stream upload, a spool
+replay, a slow replica. A job that reads ``ActivityID > watermark`` and then
+moves its watermark to the largest id it saw skips such rows for good.
+
+Jobs instead read up to :func:`settled_mark`, an id that was already the
+largest visible one at least ``SETTLE_SECONDS`` ago; anything at or below it
+was allocated before then and has had that long to commit. Two
+``etl_watermark`` rows hold the state, shared by every job: ``activity.seen``
+(the largest id and when it was observed) and ``activity.settled`` (the last
+observation old enough to trust).
+"""
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..conf import ingest_setting
+from ..models import EtlWatermark, UserActivity
+
+SEEN = 'activity.seen'
+SETTLED = 'activity.settled'
+
+
+def _largest_id() -> int:
+    return UserActivity.objects.aggregate(m=Max('ActivityID'))['m'] or 0
+
+
+def settled_mark(settle: float = None):
+    """``(activity_id, seen_at)``: the largest ActivityID visible at ``seen_at``, ``settle`` or more seconds ago.
+
+    Until a first observation has settled this is ``(0, None)``. ``settle <= 0``
+    returns the largest id visible now, for a quiesced table.
+    """
+    if settle is None:
+        settle = ingest_setting('SETTLE_SECONDS')
+    if settle <= 0:
+        return _largest_id(), timezone.now()
+    with transaction.atomic():
+        seen, _ = EtlWatermark.objects.select_for_update().get_or_create(Name=SEEN)
+        settled, _ = EtlWatermark.objects.get_or_create(Name=SETTLED)
+        now = timezone.now()
+        if seen.UpdatedAt is not None and (now - seen.UpdatedAt).total_seconds() >= settle:
+            settled.LastID, settled.UpdatedAt = seen.LastID, seen.UpdatedAt
+            settled.save(update_fields=['LastID', 'UpdatedAt'])
+            seen.UpdatedAt = None
+        if seen.UpdatedAt is None:
+            # observed under the SEEN row lock, after every earlier observation
+            seen.LastID, seen.UpdatedAt = _largest_id(), now
+            seen.save(update_fields=['LastID', 'UpdatedAt'])
+    return settled.LastID, settled.UpdatedAt
@@ -0,0 +1,31 @@
+import logging
+
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Sent by log_event after an activity has been recorded.
+# kwargs: activity_id, customer_id, book_id, action, session_id, when
+activity_logged = Signal()
+
+
+def notify_logged(activities):
+    """Send activity_logged for rows written in a batch.
+
+    Receivers run robustly: one failing receiver is logged and does not stop the
+    rest of the batch. ``activity_id`` is None where the database does not return
+    primary keys from a multi-row insert (MySQL).
+    """
+    for ua in activities:
+        results = activity_logged.send_robust(
+            sender=type(ua),
+            activity_id=ua.ActivityID,
+            customer_id=ua.CustomerID,
+            book_id=ua.BookID,
+            action=ua.Action,
+            session_id=ua.SessionID,
+            when=ua.ActivityTime,
+        )
+        for receiver, error in results:
+            if isinstance(error, Exception):
+                logger.error(f"activity_logged receiver {receiver} failed: {error!r}")
@@ -0,0 +1,34 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.utils import timezone
+
+from .services.archive import export_days
+from .services.rollups import update_rollups
+from .services.spool import replay_spool
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def update_rollups_task():
+    """Fold new UserActivity rows into the hourly/daily rollups (see CELERY_BEAT_SCHEDULE)."""
+    applied = update_rollups()
+    logger.info(f"Activity rollups applied {applied} rows")
+
+
+@shared_task(ignore_result=True)
+def export_activity_archive_task():
+    """Archive yesterday's activity once the day is complete; archived days are skipped."""
+    today = timezone.now().date()
+    written = export_days(today - timedelta(days=1), today)
+    logger.info(f"Activity archive wrote {written} rows")
+
+
+@shared_task(ignore_result=True)
+def replay_activity_spool_task():
+    """Insert spooled activity segments back into UserActivity and delete them."""
+    replayed = replay_spool()
+    if replayed:
+        logger.info(f"Replayed {replayed} spooled activities")
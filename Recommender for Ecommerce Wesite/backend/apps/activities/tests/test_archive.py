@@ -0,0 +1,49 @@
+from datetime import date
+
+import numpy as np
+
+from apps.activities.services.archive import (
+    _encode, covered_through, iter_archive, missing_days, partition_path, partitions, write_partition,
+)
+
+
+def _columns(n, offset=0):
+    return {
+        'activity_id': np.arange(offset, offset + n, dtype=np.int64),
+        'customer_id': np.ones(n, np.int32),
+        'book_id': np.arange(n, dtype=np.int32),
+        'action': np.zeros(n, np.uint8),
+        'ts': np.zeros(n, np.int64),
+        'session': np.full(n, -1, np.int32),
+        'actions': np.array(['view'], dtype=str),
+        'sessions': np.empty(0, dtype='U1'),
+    }
+
+
+def test_session_ids_are_dictionary_encoded():
+    vocabulary = {}
+    assert _encode(['a', None, 'b', 'a'], vocabulary).tolist() == [0, -1, 1, 0]
+    assert vocabulary == {'a': 0, 'b': 1}
+
+
+def test_partitions_are_read_by_date_range_in_batches(tmp_path):
+    write_partition(date(2026, 1, 31), _columns(5), tmp_path)
+    write_partition(date(2026, 2, 1), _columns(3, offset=5), tmp_path)
+    assert [d for d, _ in partitions(root=tmp_path)] == [date(2026, 1, 31), date(2026, 2, 1)]
+
+    batches = list(iter_archive(start=date(2026, 1, 31), end=date(2026, 2, 1), batch_size=2,
+                                columns=('activity_id', 'book_id'), root=tmp_path))
+    assert [len(b['activity_id']) for _, b in batches] == [2, 2, 1]
+    assert set(batches[0][1]) == {'activity_id', 'book_id', 'actions'}
+
+
+def test_coverage_is_the_lowest_high_id_and_gaps_are_listed(tmp_path):
+    write_partition(date(2026, 1, 1), dict(_columns(2), high_id=np.array(40)), tmp_path)
+    write_partition(date(2026, 1, 4), dict(_columns(2), high_id=np.array(25)), tmp_path)
+    paths = [p for _, p in partitions(root=tmp_path)]
+    assert covered_through(paths) == 25
+    assert missing_days([date(2026, 1, 4), date(2026, 1, 1)]) == [date(2026, 1, 2), date(2026, 1, 3)]
+
+    # files from before high_id was recorded cover nothing
+    write_partition(date(2026, 1, 2), _columns(1), tmp_path)
+    assert covered_through(paths + [partition_path(date(2026, 1, 2), tmp_path)]) == 0
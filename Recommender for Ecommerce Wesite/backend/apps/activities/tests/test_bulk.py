@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+import pytest
+from django.test import override_settings
+
+from apps.activities.api.v1.serializers import ActivityBulkIn, ActivityIn, check_event
+from apps.activities.models import UserActivity
+from apps.activities.services import log_activity
+
+
+def test_bulk_validation_matches_activity_in_rules():
+    s = ActivityBulkIn(data={"events": [
+        {"book_id": "3", "action": "view"},
+        {"book_id": 4, "action": "purchase", "activity_time": "2026-01-01T10:00:00"},
+    ]})
+    assert s.is_valid(), s.errors
+    first, second = s.validated_data["events"]
+    assert first["book_id"] == 3 and first["activity_time"] is not None
+    assert second["activity_time"].tzinfo is not None
+
+
+def test_bulk_validation_reports_errors_by_index():
+    s = ActivityBulkIn(data={"events": [
+        {"book_id": 1, "action": "view"},
+        {"book_id": True, "action": "jump", "activity_time": "yesterday"},
+    ]})
+    assert not s.is_valid()
+    assert set(s.errors["events"][1]) == {"book_id", "action", "activity_time"}
+
+
+@override_settings(ACTIVITY_INGEST={"BULK_MAX_EVENTS": 2})
+def test_bulk_cap_is_configurable():
+    s = ActivityBulkIn(data={"events": [{"book_id": 1, "action": "view"}] * 3})
+    assert not s.is_valid()
+
+
+@pytest.mark.parametrize("book_id", [0, -5, 2 ** 31, 10 ** 20])
+def test_book_id_must_fit_the_column(book_id):
+    event = {"book_id": book_id, "action": "view"}
+    assert not ActivityIn(data=event).is_valid()
+    assert set(check_event(event)[1]) == {"book_id"}
+
+
+def _events(n):
+    when = datetime(2026, 1, 1, 10, tzinfo=timezone.utc)
+    return [{"book_id": i + 1, "action": "view", "activity_time": when} for i in range(n)]
+
+
+@pytest.mark.django_db
+def test_log_events_inserts_in_chunks():
+    created, chunks = log_activity.log_events(customer_id=7, events=_events(5), session_id="s1", chunk_size=2)
+    assert created == 5
+    assert [c["rows"] for c in chunks] == [2, 2, 1]
+    rows = UserActivity.objects.order_by("BookID")
+    assert [r.BookID for r in rows] == [1, 2, 3, 4, 5]
+    assert {(r.CustomerID, r.SessionID) for r in rows} == {(7, "s1")}
+
+
+@pytest.mark.django_db
+def test_log_events_is_all_or_nothing(monkeypatch):
+    bulk_create = UserActivity.objects.bulk_create
+    calls = []
+
+    def failing(batch, **kw):
+        calls.append(len(batch))
+        if len(calls) == 2:
+            raise RuntimeError("insert failed")
+        return bulk_create(batch, **kw)
+
+    monkeypatch.setattr(UserActivity.objects, "bulk_create", failing)
+    with pytest.raises(RuntimeError):
+        log_activity.log_events(customer_id=7, events=_events(5), session_id=None, chunk_size=2)
+    assert not UserActivity.objects.exists()
@@ -0,0 +1,60 @@
+import pytest
+
+from apps.activities.services import log_activity
+from apps.activities.services.dedupe import RepeatSuppressor
+from apps.activities.services.log_activity import ActivityNotRecorded, log_event
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_repeats_inside_the_window_are_suppressed():
+    clock = Clock()
+    s = RepeatSuppressor(window=10, max_keys=100, clock=clock)
+    assert not s.is_repeat(1, 5, 'view')
+    clock.now = 9
+    assert s.is_repeat(1, 5, 'view')
+    assert not s.is_repeat(2, 5, 'view')
+    assert not s.is_repeat(1, 5, 'purchase')  # only configured actions
+    clock.now = 10.5  # window counts from the written event, not the repeat
+    assert not s.is_repeat(1, 5, 'view')
+    stats = s.stats()
+    assert stats['writes_saved'] == 1
+    assert stats['keys'] == 2
+
+
+def test_max_keys_evicts_oldest():
+    s = RepeatSuppressor(window=60, max_keys=2, clock=Clock())
+    for book_id in (1, 2, 3):
+        s.is_repeat(1, book_id, 'view')
+    assert s.stats()['evicted'] == 1
+    assert not s.is_repeat(1, 1, 'view')
+    assert s.is_repeat(1, 3, 'view')
+
+
+def test_a_failed_write_does_not_suppress_the_retry(monkeypatch):
+    s = RepeatSuppressor(window=60, max_keys=100, clock=Clock())
+    monkeypatch.setattr(log_activity, 'is_repeat', s.is_repeat)
+    monkeypatch.setattr(log_activity, 'forget', s.forget)
+    monkeypatch.setattr(log_activity, 'buffered', lambda: False)
+    attempts = []
+
+    def save_or_spool(ua):
+        attempts.append(ua)
+        if len(attempts) == 1:
+            raise OSError(28, 'No space left on device')
+        return False  # spooled
+
+    monkeypatch.setattr(log_activity, 'save_or_spool', save_or_spool)
+    with pytest.raises(ActivityNotRecorded):
+        log_event(customer_id=1, book_id=5, action='view', session_id=None)
+    assert log_event(customer_id=1, book_id=5, action='view', session_id=None) is not None
+    assert len(attempts) == 2
+    # the recorded retry is the one later repeats are measured from
+    assert log_event(customer_id=1, book_id=5, action='view', session_id=None) is None
+    assert s.stats()['suppressed'] == 1
@@ -0,0 +1,90 @@
+import pytest
+from django.db import OperationalError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.activities.api.v1 import views
+from apps.activities.models import UserActivity
+from apps.activities.services import ingest, log_activity
+from apps.activities.services.ingest import ActivityBuffer
+from apps.activities.services.log_activity import ActivityNotRecorded, log_event
+
+
+def _activity(book_id):
+    return UserActivity(CustomerID=1, BookID=book_id, Action='view')
+
+
+def test_full_queue_drops_instead_of_blocking(monkeypatch):
+    buffer = ActivityBuffer(maxsize=2, batch_size=10, flush_interval=60)
+    monkeypatch.setattr(buffer, 'start', lambda: None)
+    assert buffer.put(_activity(1))
+    assert buffer.put(_activity(2))
+    assert not buffer.put(_activity(3))
+    stats = buffer.stats()
+    assert (stats['enqueued'], stats['dropped'], stats['queue_depth']) == (2, 1, 2)
+
+
+def test_drain_writes_in_batches(monkeypatch):
+    written = []
+    monkeypatch.setattr(ingest, 'close_old_connections', lambda: None)
+    monkeypatch.setattr(UserActivity.objects, 'bulk_create', lambda objs, batch_size: written.append(len(objs)))
+    buffer = ActivityBuffer(maxsize=100, batch_size=4, flush_interval=60)
+    monkeypatch.setattr(buffer, 'start', lambda: None)
+    for book_id in range(10):
+        buffer.put(_activity(book_id))
+    buffer.drain()
+    assert written == [4, 4, 2]
+    assert buffer.stats()['written'] == 10
+    assert buffer.stats()['queue_depth'] == 0
+
+
+def test_flush_survives_an_unwritable_spool(monkeypatch):
+    def unavailable(objs, batch_size):
+        raise OperationalError('server has gone away')
+
+    def unwritable(activities):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(ingest, 'close_old_connections', lambda: None)
+    monkeypatch.setattr(UserActivity.objects, 'bulk_create', unavailable)
+    monkeypatch.setattr(ingest, 'spool', unwritable)
+    buffer = ActivityBuffer(maxsize=10, batch_size=10, flush_interval=60)
+    buffer.flush([(0.0, _activity(1)), (0.0, _activity(2))])
+    stats = buffer.stats()
+    assert stats['failed'] == 2 and stats['spooled'] == 0
+
+
+def _buffered(monkeypatch, spool):
+    buffer = ActivityBuffer(maxsize=1, batch_size=10, flush_interval=60)
+    monkeypatch.setattr(buffer, 'start', lambda: None)
+    monkeypatch.setattr(log_activity, 'is_repeat', lambda *key: False)
+    monkeypatch.setattr(log_activity, 'buffered', lambda: True)
+    monkeypatch.setattr(log_activity, 'get_buffer', lambda: buffer)
+    monkeypatch.setattr(log_activity, 'spool', spool)
+    return buffer
+
+
+def test_event_rejected_by_a_full_queue_is_spooled(monkeypatch):
+    spooled = []
+    buffer = _buffered(monkeypatch, spooled.extend)
+    first = log_event(customer_id=1, book_id=1, action='view', session_id=None)
+    second = log_event(customer_id=1, book_id=2, action='view', session_id=None)
+    assert buffer.stats()['queue_depth'] == 1
+    assert spooled == [second] and first not in spooled
+
+
+def test_event_that_cannot_be_spooled_is_reported(monkeypatch):
+    def unwritable(activities):
+        raise OSError(28, 'No space left on device')
+    buffer = _buffered(monkeypatch, unwritable)
+    buffer.put(_activity(1))
+    with pytest.raises(ActivityNotRecorded):
+        log_event(customer_id=1, book_id=2, action='view', session_id=None)
+
+
+def test_create_activity_answers_503_when_not_recorded(monkeypatch):
+    def not_recorded(**kwargs):
+        raise ActivityNotRecorded('disk full')
+    monkeypatch.setattr(views, 'log_event', not_recorded)
+    request = APIRequestFactory().post('/api/v1/activities/', {'book_id': 1, 'action': 'view'}, format='json')
+    force_authenticate(request, user=type('User', (), {'is_authenticated': True, 'id': 1})())
+    response = views.create_activity(request)
+    assert response.status_code == 503
@@ -0,0 +1,90 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from apps.activities.models import ActivityRollupDaily, EtlWatermark, UserActivity
+from apps.activities.services import rollups, watermarks
+from apps.activities.services.rollups import _split, _upsert, count_window, event_counts, update_rollups
+
+
+def test_count_window_buckets_by_hour_and_day():
+    rows = [
+        (1, 'view', datetime(2026, 1, 1, 10, 5)),
+        (1, 'view', datetime(2026, 1, 1, 10, 55)),
+        (1, 'view', datetime(2026, 1, 1, 23, 59)),
+        (2, 'purchase', datetime(2026, 1, 2, 0, 1)),
+    ]
+    hourly, daily = count_window(rows)
+    assert hourly[(1, 'view', datetime(2026, 1, 1, 10))] == 2
+    assert daily == {(1, 'view', date(2026, 1, 1)): 3, (2, 'purchase', date(2026, 1, 2)): 1}
+
+
+def test_split_uses_days_inside_and_hours_at_the_edges():
+    days, hours = _split(datetime(2026, 1, 1, 10, 30), datetime(2026, 1, 31, 5, 15))
+    assert days == (date(2026, 1, 2), date(2026, 1, 31))
+    assert hours == [(datetime(2026, 1, 1, 10), datetime(2026, 1, 2)),
+                     (datetime(2026, 1, 31), datetime(2026, 1, 31, 5, 15))]
+
+    days, hours = _split(datetime(2026, 1, 1, 10), datetime(2026, 1, 1, 20))
+    assert days is None and hours == [(datetime(2026, 1, 1, 10), datetime(2026, 1, 1, 20))]
+
+
+def _activity(activity_id, book_id, when, action='view'):
+    UserActivity.objects.create(ActivityID=activity_id, CustomerID=1, BookID=book_id,
+                                Action=action, ActivityTime=when)
+
+
+def _age_seen_mark(seconds):
+    EtlWatermark.objects.filter(Name=watermarks.SEEN).update(
+        UpdatedAt=datetime.now(timezone.utc) - timedelta(seconds=seconds))
+
+
+@pytest.mark.django_db
+def test_update_rollups_waits_for_late_commits_below_the_seen_id():
+    when = datetime(2026, 1, 1, 10, 30, tzinfo=timezone.utc)
+    _activity(1, 5, when)
+    _activity(2, 5, when)
+    _activity(4, 6, when)
+    # the first run only records the largest visible id
+    assert update_rollups(settle=30) == 0
+    # id 3 was allocated before id 4 but commits after the run saw 4
+    _activity(3, 5, when)
+    _activity(5, 6, when)
+    assert update_rollups(settle=30) == 0  # seen mark is not old enough yet
+    _age_seen_mark(60)
+    assert update_rollups(settle=30) == 4
+    assert rollups.watermark()[0] == 4
+    assert event_counts(when - timedelta(hours=1), when + timedelta(hours=1)) == {(5, 'view'): 3, (6, 'view'): 1}
+
+    _age_seen_mark(60)
+    assert update_rollups(settle=30) == 1
+    assert update_rollups(settle=0) == 0
+
+
+@pytest.mark.django_db
+def test_upsert_adds_to_existing_counts():
+    counts = Counter({(1, 'view', date(2026, 1, 1)): 2, (2, 'purchase', date(2026, 1, 1)): 1})
+    _upsert(ActivityRollupDaily, 'BucketDate', counts)
+    _upsert(ActivityRollupDaily, 'BucketDate', Counter({(1, 'view', date(2026, 1, 1)): 3}))
+    rows = ActivityRollupDaily.objects.order_by('BookID').values_list('BookID', 'Action', 'EventCount')
+    assert list(rows) == [(1, 'view', 5), (2, 'purchase', 1)]
+
+
+@pytest.mark.django_db
+def test_event_counts_combines_days_and_edge_hours():
+    times = [
+        datetime(2026, 1, 1, 9, 59),   # before the range
+        datetime(2026, 1, 1, 10, 15),  # first partial day, hourly rows
+        datetime(2026, 1, 2, 12),      # whole day, daily rows
+        datetime(2026, 1, 3, 4, 45),   # last partial day, hourly rows
+        datetime(2026, 1, 3, 5, 0),    # after the range
+    ]
+    for i, when in enumerate(times, start=1):
+        _activity(i, 1, when.replace(tzinfo=timezone.utc), action='purchase' if i == 3 else 'view')
+    update_rollups(settle=0)
+    since = datetime(2026, 1, 1, 10, tzinfo=timezone.utc)
+    until = datetime(2026, 1, 3, 5, tzinfo=timezone.utc)
+    assert event_counts(since, until) == {(1, 'view'): 2, (1, 'purchase'): 1}
+    assert event_counts(since, until, book_ids=[2]) == {}
+    assert event_counts(since, until, actions=['purchase']) == {(1, 'purchase'): 1}
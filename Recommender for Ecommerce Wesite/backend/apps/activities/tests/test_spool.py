@@ -0,0 +1,76 @@
+import pytest
+from django.utils import timezone
+
+from apps.activities.models import EtlWatermark, UserActivity
+from apps.activities.services.spool import (
+    MARKER_PREFIX, SLOW_LIMIT, SpoolWriter, WriteBreaker, _read_segment, replay_segment,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_on_failure_or_repeated_slow_writes():
+    clock = Clock()
+    breaker = WriteBreaker(budget_ms=100, cooldown=30, clock=clock)
+    for _ in range(SLOW_LIMIT - 1):
+        breaker.record(500)
+    assert breaker.allow()
+    breaker.record(500)
+    assert not breaker.allow()
+    clock.now = 31
+    assert breaker.state() == 'half-open'
+    assert breaker.record(5) is True
+    assert breaker.state() == 'closed'
+    breaker.record(failed=True)
+    assert breaker.state() == 'open' and breaker.trips == 2
+
+
+def test_closed_segment_round_trips_and_ignores_torn_line(tmp_path):
+    writer = SpoolWriter(tmp_path, segment_bytes=1 << 20, fsync_interval=0)
+    now = timezone.now()
+    writer.append([UserActivity(CustomerID=1, BookID=b, Action='view', SessionID=None, ActivityTime=now)
+                   for b in (1, 2)])
+    writer.close()
+    [segment] = tmp_path.glob('*.ndjson')
+    with open(segment, 'ab') as f:
+        f.write(b'{"customer_id": 1, "bo')
+    activities = _read_segment(segment)
+    assert [a.BookID for a in activities] == [1, 2]
+    assert activities[0].ActivityTime == now
+
+
+def _segment(directory, book_ids):
+    writer = SpoolWriter(directory, segment_bytes=1 << 20, fsync_interval=0)
+    writer.append([UserActivity(CustomerID=1, BookID=b, Action='view', SessionID=None,
+                                ActivityTime=timezone.now()) for b in book_ids])
+    writer.close()
+    [segment] = directory.glob('*.ndjson')
+    return segment
+
+
+@pytest.mark.django_db
+def test_replay_inserts_a_segment_once(tmp_path):
+    segment = _segment(tmp_path, (1, 2, 3))
+    assert replay_segment(segment) == 3
+    assert not segment.exists()
+    assert not EtlWatermark.objects.filter(Name=MARKER_PREFIX + segment.stem).exists()
+    assert UserActivity.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_replay_after_an_interrupted_commit_only_deletes_the_segment(tmp_path):
+    segment = _segment(tmp_path, (1, 2))
+    # a previous replay committed its rows and marker, then died before the unlink
+    UserActivity.objects.bulk_create(_read_segment(segment))
+    EtlWatermark.objects.create(Name=MARKER_PREFIX + segment.stem, LastID=2, UpdatedAt=timezone.now())
+
+    assert replay_segment(segment) == 0
+    assert UserActivity.objects.count() == 2
+    assert not segment.exists()
+    assert not EtlWatermark.objects.filter(Name=MARKER_PREFIX + segment.stem).exists()
@@ -0,0 +1,19 @@
+import io
+
+from apps.activities.api.v1.views import MAX_LINE_BYTES, _ndjson_events
+
+
+def test_ndjson_lines_are_validated_one_by_one():
+    body = b"\n".join([
+        b'{"book_id": 1, "action": "view"}',
+        b'',
+        b'not json',
+        b'{"book_id": 2, "action": "jump"}',
+        b'{"book_id": 3, "action": "x", "pad": "' + b'a' * MAX_LINE_BYTES + b'"}',
+        b'{"book_id": 4, "action": "purchase", "activity_time": "2026-01-01T10:00:00Z"}',
+    ])
+    report = {"rejected": 0, "errors": []}
+    events = list(_ndjson_events(io.BytesIO(body), report))
+    assert [e["book_id"] for e in events] == [1, 4]
+    assert report["rejected"] == 3
+    assert [e["line"] for e in report["errors"]] == [3, 4, 5]
@@ -0,0 +1,149 @@
+from functools import cached_property
+
+from django.db.models import Q
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from ...conf import search_setting
+from ...services.facets import RELATED, band_labels, get_facet_index
+from ...services.search_index import get_index
+
+
+class RankedBooks:
+    """The rows of ``queryset`` in the order of the ranked ``ids``, as a sequence for the paginators.
+
+    The order is applied in Python, not in SQL: one query reads which of the
+    (at most ``MAX_RESULTS``) ids pass the filters, and a page fetches only
+    its own rows by primary key.
+    """
+
+    def __init__(self, queryset, ids):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.ids = ids
+
+    @cached_property
+    def matching(self):
+        found = set(self.queryset.values_list('pk', flat=True))
+        return [book_id for book_id in self.ids if book_id in found]
+
+    def __len__(self):
+        return len(self.matching)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1 or None][0]
+        ids = self.matching[index]
+        rows = self.queryset.in_bulk(ids)
+        return [rows[book_id] for book_id in ids if book_id in rows]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+class BM25SearchFilter(filters.SearchFilter):
+    """``?search=`` answered from the BM25 index, most relevant first.
+
+    Supports ``"exact phrases"`` and ``prefix*`` terms and ignores diacritics;
+    a query with no match is retried typo-tolerantly against titles and author
+    names. Falls back to the LIKE
+    search of ``SearchFilter`` over ``search_fields`` while the index has not
+    been built (``manage.py build_search_index``) or search is disabled.
+
+    Ranked results come back as :class:`RankedBooks`, so this runs after the
+    queryset filters.
+    """
+
+    def search_ids(self, request):
+        """BookIDs matching ``?search=``, most relevant first; None when the index can't answer."""
+        query = request.query_params.get(self.search_param, '').strip()
+        index = get_index() if query and search_setting('ENABLED') else None
+        if index is None:
+            return None
+        limit = search_setting('MAX_RESULTS')
+        return [book_id for book_id, _ in index.search(query, limit) or index.search_fuzzy(query, limit)]
+
+    def filter_queryset(self, request, queryset, view):
+        ids = self.search_ids(request)
+        if ids is None:
+            return super().filter_queryset(request, queryset, view)
+        if not ids:
+            return queryset.none()
+        return RankedBooks(queryset.filter(BookID__in=ids), ids)
+
+
+class RelevanceOrderingFilter(filters.OrderingFilter):
+    """Keeps relevance order for ranked searches unless ``?ordering=`` is given."""
+
+    def filter_queryset(self, request, queryset, view):
+        if isinstance(queryset, RankedBooks):
+            if not request.query_params.get(self.ordering_param):
+                return queryset
+            queryset = queryset.queryset
+        return super().filter_queryset(request, queryset, view)
+
+
+def facet_selection(params) -> dict:
+    """``{facet: [values]}`` from ``?category=1,2&author=..&publisher=..&price_band=0-50000&in_stock=true``."""
+    selection = {}
+    for facet in RELATED:
+        raw = [v.strip() for v in params.get(facet, '').split(',') if v.strip()]
+        try:
+            selection[facet] = [int(v) for v in raw]
+        except ValueError:
+            raise ValidationError({facet: 'Expected comma-separated ids'})
+    bands = band_labels(search_setting('FACET_PRICE_BANDS'))
+    selection['price_band'] = [v.strip() for v in params.get('price_band', '').split(',') if v.strip()]
+    unknown = [v for v in selection['price_band'] if v not in bands]
+    if unknown:
+        raise ValidationError({'price_band': f"Unknown band(s): {', '.join(unknown)}; one of {', '.join(bands)}"})
+    in_stock = params.get('in_stock', '').strip().lower()
+    if in_stock:
+        if in_stock not in ('1', 'true', '0', 'false'):
+            raise ValidationError({'in_stock': 'Expected true or false'})
+        selection['in_stock'] = [in_stock in ('1', 'true')]
+    return {facet: values for facet, values in selection.items() if values}
+
+
+def facet_q(selection) -> Q:
+    """The SQL equivalent of ``selection``."""
+    condition = Q()
+    for facet, (column, _, _) in RELATED.items():
+        if facet in selection:
+            condition &= Q(**{f"{column}__in": selection[facet]})
+    if 'price_band' in selection:
+        edges = list(search_setting('FACET_PRICE_BANDS'))
+        bands = Q(pk__in=[])
+        for label, lo, hi in zip(band_labels(edges), edges, edges[1:] + [None]):
+            if label in selection['price_band']:
+                bands |= Q(Price__gte=lo) if hi is None else Q(Price__gte=lo, Price__lt=hi)
+        condition &= bands
+    if 'in_stock' in selection:
+        condition &= Q(Stock__gt=0) if selection['in_stock'][0] else (Q(Stock__lte=0) | Q(Stock__isnull=True))
+    return condition
+
+
+class FacetFilter(filters.BaseFilterBackend):
+    """Category, author, publisher, price band and in-stock filters from the facet index.
+
+    Values of one facet are OR-ed, facets AND-ed. The index resolves the
+    selection to BookIDs; a match larger than ``FACET_MAX_IN_IDS`` is sent to
+    SQL as the equivalent column predicates instead of a long ``IN`` list.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        selection = facet_selection(request.query_params)
+        if not selection:
+            return queryset
+        ids = get_facet_index().filter(selection)
+        if len(ids) > search_setting('FACET_MAX_IN_IDS'):
+            return queryset.filter(facet_q(selection))
+        return queryset.filter(BookID__in=ids.tolist())
+
+    def get_schema_operation_parameters(self, view):
+        bands = ', '.join(band_labels(search_setting('FACET_PRICE_BANDS')))
+        params = [(facet, f"Comma-separated {facet} ids") for facet in RELATED]
+        params += [('price_band', f"Comma-separated price bands: {bands}"),
+                   ('in_stock', "true: only books in stock; false: only books out of stock")]
+        return [{'name': name, 'required': False, 'in': 'query', 'description': description,
+                 'schema': {'type': 'string'}} for name, description in params]
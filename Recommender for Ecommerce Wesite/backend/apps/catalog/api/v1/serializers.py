@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from apps.common.loaders import BatchLoader
 from ...models import Book, Author, Category, Publisher
 
 
@@ -20,8 +21,67 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['CategoryID', 'CategoryName', 'Description']
 
 
+class BookListSerializer(serializers.ListSerializer):
+    """Resolves the expanded relations of a whole page up front: one query per relation."""
+
+    def to_representation(self, data):
+        books = list(data.all() if hasattr(data, 'all') else data)
+        for name in self.child.expand:
+            column = BookSerializer.EXPANDABLE[name][0]
+            self.child.loader(name).prime(getattr(book, column) for book in books)
+        return super().to_representation(books)
+
+
 class BookSerializer(serializers.ModelSerializer):
+    # ?expand= name -> (id column on Book, related model, embedded fields)
+    EXPANDABLE = {
+        'author': ('AuthorID', Author, ('AuthorID', 'AuthorName')),
+        'publisher': ('PublisherID', Publisher, ('PublisherID', 'PublisherName')),
+        'category': ('CategoryID', Category, ('CategoryID', 'CategoryName')),
+    }
+
     class Meta:
         model = Book
         fields = ['BookID', 'Title', 'AuthorID', 'PublisherID', 'CategoryID', 
                   'Price', 'Stock', 'Description', 'PublicationDate']
+        list_serializer_class = BookListSerializer
+
+    @property
+    def expand(self):
+        return self.context.get('expand', ())
+
+    def loader(self, name) -> BatchLoader:
+        """The request's loader for one relation (shared through the serializer context)."""
+        loaders = self.context.setdefault('loaders', {})
+        if name not in loaders:
+            _, model, fields = self.EXPANDABLE[name]
+            loaders[name] = BatchLoader(model, fields)
+        return loaders[name]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for name in self.expand:
+            data[name] = self.loader(name).get(getattr(instance, self.EXPANDABLE[name][0]))
+        return data
+
+
+class CompletionOut(serializers.Serializer):
+    type = serializers.ChoiceField(choices=('book', 'author', 'category'))
+    id = serializers.IntegerField()
+    label = serializers.CharField()
+
+
+class AutocompleteOut(serializers.Serializer):
+    q = serializers.CharField()
+    results = CompletionOut(many=True)
+
+
+class FacetValueOut(serializers.Serializer):
+    value = serializers.JSONField(help_text="Filter value: an id, a price band or true/false")
+    label = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class FacetCountsOut(serializers.Serializer):
+    total = serializers.IntegerField()
+    facets = serializers.DictField(child=FacetValueOut(many=True))
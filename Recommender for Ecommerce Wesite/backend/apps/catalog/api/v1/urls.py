@@ -1,5 +1,6 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, AuthorViewSet, CategoryViewSet, PublisherViewSet
+from .views import BookViewSet, AuthorViewSet, CategoryViewSet, PublisherViewSet, autocomplete
 
 router = DefaultRouter()
 router.register('books', BookViewSet)
@@ -7,4 +8,6 @@ router.register('authors', AuthorViewSet)
 router.register('categories', CategoryViewSet)
 router.register('publishers', PublisherViewSet)
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('autocomplete/', autocomplete, name='catalog-autocomplete'),
+] + router.urls
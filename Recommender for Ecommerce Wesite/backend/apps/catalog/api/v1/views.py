@@ -1,18 +1,92 @@
 from rest_framework import viewsets, filters
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from apps.common.conditional import ConditionalGetMixin
 from ...models import Book, Author, Category, Publisher
-from .serializers import BookSerializer, AuthorSerializer, CategorySerializer, PublisherSerializer
+from ...conf import search_setting
+from ...services.autocomplete import TOP_K, complete
+from ...services.facets import get_facet_index
+from .filters import BM25SearchFilter, FacetFilter, RelevanceOrderingFilter, facet_selection
+from .serializers import (
+    BookSerializer, AuthorSerializer, CategorySerializer, PublisherSerializer, AutocompleteOut,
+    FacetCountsOut,
+)
 
+# characters of the typed text that are looked at
+MAX_QUERY_LENGTH = 100
 
-class BookViewSet(viewsets.ReadOnlyModelViewSet):
+
+EXPAND_PARAMETER = OpenApiParameter(
+    "expand", str,
+    description=f"Comma-separated relations to embed: {', '.join(BookSerializer.EXPANDABLE)} "
+                "(one extra query per relation for the whole page)",
+)
+
+# the list's facet filters, documented on the counts action too
+FACET_PARAMETERS = [
+    OpenApiParameter(p["name"], str, description=p["description"])
+    for p in FacetFilter().get_schema_operation_parameters(None)
+]
+
+
+@extend_schema_view(list=extend_schema(parameters=[EXPAND_PARAMETER]),
+                    retrieve=extend_schema(parameters=[EXPAND_PARAMETER]))
+class BookViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FacetFilter, BM25SearchFilter, RelevanceOrderingFilter]
     search_fields = ['Title', 'Description']
     ordering_fields = ['Title', 'Price', 'PublicationDate']
     ordering = ['Title']
+    # ?expand= embeds author/publisher/category rows
+    etag_models = (Book, Author, Publisher, Category)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        raw = self.request.query_params.get('expand', '')
+        expand = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in expand if name not in BookSerializer.EXPANDABLE]
+        if unknown:
+            raise ValidationError({'expand': f"Unknown relation(s): {', '.join(unknown)}"})
+        context['expand'] = tuple(dict.fromkeys(expand))
+        return context
 
-class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
+    @extend_schema(
+        summary="Counts per filter value for the books matching the other filters",
+        tags=["Catalog"],
+        parameters=FACET_PARAMETERS + [
+            OpenApiParameter("search", str, description="Count within these search results"),
+        ],
+        responses={200: FacetCountsOut},
+    )
+    @action(detail=False, pagination_class=None)
+    def facets(self, request):
+        # the same filters as the list; counted from the facet index, no GROUP BY
+        selection = facet_selection(request.query_params)
+        not_modified = self._not_modified(request)
+        if not_modified:
+            return not_modified
+        index = get_facet_index()
+        restrict = None
+        search = BM25SearchFilter()
+        if request.query_params.get(search.search_param, '').strip():
+            ids = search.search_ids(request)
+            if ids is None:  # no index yet: the LIKE search
+                ids = search.filter_queryset(request, Book.objects.all(), self).values_list('BookID', flat=True)
+            restrict = index.restriction(list(ids))
+        counts = index.counts(selection, restrict, search_setting('FACET_TOP_VALUES'))
+        return Response({
+            "total": counts["total"],
+            "facets": {
+                facet: [{"value": value, "label": str(label), "count": count} for value, label, count in values]
+                for facet, values in counts["facets"].items()
+            },
+        })
+
+
+class AuthorViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -20,7 +94,7 @@ class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
     ordering = ['AuthorName']
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -28,9 +102,30 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     ordering = ['CategoryName']
 
 
-class PublisherViewSet(viewsets.ReadOnlyModelViewSet):
+class PublisherViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Publisher.objects.all()
     serializer_class = PublisherSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['PublisherName']
     ordering = ['PublisherName']
+
+
+@extend_schema(
+    summary="Search-box completions over book titles, author names and category names",
+    tags=["Catalog"],
+    parameters=[
+        OpenApiParameter("q", str, description="Text typed so far (diacritics optional)"),
+        OpenApiParameter("limit", int, description=f"Max results (1-{TOP_K})"),
+    ],
+    responses={200: AutocompleteOut},
+)
+@api_view(["GET"])
+def autocomplete(request):
+    q = request.query_params.get("q", "")[:MAX_QUERY_LENGTH]
+    try:
+        limit = max(1, min(TOP_K, int(request.query_params.get("limit", 8))))
+    except ValueError:
+        limit = 8
+    # answered from the precomputed prefix arrays; no query per request
+    results = [{"type": kind, "id": id_, "label": label} for kind, id_, label in complete(q, limit)]
+    return Response({"q": q, "results": results})
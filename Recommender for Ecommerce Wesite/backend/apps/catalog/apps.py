@@ -5,3 +5,19 @@ class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.catalog'
     label = 'catalog'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from apps.common.conditional import on_model_changed
+        from .models import Author, Book, Category, Publisher
+        from .services import facets, search_index
+
+        post_save.connect(search_index.on_book_saved, sender=Book, dispatch_uid='catalog.search_index.saved')
+        post_delete.connect(search_index.on_book_deleted, sender=Book, dispatch_uid='catalog.search_index.deleted')
+        # change counters behind the ETags of the catalog endpoints
+        for model in (Author, Book, Category, Publisher):
+            post_save.connect(on_model_changed, sender=model, dispatch_uid=f'catalog.version.saved.{model.__name__}')
+            post_delete.connect(on_model_changed, sender=model, dispatch_uid=f'catalog.version.deleted.{model.__name__}')
+        # after the counters, so the facet index adopts the token of its own change
+        post_save.connect(facets.on_book_saved, sender=Book, dispatch_uid='catalog.facets.saved')
+        post_delete.connect(facets.on_book_deleted, sender=Book, dispatch_uid='catalog.facets.deleted')
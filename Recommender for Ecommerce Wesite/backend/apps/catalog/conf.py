@@ -0,0 +1,19 @@
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TITLE_BOOST': 3.0,
+    'MAX_RESULTS': 1000,
+    'BM25_K1': 1.2,
+    'BM25_B': 0.75,
+    'FUZZY_MAX_DISTANCE': 2,
+    'AUTOCOMPLETE_POPULARITY_DAYS': 30,
+    'FACET_PRICE_BANDS': (0, 50000, 100000, 200000, 500000),
+    'FACET_TOP_VALUES': 20,
+    'FACET_MAX_IN_IDS': 5000,
+}
+
+
+def search_setting(name):
+    """Return a CATALOG_SEARCH setting, falling back to the defaults above."""
+    return getattr(settings, 'CATALOG_SEARCH', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.catalog.services.autocomplete import rebuild_autocomplete
+from apps.recommendations.services.artifacts import ArtifactLocked
+
+
+class Command(BaseCommand):
+    help = 'Build the search-box completions over titles, author and category names'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            n = rebuild_autocomplete(stdout=self.stdout)
+        except ArtifactLocked as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Built {n} completions in {elapsed:.1f}s"))
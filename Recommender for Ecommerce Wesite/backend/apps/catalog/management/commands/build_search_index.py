@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.catalog.services.search_index import rebuild_search_index
+from apps.recommendations.services.artifacts import ArtifactLocked
+
+
+class Command(BaseCommand):
+    help = 'Build the BM25 inverted index over book titles and descriptions used by ?search='
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            n = rebuild_search_index(stdout=self.stdout)
+        except ArtifactLocked as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Indexed {n} books in {elapsed:.1f}s"))
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX idx_book_publicationdate ON book (PublicationDate);",
+            reverse_sql="DROP INDEX idx_book_publicationdate ON book;"
+        ),
+    ]
@@ -0,0 +1,198 @@
+"""Search-box completions over book titles, author names and category names.
+
+Every name is entered under the start of each of its words (stopwords
+excepted), so "pot" completes "Harry Potter". Keys are diacritic-folded UTF-8
+bytes (:func:`apps.common.text.fold`), cut to ``MAX_KEY_BYTES``, in one sorted
+array; a prefix is the key range found with two ``searchsorted`` calls.
+
+Entries are ranked by popularity: the action-weighted activity of the last
+``AUTOCOMPLETE_POPULARITY_DAYS`` days from the daily rollups (plus one, so
+books without activity still complete); an author or a category scores the
+sum of its books. A range of at most ``SCAN_LIMIT`` keys is ranked at query
+time; every longer one, i.e. every short prefix, has its top entries
+precomputed, so no query ranks more than ``SCAN_LIMIT`` keys.
+
+Labels are stored as one UTF-8 blob with offsets rather than a fixed-width
+string array, which would be padded to the longest title.
+"""
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from apps.activities.services.rollups import event_counts
+from apps.catalog.models import Author, Book, Category
+from apps.common.text import STOPWORDS, TOKEN_RE, fold, normalize
+from apps.recommendations.conf import rec_setting
+from apps.recommendations.services.artifacts import artifact_lock, get_artifact, save_artifact
+from ..conf import search_setting
+
+ARTIFACT = 'catalog_autocomplete'
+KINDS = ('book', 'author', 'category')
+MAX_KEY_BYTES = 32
+# key ranges up to this size are ranked per query; larger ones are precomputed
+SCAN_LIMIT = 256
+# entries kept per precomputed prefix, i.e. the largest ``limit`` served
+TOP_K = 20
+
+
+def _key(text: str) -> bytes:
+    return ' '.join(fold(text).split()).encode()[:MAX_KEY_BYTES]
+
+
+def name_keys(name: str) -> list:
+    """Keys of ``name``: its folded text from the start of each non-stopword word."""
+    name = normalize(name)
+    starts = [m.start() for m in TOKEN_RE.finditer(name) if m.group() not in STOPWORDS]
+    return list(dict.fromkeys(_key(name[s:]) for s in starts))
+
+
+def popularity(days: int) -> dict:
+    """``{book_id: weighted activity}`` over the last ``days`` days."""
+    weights = rec_setting('ACTION_WEIGHTS')
+    now = timezone.now()
+    scores = {}
+    for (book_id, action), n in event_counts(now - timedelta(days=days), now).items():
+        scores[book_id] = scores.get(book_id, 0.0) + weights.get(action, 0.0) * n
+    return scores
+
+
+def build_autocomplete_arrays(entries) -> dict:
+    """Arrays over ``(kind, id, label, score)`` entries."""
+    kinds, ids, scores, labels = [], [], [], []
+    keys, key_entries = [], []
+    for kind, entry_id, label, score in entries:
+        e = len(ids)
+        kinds.append(KINDS.index(kind))
+        ids.append(entry_id)
+        scores.append(score)
+        labels.append(label.encode())
+        for key in name_keys(label):
+            keys.append(key)
+            key_entries.append(e)
+    scores = np.array(scores, np.float32)
+    keys = np.array(keys, dtype=f'S{MAX_KEY_BYTES}')
+    key_entries = np.array(key_entries, np.int32)
+    o = np.argsort(keys, kind='stable')
+    keys, key_entries = keys[o], key_entries[o]
+
+    prefixes, top = [], []
+    for length in range(1, MAX_KEY_BYTES + 1):
+        cut = keys.astype(f'S{length}')
+        starts = np.flatnonzero(np.r_[True, cut[1:] != cut[:-1]]) if len(cut) else np.empty(0, int)
+        ends = np.r_[starts[1:], len(cut)]
+        heavy = np.flatnonzero(ends - starts > SCAN_LIMIT)
+        if not len(heavy):
+            break
+        for g in heavy:
+            prefixes.append(cut[starts[g]])
+            top.append(_best(key_entries[starts[g]:ends[g]], scores, TOP_K))
+    o = np.argsort(np.array(prefixes, dtype=f'S{MAX_KEY_BYTES}'), kind='stable') if prefixes else []
+    prefixes = [prefixes[i] for i in o]
+    top = [top[i] for i in o]
+    offsets = np.r_[0, np.cumsum([len(l) for l in labels])].astype(np.int64)
+    return {
+        'keys': keys,
+        'key_entries': key_entries,
+        'prefixes': np.array(prefixes, dtype=f'S{MAX_KEY_BYTES}'),
+        'prefix_indptr': np.r_[0, np.cumsum([len(t) for t in top])].astype(np.int64),
+        'prefix_entries': np.concatenate(top).astype(np.int32) if top else np.empty(0, np.int32),
+        'kinds': np.array(kinds, np.uint8),
+        'ids': np.array(ids, np.int32),
+        'scores': scores,
+        'labels': np.frombuffer(b''.join(labels), np.uint8),
+        'label_offsets': offsets,
+    }
+
+
+def _best(entries, scores, k: int) -> np.ndarray:
+    """The ``k`` best distinct entries, by score then entry order."""
+    entries = np.unique(entries)
+    if len(entries) > k:
+        entries = entries[np.argpartition(-scores[entries], k - 1)[:k]]
+    return entries[np.lexsort((entries, -scores[entries]))]
+
+
+def rebuild_autocomplete(stdout=None) -> int:
+    """Build the completion arrays from the catalog; returns the number of entries."""
+    book_scores = popularity(search_setting('AUTOCOMPLETE_POPULARITY_DAYS'))
+    author_scores, category_scores = {}, {}
+    entries = []
+    with artifact_lock(ARTIFACT):
+        for book_id, title, author_id, category_id in (
+            Book.objects.values_list('BookID', 'Title', 'AuthorID', 'CategoryID').iterator(chunk_size=2000)
+        ):
+            score = 1.0 + book_scores.get(book_id, 0.0)
+            entries.append(('book', book_id, title, score))
+            author_scores[author_id] = author_scores.get(author_id, 0.0) + score
+            category_scores[category_id] = category_scores.get(category_id, 0.0) + score
+        for author_id, name in Author.objects.values_list('AuthorID', 'AuthorName'):
+            entries.append(('author', author_id, name, author_scores.get(author_id, 1.0)))
+        for category_id, name in Category.objects.values_list('CategoryID', 'CategoryName'):
+            entries.append(('category', category_id, name, category_scores.get(category_id, 1.0)))
+        arrays = build_autocomplete_arrays(entries)
+        save_artifact(ARTIFACT, arrays, {'max_key_bytes': MAX_KEY_BYTES, 'top_k': TOP_K})
+    if stdout:
+        stdout.write(f"{len(entries)} entries, {len(arrays['keys'])} keys, "
+                     f"{len(arrays['prefixes'])} precomputed prefixes")
+    return len(entries)
+
+
+class Completer:
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.keys = artifact['keys']
+        self.key_entries = artifact['key_entries']
+        self.prefixes = artifact['prefixes']
+        self.prefix_indptr = artifact['prefix_indptr']
+        self.prefix_entries = artifact['prefix_entries']
+        self.kinds = artifact['kinds']
+        self.ids = artifact['ids']
+        self.scores = np.asarray(artifact['scores'])
+        self.labels = artifact['labels']
+        self.label_offsets = artifact['label_offsets']
+
+    def _entries(self, prefix: bytes, limit: int) -> np.ndarray:
+        lo = int(np.searchsorted(self.keys, prefix))
+        if len(prefix) < MAX_KEY_BYTES:
+            hi = int(np.searchsorted(self.keys, prefix + b'\xff'))
+        else:
+            hi = int(np.searchsorted(self.keys, prefix, side='right'))
+        if hi - lo <= SCAN_LIMIT:
+            return _best(self.key_entries[lo:hi], self.scores, limit)
+        i = int(np.searchsorted(self.prefixes, prefix))
+        return self.prefix_entries[self.prefix_indptr[i]:self.prefix_indptr[i + 1]][:limit]
+
+    def complete(self, text: str, limit: int = 10):
+        """``[(kind, id, label), ...]`` completing ``text``, most popular first."""
+        prefix = _key(text)
+        if not prefix:
+            return []
+        out = []
+        for e in self._entries(prefix, min(limit, TOP_K)).tolist():
+            label = bytes(self.labels[self.label_offsets[e]:self.label_offsets[e + 1]]).decode()
+            out.append((KINDS[self.kinds[e]], int(self.ids[e]), label))
+        return out
+
+
+_completer = None
+_completer_lock = threading.Lock()
+
+
+def get_completer():
+    global _completer
+    artifact = get_artifact(ARTIFACT)
+    if artifact is None:
+        return None
+    if _completer is None or _completer.artifact is not artifact:
+        with _completer_lock:
+            if _completer is None or _completer.artifact is not artifact:
+                _completer = Completer(artifact)
+    return _completer
+
+
+def complete(text: str, limit: int = 10):
+    """Completions for ``text``; empty until ``build_autocomplete`` has run."""
+    completer = get_completer()
+    return [] if completer is None else completer.complete(text, limit)
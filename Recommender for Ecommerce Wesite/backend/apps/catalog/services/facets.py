@@ -0,0 +1,215 @@
+"""In-memory facet index over the book table: filters and counts without GROUP BY.
+
+Every book is one position in a set of parallel arrays sorted by BookID. Each
+facet stores a value code per position (-1 when the book has no value):
+
+* ``category``, ``author``, ``publisher``: the related id;
+* ``price_band``: the band of ``FACET_PRICE_BANDS`` the price falls into;
+* ``in_stock``: 1 if ``Stock > 0`` else 0.
+
+A selection (values OR-ed within a facet, facets AND-ed) becomes one packed
+bitset per facet, ``np.packbits(np.isin(codes, selected))``, and the bitsets
+are intersected with ``np.bitwise_and``. Counts are disjunctive, as shoppers
+expect: a facet is counted with every filter applied except its own, by one
+``np.bincount`` over the codes of the matching positions.
+
+The index is built per process on first use. Books saved or deleted in this
+process are applied in place once the transaction commits; a change made by
+another process shows up as a new catalog change counter (see
+``apps.common.conditional``) and triggers a rebuild on the next request.
+"""
+import threading
+
+import numpy as np
+from django.db import transaction
+
+from apps.catalog.models import Author, Book, Category, Publisher
+from apps.common.conditional import version
+from ..conf import search_setting
+
+FACETS = ('category', 'author', 'publisher', 'price_band', 'in_stock')
+# facet -> Book column holding a related id, and the model naming it
+RELATED = {
+    'category': ('CategoryID', Category, 'CategoryName'),
+    'author': ('AuthorID', Author, 'AuthorName'),
+    'publisher': ('PublisherID', Publisher, 'PublisherName'),
+}
+BOOK_COLUMNS = ('BookID', 'CategoryID', 'AuthorID', 'PublisherID', 'Price', 'Stock')
+VERSIONED = (Book, Author, Category, Publisher)
+
+
+def band_labels(edges) -> list:
+    return [f"{lo}-{hi}" for lo, hi in zip(edges, edges[1:])] + [f"{edges[-1]}+"]
+
+
+class FacetIndex:
+    def __init__(self, rows, names: dict, price_edges, tokens=None):
+        """``rows`` are ``BOOK_COLUMNS`` tuples; ``names`` maps facet -> {id: label}."""
+        rows = sorted(rows, key=lambda r: r[0])
+        self.names = {'in_stock': {False: 'Out of stock', True: 'In stock'}, **names}
+        self.price_edges = np.asarray(price_edges, dtype=float)
+        self.tokens = tokens
+        self._lock = threading.Lock()
+        self.book_ids = np.array([r[0] for r in rows], np.int64)
+        self.alive = np.ones(len(rows), bool)
+        # facet -> list of values (code -> value) and {value: code}
+        self.values = {f: [] for f in FACETS}
+        self._codes_of = {f: {} for f in FACETS}
+        self.values['price_band'] = band_labels(list(price_edges))
+        self._codes_of['price_band'] = {v: i for i, v in enumerate(self.values['price_band'])}
+        self.values['in_stock'] = [False, True]
+        self._codes_of['in_stock'] = {False: 0, True: 1}
+        per_row = [self._row_codes(r) for r in rows]
+        self.codes = {f: np.array([c[f] for c in per_row], np.int32).reshape(-1) for f in FACETS}
+
+    def _code(self, facet, value) -> int:
+        if value is None:
+            return -1
+        codes = self._codes_of[facet]
+        if value not in codes:
+            codes[value] = len(self.values[facet])
+            self.values[facet].append(value)
+        return codes[value]
+
+    def _row_codes(self, row) -> dict:
+        _, category_id, author_id, publisher_id, price, stock = row
+        band = -1
+        if price is not None:
+            band = int(np.searchsorted(self.price_edges, float(price), side='right')) - 1
+        return {
+            'category': self._code('category', category_id),
+            'author': self._code('author', author_id),
+            'publisher': self._code('publisher', publisher_id),
+            'price_band': band,
+            'in_stock': int((stock or 0) > 0),
+        }
+
+    # -- incremental updates ------------------------------------------------
+
+    def upsert(self, row):
+        """Apply one saved book (a ``BOOK_COLUMNS`` tuple)."""
+        with self._lock:
+            codes = self._row_codes(row)
+            pos = int(np.searchsorted(self.book_ids, row[0]))
+            if pos < len(self.book_ids) and self.book_ids[pos] == row[0]:
+                self.alive[pos] = True
+                for f in FACETS:
+                    self.codes[f][pos] = codes[f]
+                return
+            # new book: arrays stay sorted by BookID (new ids land at the end)
+            self.book_ids = np.insert(self.book_ids, pos, row[0])
+            self.alive = np.insert(self.alive, pos, True)
+            for f in FACETS:
+                self.codes[f] = np.insert(self.codes[f], pos, codes[f])
+
+    def remove(self, book_id: int):
+        with self._lock:
+            pos = int(np.searchsorted(self.book_ids, book_id))
+            if pos < len(self.book_ids) and self.book_ids[pos] == book_id:
+                self.alive[pos] = False
+
+    # -- queries ------------------------------------------------------------
+
+    def _bitset(self, facet, values):
+        selected = [self._codes_of[facet][v] for v in values if v in self._codes_of[facet]]
+        return np.packbits(np.isin(self.codes[facet], selected))
+
+    def _match(self, selection, skip=None, restrict=None):
+        """Packed bitset of live books matching ``selection`` (minus facet ``skip``)."""
+        bits = np.packbits(self.alive if restrict is None else self.alive & restrict)
+        for facet, values in selection.items():
+            if facet != skip and values:
+                np.bitwise_and(bits, self._bitset(facet, values), out=bits)
+        return bits
+
+    def _positions(self, bits):
+        return np.flatnonzero(np.unpackbits(bits, count=len(self.book_ids)))
+
+    def restriction(self, book_ids):
+        """Boolean mask of the positions of ``book_ids`` (e.g. search hits)."""
+        mask = np.zeros(len(self.book_ids), bool)
+        ids = np.asarray(book_ids, np.int64)
+        pos = np.searchsorted(self.book_ids, ids)
+        ok = pos < len(self.book_ids)
+        pos = pos[ok][self.book_ids[pos[ok]] == ids[ok]]
+        mask[pos] = True
+        return mask
+
+    def filter(self, selection, restrict=None) -> np.ndarray:
+        """BookIDs matching ``selection`` ({facet: [values]}), ascending."""
+        with self._lock:
+            return self.book_ids[self._positions(self._match(selection, restrict=restrict))]
+
+    def counts(self, selection, restrict=None, top: int = 20) -> dict:
+        """``{'total': n, 'facets': {facet: [(value, label, count), ...]}}``, largest counts first.
+
+        Each facet is counted with the other facets' filters only, and lists
+        its ``top`` values plus any selected ones.
+        """
+        with self._lock:
+            out = {'total': int(len(self._positions(self._match(selection, restrict=restrict))))}
+            facets = {}
+            for facet in FACETS:
+                positions = self._positions(self._match(selection, skip=facet, restrict=restrict))
+                codes = self.codes[facet][positions]
+                counts = np.bincount(codes[codes >= 0], minlength=len(self.values[facet]))
+                order = np.argsort(-counts, kind='stable')
+                keep = [c for c in order[:top].tolist() if counts[c] > 0]
+                selected = {self._codes_of[facet][v] for v in selection.get(facet, ()) if v in self._codes_of[facet]}
+                keep += [c for c in selected if c not in keep]
+                names = self.names.get(facet, {})
+                facets[facet] = [
+                    (self.values[facet][c], names.get(self.values[facet][c], self.values[facet][c]), int(counts[c]))
+                    for c in keep
+                ]
+            out['facets'] = facets
+            return out
+
+
+def build_facet_index() -> FacetIndex:
+    tokens = tuple(version(model)[0] for model in VERSIONED)
+    names = {facet: dict(model.objects.values_list(model._meta.pk.attname, label))
+             for facet, (_, model, label) in RELATED.items()}
+    rows = Book.objects.values_list(*BOOK_COLUMNS).iterator(chunk_size=5000)
+    return FacetIndex(rows, names, search_setting('FACET_PRICE_BANDS'), tokens)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_facet_index() -> FacetIndex:
+    """The process's index, rebuilt when another process changed the catalog."""
+    global _index
+    tokens = tuple(version(model)[0] for model in VERSIONED)
+    if _index is None or _index.tokens != tokens:
+        with _index_lock:
+            if _index is None or _index.tokens != tokens:
+                _index = build_facet_index()
+    return _index
+
+
+def _adopt_tokens():
+    if _index is not None:
+        _index.tokens = tuple(version(model)[0] for model in VERSIONED)
+
+
+def on_book_saved(sender, instance, **kwargs):
+    row = tuple(getattr(instance, c) for c in BOOK_COLUMNS)
+
+    def apply():
+        if _index is not None:
+            _index.upsert(row)
+            # the change counter was bumped for this very change: no rebuild needed
+            _adopt_tokens()
+    transaction.on_commit(apply)
+
+
+def on_book_deleted(sender, instance, **kwargs):
+    book_id = instance.BookID
+
+    def apply():
+        if _index is not None:
+            _index.remove(book_id)
+            _adopt_tokens()
+    transaction.on_commit(apply)
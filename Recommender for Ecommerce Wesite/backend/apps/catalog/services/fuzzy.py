@@ -0,0 +1,174 @@
+"""Typo-tolerant matching of query words against book titles and author names.
+
+A symmetric-delete (SymSpell) index: at build time every vocabulary word is
+stored under all strings obtained by deleting up to ``FUZZY_MAX_DISTANCE``
+characters from its first ``PREFIX_LENGTH`` characters. At query time the same
+deletes of the query word are looked up with one ``searchsorted`` over the
+sorted delete keys, and only the few words found are checked with a bounded
+edit distance. No query compares against the whole vocabulary.
+
+Words are diacritic-folded (:func:`apps.common.text.fold`), so "nguyen nhat
+anh", "Nguyễn Nhật Ánh" and "nguyen nhta anh" all match. Each word maps to the
+books whose title contains it or whose author's name does.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from apps.common.text import TOKEN_RE, fold
+
+# only the first characters of a word generate deletes (bounds index size)
+PREFIX_LENGTH = 7
+# longer tokens (URLs, ISBNs glued to words) are not indexed
+MAX_TERM_LENGTH = 32
+
+
+def words(text: str) -> list:
+    return [w for w in TOKEN_RE.findall(fold(text)) if len(w) <= MAX_TERM_LENGTH]
+
+
+def allowed_distance(word: str, max_distance: int) -> int:
+    """Edits tolerated for a query word: none for 1-2 letters, one up to 5."""
+    if len(word) <= 2:
+        return 0
+    return min(max_distance, 1 if len(word) <= 5 else 2)
+
+
+def deletes(word: str, distance: int) -> set:
+    """``word`` and every string reachable from it by deleting up to ``distance`` characters."""
+    found = frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        found = found | frontier
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent swaps count once); ``limit + 1`` if larger.
+
+    Only the diagonal band ``|i - j| <= limit`` is computed; cells outside it
+    cannot lead to a distance within the limit.
+    """
+    if a == b:
+        return 0
+    big = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return big
+    n = len(b)
+    prev2, prev = None, [j if j <= limit else big for j in range(n + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - limit), min(n, i + limit)
+        cur = [big] * (n + 1)
+        if i <= limit:
+            cur[0] = i
+        for j in range(lo, hi + 1):
+            cost = a[i - 1] != b[j - 1]
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d = min(d, prev2[j - 2] + 1)
+            cur[j] = min(d, big)
+        if min(cur) > limit and min(prev) > limit:  # a swap reaches back two rows only
+            return big
+        prev2, prev = prev, cur
+    return prev[n]
+
+
+def _csr(groups: dict, keys):
+    """``indptr`` and concatenated sorted members of ``groups[k]`` for ``k`` in ``keys``."""
+    members = [sorted(groups[k]) for k in keys]
+    indptr = np.r_[0, np.cumsum([len(m) for m in members])].astype(np.int64)
+    flat = np.fromiter((x for m in members for x in m), np.int32, int(indptr[-1]))
+    return indptr, flat
+
+
+def build_fuzzy_arrays(books, authors: dict, max_distance: int) -> dict:
+    """Arrays of the fuzzy index over ``(book_id, title, author_id)`` rows.
+
+    ``authors`` maps AuthorID to AuthorName.
+    """
+    author_words = {author_id: set(words(name)) for author_id, name in authors.items()}
+    postings = defaultdict(set)
+    for book_id, title, author_id in books:
+        for word in set(words(title)) | author_words.get(author_id, set()):
+            postings[word].add(book_id)
+    terms = sorted(postings)
+    term_books_indptr, term_books = _csr(postings, terms)
+    by_delete = defaultdict(set)
+    for i, term in enumerate(terms):
+        for key in deletes(term[:PREFIX_LENGTH], max_distance):
+            by_delete[key].add(i)
+    keys = sorted(by_delete)
+    delete_indptr, delete_terms = _csr(by_delete, keys)
+    return {
+        'fuzzy_terms': np.array(terms, dtype=str) if terms else np.empty(0, dtype='U1'),
+        'fuzzy_indptr': term_books_indptr,
+        'fuzzy_books': term_books,
+        'fuzzy_keys': np.array(keys, dtype=str) if keys else np.empty(0, dtype='U1'),
+        'fuzzy_key_indptr': delete_indptr,
+        'fuzzy_key_terms': delete_terms,
+    }
+
+
+class FuzzyIndex:
+    def __init__(self, artifact, max_distance: int):
+        self.terms = artifact['fuzzy_terms']
+        self.indptr = artifact['fuzzy_indptr']
+        self.books = artifact['fuzzy_books']
+        self.keys = artifact['fuzzy_keys']
+        self.key_indptr = artifact['fuzzy_key_indptr']
+        self.key_terms = artifact['fuzzy_key_terms']
+        self.max_distance = max_distance
+
+    def corrections(self, word: str):
+        """``[(term, distance, term index), ...]`` of indexed words close enough to ``word``.
+
+        A word that is itself indexed is taken as spelled correctly.
+        """
+        i = int(np.searchsorted(self.terms, word))
+        if i < len(self.terms) and self.terms[i] == word:
+            return [(word, 0, i)]
+        distance = allowed_distance(word, self.max_distance)
+        probes = np.array(sorted(deletes(word[:PREFIX_LENGTH], distance)), dtype=str)
+        at = np.searchsorted(self.keys, probes)
+        hit = at < len(self.keys)
+        at = at[hit][self.keys[at[hit]] == probes[hit]]
+        candidates = set()
+        for k in at.tolist():
+            candidates.update(self.key_terms[self.key_indptr[k]:self.key_indptr[k + 1]].tolist())
+        found = []
+        for i in candidates:
+            term = str(self.terms[i])
+            d = edit_distance(word, term, distance)
+            if d <= distance:
+                found.append((term, d, i))
+        return found
+
+    def search(self, query: str, limit: int = 1000):
+        """``[(book_id, score), ...]`` of books matching every query word up to typos, best first.
+
+        A word contributes ``1 / (1 + distance)`` of its closest match.
+        """
+        books = scores = None
+        for word in dict.fromkeys(words(query)):
+            found = self.corrections(word)
+            if not found:
+                return []
+            ranges = [(self.indptr[i], self.indptr[i + 1], 1.0 / (1 + d)) for _, d, i in found]
+            b = np.concatenate([self.books[s:e] for s, e, _ in ranges])
+            w = np.concatenate([np.full(e - s, weight) for s, e, weight in ranges])
+            # a book matched by several corrections keeps the closest one
+            o = np.lexsort((-w, b))
+            b, w = b[o], w[o]
+            first = np.r_[True, b[1:] != b[:-1]]
+            b, w = b[first], w[first]
+            if books is None:
+                books, scores = b, w
+            else:
+                books, x, y = np.intersect1d(books, b, assume_unique=True, return_indices=True)
+                scores = scores[x] + w[y]
+            if not len(books):
+                return []
+        if books is None:
+            return []
+        o = np.lexsort((books, -scores))[:limit]
+        return list(zip(books[o].tolist(), scores[o].tolist()))
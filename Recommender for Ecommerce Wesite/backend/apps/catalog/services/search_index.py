@@ -0,0 +1,409 @@
+"""In-process full-text search over book Title and Description, ranked with BM25.
+
+The index is built from the ``book`` table into an artifact (see
+``apps.recommendations.services.artifacts``) of flat arrays, so every worker
+maps the same files:
+
+* ``terms``: sorted vocabulary; a term is found, or a prefix expanded, with
+  ``searchsorted``;
+* ``indptr`` / ``docs`` / ``tf``: per term, the documents containing it in
+  ascending order and their term frequencies (title occurrences count
+  ``TITLE_BOOST`` times);
+* ``pos_indptr`` / ``positions``: per posting, the token positions, for
+  phrase queries;
+* ``book_ids`` / ``doc_len``: BookID and weighted length per document.
+
+Words are indexed and queried diacritic-folded (:func:`apps.common.text.fold`),
+so "tieu thuyet" finds "Tiểu thuyết"; stopwords are recognised after folding, so
+"va" is dropped like "và".
+The same artifact holds the typo-tolerant index over titles and author names
+(see ``fuzzy.py``), used when a query finds nothing here.
+
+Query syntax: plain words must all match, ``word*`` matches any term with
+that prefix, ``"two words"`` matches the exact phrase. A clause is answered
+from its postings only; clauses are intersected smallest first.
+
+Books saved or deleted through the ORM are applied immediately to a small
+per-process overlay; the periodic rebuild folds them into the arrays. When a
+worker switches to a new artifact it keeps the overlay entries made after
+that build started reading books, since the build may have missed them.
+"""
+import threading
+import time
+
+import numpy as np
+
+from apps.catalog.models import Author, Book
+from apps.common.text import FOLDED_STOPWORDS, TOKEN_RE, fold, normalize
+from apps.recommendations.services.artifacts import artifact_lock, get_artifact, save_artifact
+from ..conf import search_setting
+from .fuzzy import FuzzyIndex, build_fuzzy_arrays
+
+ARTIFACT = 'catalog_search'
+BOOK_FIELDS = ('BookID', 'Title', 'Description', 'AuthorID')
+# description positions start here, so a phrase never spans the two fields
+FIELD_GAP = 1000
+# a prefix expands to at most this many terms (the most frequent ones)
+MAX_PREFIX_TERMS = 64
+# token triples buffered by the builder before they are turned into arrays
+FLUSH_EVERY = 1_000_000
+
+
+def analyze(text: str, offset: int = 0):
+    """Folded ``(terms, positions)`` of ``text``; stopwords are dropped but keep their position."""
+    terms, positions = [], []
+    for i, token in enumerate(TOKEN_RE.findall(normalize(text))):
+        term = fold(token)
+        if term not in FOLDED_STOPWORDS:
+            terms.append(term)
+            positions.append(offset + i)
+    return terms, positions
+
+
+def analyze_book(title: str, description: str, title_boost: float):
+    """``(terms, positions, weights)`` of one book across both fields."""
+    t_terms, t_pos = analyze(title)
+    d_terms, d_pos = analyze(description, FIELD_GAP)
+    weights = [title_boost] * len(t_terms) + [1.0] * len(d_terms)
+    return t_terms + d_terms, t_pos + d_pos, weights
+
+
+class IndexBuilder:
+    """Collects ``(term, doc, position, weight)`` triples and turns them into postings."""
+
+    def __init__(self, title_boost: float):
+        self.title_boost = title_boost
+        self.vocab = {}
+        self.book_ids, self.doc_len = [], []
+        self._t, self._d, self._p, self._w = [], [], [], []
+        self._chunks = []
+
+    def add(self, book_id, title, description):
+        doc = len(self.book_ids)
+        terms, positions, weights = analyze_book(title, description, self.title_boost)
+        self.book_ids.append(book_id)
+        self.doc_len.append(sum(weights))
+        self._t.extend(self.vocab.setdefault(t, len(self.vocab)) for t in terms)
+        self._d.extend([doc] * len(terms))
+        self._p.extend(positions)
+        self._w.extend(weights)
+        if len(self._t) >= FLUSH_EVERY:
+            self._flush()
+
+    def _flush(self):
+        if self._t:
+            self._chunks.append((
+                np.array(self._t, np.int32), np.array(self._d, np.int32),
+                np.array(self._p, np.int32), np.array(self._w, np.float32),
+            ))
+            self._t, self._d, self._p, self._w = [], [], [], []
+
+    def arrays(self) -> dict:
+        self._flush()
+        terms = np.array(list(self.vocab), dtype=str) if self.vocab else np.empty(0, dtype='U1')
+        order = np.argsort(terms, kind='stable')
+        rank = np.empty(len(order), np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        if self._chunks:
+            t, d, p, w = (np.concatenate(c) for c in zip(*self._chunks))
+        else:
+            t, d, p, w = (np.empty(0, np.int32),) * 3 + (np.empty(0, np.float32),)
+        t = rank[t]
+        o = np.lexsort((p, d, t))
+        t, d, p, w = t[o], d[o], p[o], w[o]
+        starts = np.flatnonzero(np.r_[True, (t[1:] != t[:-1]) | (d[1:] != d[:-1])]) if len(t) else np.empty(0, int)
+        return {
+            'terms': terms[order],
+            'indptr': np.r_[0, np.cumsum(np.bincount(t[starts], minlength=len(terms)))].astype(np.int64),
+            'docs': d[starts],
+            'tf': np.add.reduceat(w, starts) if len(starts) else np.empty(0, np.float32),
+            'pos_indptr': np.r_[starts, len(p)].astype(np.int64),
+            'positions': p,
+            'book_ids': np.array(self.book_ids, np.int32),
+            'doc_len': np.array(self.doc_len, np.float32),
+        }
+
+
+def rebuild_search_index(stdout=None) -> int:
+    """Index every book and store the arrays; returns the number of books."""
+    builder = IndexBuilder(search_setting('TITLE_BOOST'))
+    titles = []
+    with artifact_lock(ARTIFACT):
+        built_at = time.time()
+        for book_id, title, description, author_id in (
+            Book.objects.order_by('BookID').values_list(*BOOK_FIELDS).iterator(chunk_size=2000)
+        ):
+            builder.add(book_id, title, description)
+            titles.append((book_id, title, author_id))
+        arrays = builder.arrays()
+        n = len(arrays['book_ids'])
+        arrays.update(build_fuzzy_arrays(
+            titles, dict(Author.objects.values_list('AuthorID', 'AuthorName')),
+            search_setting('FUZZY_MAX_DISTANCE'),
+        ))
+        save_artifact(ARTIFACT, arrays, {
+            'avgdl': float(arrays['doc_len'].mean()) if n else 0.0,
+            'title_boost': builder.title_boost,
+            'built_at': built_at,
+        })
+    if stdout:
+        stdout.write(f"{n} books, {len(arrays['terms'])} terms, {len(arrays['docs'])} postings, "
+                     f"{len(arrays['fuzzy_keys'])} fuzzy keys")
+    return n
+
+
+def parse_query(query: str):
+    """Clauses of a query: ``('term', term, is_prefix)`` or ``('phrase', terms, offsets)``."""
+    clauses = []
+    parts = query.split('"')
+    for i, part in enumerate(parts):
+        if i % 2:  # inside quotes
+            terms, positions = analyze(part)
+            if len(terms) > 1:
+                clauses.append(('phrase', terms, [p - positions[0] for p in positions]))
+            elif terms:
+                clauses.append(('term', terms[0], False))
+            continue
+        for word in part.split():
+            terms, _ = analyze(word.rstrip('*'))
+            for j, term in enumerate(terms):
+                clauses.append(('term', term, word.endswith('*') and j == len(terms) - 1))
+    return clauses
+
+
+class SearchIndex:
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.terms = artifact['terms']
+        self.indptr = artifact['indptr']
+        self.docs = artifact['docs']
+        self.tf = artifact['tf']
+        self.book_ids = artifact['book_ids']
+        self.n_docs = len(self.book_ids)
+        self.k1, self.b = search_setting('BM25_K1'), search_setting('BM25_B')
+        self.title_boost = artifact.meta['title_boost']
+        self.avgdl = artifact.meta['avgdl'] or 1.0
+        # BM25 length normalisation per document, computed once
+        self.norm = self.k1 * (1 - self.b + self.b * np.asarray(artifact['doc_len']) / self.avgdl)
+        self.fuzzy = FuzzyIndex(artifact, search_setting('FUZZY_MAX_DISTANCE')) if 'fuzzy_keys' in artifact else None
+        # overlay: BookIDs whose stored postings are stale, their current text,
+        # and when each was changed (wall clock, comparable with built_at)
+        self._lock = threading.Lock()
+        self.masked = set()
+        self.extra = {}
+        self.changed = {}
+
+    # -- base arrays --------------------------------------------------------
+
+    def _find(self, term: str) -> int:
+        i = int(np.searchsorted(self.terms, term))
+        return i if i < len(self.terms) and self.terms[i] == term else -1
+
+    def _prefix_range(self, prefix: str):
+        return int(np.searchsorted(self.terms, prefix)), int(np.searchsorted(self.terms, prefix + '\U0010ffff'))
+
+    def _idf(self, df):
+        return np.log1p((self.n_docs - df + 0.5) / (df + 0.5))
+
+    def _term_scores(self, i: int):
+        s, e = self.indptr[i], self.indptr[i + 1]
+        docs, tf = self.docs[s:e], self.tf[s:e]
+        return docs, self._idf(e - s) * tf * (self.k1 + 1) / (tf + self.norm[docs])
+
+    def _clause(self, clause):
+        """``(docs, scores)`` of one clause, docs ascending."""
+        kind, terms, extra = clause
+        if kind == 'term' and not extra:
+            i = self._find(terms)
+            return self._term_scores(i) if i >= 0 else (np.empty(0, np.int32), np.empty(0))
+        if kind == 'term':
+            lo, hi = self._prefix_range(terms)
+            candidates = np.arange(lo, hi)
+            if len(candidates) > MAX_PREFIX_TERMS:
+                df = self.indptr[candidates + 1] - self.indptr[candidates]
+                candidates = candidates[np.argsort(-df, kind='stable')[:MAX_PREFIX_TERMS]]
+            if not len(candidates):
+                return np.empty(0, np.int32), np.empty(0)
+            docs, scores = zip(*(self._term_scores(i) for i in candidates))
+            docs, scores = np.concatenate(docs), np.concatenate(scores)
+            # a document matching several expansions keeps its best one
+            o = np.lexsort((-scores, docs))
+            docs, scores = docs[o], scores[o]
+            first = np.r_[True, docs[1:] != docs[:-1]]
+            return docs[first], scores[first]
+        return self._phrase(terms, extra)
+
+    def _phrase(self, terms, offsets):
+        ids = [self._find(t) for t in terms]
+        if min(ids) < 0:
+            return np.empty(0, np.int32), np.empty(0)
+        parts = [self._term_scores(i) for i in ids]
+        docs, scores = parts[0]
+        for d, s in parts[1:]:
+            docs, a, b = np.intersect1d(docs, d, assume_unique=True, return_indices=True)
+            scores = scores[a] + s[b]
+        keep = np.zeros(len(docs), bool)
+        pos_indptr, positions = self.artifact['pos_indptr'], self.artifact['positions']
+        starts = [
+            self.indptr[i] + np.searchsorted(self.docs[self.indptr[i]:self.indptr[i + 1]], docs) for i in ids
+        ]
+        for n in range(len(docs)):
+            at = None
+            for i, (start, offset) in enumerate(zip(starts, offsets)):
+                p = positions[pos_indptr[start[n]]:pos_indptr[start[n] + 1]] - offset
+                at = p if at is None else np.intersect1d(at, p, assume_unique=True)
+                if not len(at):
+                    break
+            keep[n] = len(at) > 0
+        return docs[keep], scores[keep]
+
+    def _search_base(self, clauses):
+        results = sorted((self._clause(c) for c in clauses), key=lambda r: len(r[0]))
+        docs, scores = results[0]
+        for d, s in results[1:]:
+            if not len(docs):
+                break
+            docs, a, b = np.intersect1d(docs, d, assume_unique=True, return_indices=True)
+            scores = scores[a] + s[b]
+        return docs, scores
+
+    # -- overlay ------------------------------------------------------------
+
+    def update(self, book_id: int, title: str, description: str):
+        terms, positions, weights = analyze_book(title, description, self.title_boost)
+        postings = {}
+        for term, position, weight in zip(terms, positions, weights):
+            tf, pos = postings.get(term, (0.0, []))
+            pos.append(position)
+            postings[term] = (tf + weight, pos)
+        with self._lock:
+            self.masked.add(book_id)
+            self.extra[book_id] = (postings, sum(weights))
+            self.changed[book_id] = time.time()
+
+    def remove(self, book_id: int):
+        with self._lock:
+            self.masked.add(book_id)
+            self.extra.pop(book_id, None)
+            self.changed[book_id] = time.time()
+
+    def carry_over(self, previous: 'SearchIndex'):
+        """Copy ``previous``'s overlay entries changed after this artifact's build began."""
+        since = self.artifact.meta.get('built_at')
+        if since is None:
+            return
+        with previous._lock:
+            recent = {b: (t, previous.extra.get(b)) for b, t in previous.changed.items() if t >= since}
+        with self._lock:
+            for book_id, (changed, extra) in recent.items():
+                self.masked.add(book_id)
+                self.changed[book_id] = changed
+                if extra is None:
+                    self.extra.pop(book_id, None)
+                else:
+                    self.extra[book_id] = extra
+
+    def _df(self, term):
+        i = self._find(term)
+        return int(self.indptr[i + 1] - self.indptr[i]) if i >= 0 else 0
+
+    def _score_extra(self, postings, dl, clauses):
+        norm = self.k1 * (1 - self.b + self.b * dl / self.avgdl)
+
+        def bm25(term):
+            tf = postings[term][0]
+            return float(self._idf(self._df(term)) * tf * (self.k1 + 1) / (tf + norm))
+
+        total = 0.0
+        for kind, terms, extra in clauses:
+            if kind == 'term' and not extra:
+                if terms not in postings:
+                    return None
+                total += bm25(terms)
+            elif kind == 'term':
+                matches = [t for t in postings if t.startswith(terms)]
+                if not matches:
+                    return None
+                total += max(bm25(t) for t in matches)
+            else:
+                if any(t not in postings for t in terms):
+                    return None
+                starts = set(postings[terms[0]][1])
+                for t, offset in zip(terms[1:], extra[1:]):
+                    starts &= {p - offset for p in postings[t][1]}
+                if not starts:
+                    return None
+                total += sum(bm25(t) for t in terms)
+        return total
+
+    # -- query --------------------------------------------------------------
+
+    def search(self, query: str, limit: int = 1000):
+        """``[(book_id, score), ...]`` best first; every clause must match."""
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+        docs, scores = self._search_base(clauses)
+        book_ids = self.book_ids[docs]
+        with self._lock:
+            masked = np.fromiter(self.masked, np.int64, len(self.masked))
+            extra = list(self.extra.items())
+        if len(masked):
+            keep = ~np.isin(book_ids, masked)
+            book_ids, scores = book_ids[keep], scores[keep]
+        hits = list(zip(book_ids.tolist(), scores.tolist()))
+        for book_id, (postings, dl) in extra:
+            score = self._score_extra(postings, dl, clauses)
+            if score is not None:
+                hits.append((book_id, score))
+        hits.sort(key=lambda h: -h[1])
+        return hits[:limit]
+
+    def search_fuzzy(self, query: str, limit: int = 1000):
+        """Typo-tolerant ``[(book_id, score), ...]`` over titles and author names.
+
+        Books changed since the build are matched on their indexed text.
+        """
+        if self.fuzzy is None:
+            return []
+        hits = self.fuzzy.search(query.replace('"', ' ').replace('*', ' '), limit)
+        with self._lock:
+            removed = self.masked - self.extra.keys()
+        return [h for h in hits if h[0] not in removed] if removed else hits
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The index over the current artifact, or None if it was never built."""
+    global _index
+    artifact = get_artifact(ARTIFACT)
+    if artifact is None:
+        return None
+    if _index is None or _index.artifact is not artifact:
+        with _index_lock:
+            if _index is None or _index.artifact is not artifact:
+                index = SearchIndex(artifact)
+                if _index is not None:
+                    index.carry_over(_index)
+                _index = index
+    return _index
+
+
+def search_books(query: str, limit: int = None):
+    index = get_index()
+    return None if index is None else index.search(query, limit or search_setting('MAX_RESULTS'))
+
+
+def on_book_saved(sender, instance, **kwargs):
+    index = get_index()
+    if index is not None:
+        index.update(instance.BookID, instance.Title, instance.Description)
+
+
+def on_book_deleted(sender, instance, **kwargs):
+    index = get_index()
+    if index is not None:
+        index.remove(instance.BookID)
@@ -0,0 +1,31 @@
+import logging
+
+from celery import shared_task
+
+from apps.recommendations.services.artifacts import ArtifactLocked
+from .services.autocomplete import rebuild_autocomplete
+from .services.search_index import rebuild_search_index
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def rebuild_search_index_task():
+    """Re-index every book, folding in changes the per-process overlays picked up."""
+    try:
+        n = rebuild_search_index()
+    except ArtifactLocked:
+        logger.info("Skipping search index rebuild: another rebuild is running")
+        return
+    logger.info(f"Search index rebuilt over {n} books")
+
+
+@shared_task(ignore_result=True)
+def rebuild_autocomplete_task():
+    """Rebuild search-box completions with fresh popularity from the activity rollups."""
+    try:
+        n = rebuild_autocomplete()
+    except ArtifactLocked:
+        logger.info("Skipping autocomplete rebuild: another rebuild is running")
+        return
+    logger.info(f"Autocomplete rebuilt over {n} entries")
@@ -0,0 +1,45 @@
+from unittest import mock
+
+from apps.catalog.services import autocomplete
+from apps.catalog.services.autocomplete import Completer, build_autocomplete_arrays, name_keys
+from apps.recommendations.services.artifacts import Artifact
+
+ENTRIES = [
+    ('book', 1, 'Harry Potter và Hòn đá Phù thủy', 50.0),
+    ('book', 2, 'Harry Potter và Phòng chứa Bí mật', 30.0),
+    ('book', 3, 'Hà Nội băm sáu phố phường', 5.0),
+    ('author', 7, 'Nguyễn Nhật Ánh', 80.0),
+    ('category', 4, 'Hài hước', 10.0),
+]
+
+
+def make_completer(entries=ENTRIES):
+    return Completer(Artifact(None, build_autocomplete_arrays(entries), {}))
+
+
+def test_name_keys_start_at_each_word():
+    assert name_keys('Harry Potter và Hòn đá') == [b'harry potter va hon da', b'potter va hon da', b'hon da', b'da']
+
+
+def test_completes_by_popularity_without_diacritics():
+    c = make_completer()
+    assert c.complete('ha') == [
+        ('book', 1, 'Harry Potter và Hòn đá Phù thủy'),
+        ('book', 2, 'Harry Potter và Phòng chứa Bí mật'),
+        ('category', 4, 'Hài hước'),
+        ('book', 3, 'Hà Nội băm sáu phố phường'),
+    ]
+    assert c.complete('HA NOI') == [('book', 3, 'Hà Nội băm sáu phố phường')]
+    assert c.complete('nhat') == [('author', 7, 'Nguyễn Nhật Ánh')]
+    assert c.complete('potter', limit=1) == [('book', 1, 'Harry Potter và Hòn đá Phù thủy')]
+    assert c.complete('xyz') == [] and c.complete('  ') == []
+
+
+def test_heavy_prefixes_are_precomputed():
+    entries = [('book', i, f'Sach {i:04d}', float(i % 97)) for i in range(1000)]
+    c = make_completer(entries)
+    assert b's' in c.prefixes.tolist() and b'sach 0' in c.prefixes.tolist()
+    best = sorted(range(1000), key=lambda i: (-(i % 97), i))[:5]
+    with mock.patch.object(autocomplete, '_best', side_effect=AssertionError('ranked at query time')):
+        assert [e[1] for e in c.complete('sa', 5)] == best
+    assert [e[1] for e in c.complete('sach 001', 3)] == [19, 18, 17]
@@ -0,0 +1,87 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import Q
+
+from apps.catalog.api.v1.filters import facet_q
+from apps.catalog.services.facets import FacetIndex, band_labels
+
+EDGES = (0, 50000, 100000, 200000)
+# BookID, CategoryID, AuthorID, PublisherID, Price, Stock
+ROWS = [
+    (1, 10, 100, 1000, Decimal('45000'), 3),
+    (2, 10, 101, 1000, Decimal('120000'), 0),
+    (3, 11, 100, 1001, Decimal('80000'), 5),
+    (4, 11, 102, None, Decimal('250000'), 1),
+    (5, 12, 101, 1001, None, None),
+]
+NAMES = {'category': {10: 'Văn học', 11: 'Thiếu nhi', 12: 'Kinh tế'}}
+
+
+def make_index(rows=ROWS):
+    return FacetIndex(rows, NAMES, EDGES)
+
+
+def counts_of(result, facet):
+    return {value: count for value, _, count in result['facets'][facet]}
+
+
+def test_band_labels():
+    assert band_labels(EDGES) == ['0-50000', '50000-100000', '100000-200000', '200000+']
+
+
+def test_filter_intersects_facets_and_unions_values():
+    idx = make_index()
+    assert idx.filter({}).tolist() == [1, 2, 3, 4, 5]
+    assert idx.filter({'category': [10, 11]}).tolist() == [1, 2, 3, 4]
+    assert idx.filter({'category': [10, 11], 'author': [100]}).tolist() == [1, 3]
+    assert idx.filter({'price_band': ['50000-100000', '200000+']}).tolist() == [3, 4]
+    assert idx.filter({'in_stock': [True], 'author': [101]}).tolist() == []
+    assert idx.filter({'in_stock': [False]}).tolist() == [2, 5]
+    assert idx.filter({'author': [999]}).tolist() == []
+
+
+def test_counts_are_disjunctive():
+    result = make_index().counts({'category': [10], 'in_stock': [True]})
+    assert result['total'] == 1
+    # a facet is counted without its own filter
+    assert counts_of(result, 'category') == {10: 1, 11: 2}
+    assert counts_of(result, 'in_stock') == {True: 1, False: 1}
+    assert counts_of(result, 'author') == {100: 1}
+    assert result['facets']['category'][0] == (11, 'Thiếu nhi', 2)
+
+
+def test_counts_list_top_values_and_selected_ones():
+    result = make_index().counts({'author': [102]}, top=1)
+    assert [value for value, _, _ in result['facets']['author']] == [100, 102]
+
+
+def test_counts_within_restriction():
+    idx = make_index()
+    result = idx.counts({}, restrict=idx.restriction([2, 5, 42]))
+    assert result['total'] == 2
+    assert counts_of(result, 'author') == {101: 2}
+
+
+def test_upsert_and_remove():
+    idx = make_index()
+    idx.upsert((2, 12, 101, 1000, Decimal('30000'), 4))
+    idx.upsert((9, 13, 103, 1000, Decimal('60000'), 2))
+    idx.remove(1)
+    assert idx.filter({'in_stock': [True]}).tolist() == [2, 3, 4, 9]
+    assert idx.filter({'category': [13]}).tolist() == [9]
+    assert counts_of(idx.counts({}), 'price_band') == {'0-50000': 1, '50000-100000': 2, '200000+': 1}
+    idx.upsert((1, 10, 100, 1000, Decimal('45000'), 3))
+    assert idx.filter({'category': [10]}).tolist() == [1]
+
+
+def test_empty_index():
+    idx = make_index([])
+    assert idx.filter({'category': [10]}).tolist() == []
+    assert idx.counts({})['total'] == 0
+
+
+def test_sql_fallback_matches_selection():
+    with mock.patch('apps.catalog.api.v1.filters.search_setting', return_value=EDGES):
+        q = facet_q({'category': [10], 'price_band': ['200000+'], 'in_stock': [True]})
+    assert q == Q(CategoryID__in=[10]) & (Q(pk__in=[]) | Q(Price__gte=200000)) & Q(Stock__gt=0)
@@ -0,0 +1,47 @@
+from apps.catalog.services.fuzzy import FuzzyIndex, build_fuzzy_arrays, deletes, edit_distance
+from apps.common.text import fold
+
+BOOKS = [
+    (1, 'Cho tôi xin một vé đi tuổi thơ', 1),
+    (2, 'Mắt biếc', 1),
+    (3, 'Đất rừng phương Nam', 2),
+    (4, 'Dế Mèn phiêu lưu ký', 3),
+]
+AUTHORS = {1: 'Nguyễn Nhật Ánh', 2: 'Đoàn Giỏi', 3: 'Tô Hoài'}
+
+
+def make_index():
+    return FuzzyIndex(build_fuzzy_arrays(BOOKS, AUTHORS, max_distance=2), max_distance=2)
+
+
+def ids(hits):
+    return [book_id for book_id, _ in hits]
+
+
+def test_fold():
+    assert fold('Đất rừng phương Nam') == 'dat rung phuong nam'
+    assert fold('NGUYỄN Nhật Ánh') == fold('nguyễn nhật ánh') == 'nguyen nhat anh'
+
+
+def test_edit_distance():
+    assert edit_distance('phuong', 'phuong', 2) == 0
+    assert edit_distance('phoung', 'phuong', 2) == 1  # adjacent swap
+    assert edit_distance('phg', 'phuong', 2) == 3
+    assert 'pong' in deletes('phong', 1) and 'png' not in deletes('phong', 1)
+
+
+def test_typos_and_missing_diacritics():
+    index = make_index()
+    assert set(ids(index.search('nguyen nhat anh'))) == {1, 2}  # author name
+    assert ids(index.search('dat rung phuong')) == [3]
+    assert ids(index.search('phoung nam')) == [3]
+    assert ids(index.search('phieu luw')) == [4]
+    assert ids(index.search('mat biec')) == [2]
+    assert index.search('biec phuong') == []
+
+
+def test_exact_match_ranks_above_typo():
+    index = make_index()
+    hits = index.search('hoai')
+    assert ids(hits) == [4]
+    assert index.search('hoia')[0][1] < hits[0][1]
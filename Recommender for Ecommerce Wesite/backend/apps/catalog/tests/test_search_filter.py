@@ -0,0 +1,54 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.catalog.api.v1 import filters
+from apps.catalog.models import Book
+from apps.common.pagination import KeysetPagination, PageNumberOrKeysetPagination
+
+RANKING = [7, 3, 9, 1, 5, 42]  # 42 is not in the table
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(PageNumberOrKeysetPagination, 'page_size', 2)
+    monkeypatch.setattr(KeysetPagination, 'page_size', 2)
+    index = SimpleNamespace(search=lambda query, limit: [(book_id, 1.0) for book_id in RANKING][:limit],
+                            search_fuzzy=lambda query, limit: [])
+    monkeypatch.setattr(filters, 'get_index', lambda: index)
+    Book.objects.bulk_create([Book(BookID=i, Title=f'Book {i}', Price=Decimal(100 - i)) for i in range(1, 11)])
+    client = APIClient()
+    client.force_authenticate(SimpleNamespace(is_authenticated=True, pk=1))
+    return client
+
+
+def ids(response):
+    assert response.status_code == 200, response.content
+    return [row['BookID'] for row in response.data['results']]
+
+
+def test_ranked_pages_are_ordered_in_python(client):
+    with CaptureQueriesContext(connection) as ctx:
+        first = client.get('/api/v1/catalog/books/', {'search': 'book'})
+    assert ids(first) == [7, 3] and first.data['count'] == 5
+    assert not any('CASE' in q['sql'].upper() for q in ctx.captured_queries)
+    assert ids(client.get('/api/v1/catalog/books/', {'search': 'book', 'page': 3})) == [5]
+
+
+def test_ranked_keyset_pages_by_position(client):
+    response = client.get('/api/v1/catalog/books/', {'search': 'book', 'cursor': ''})
+    seen = ids(response)
+    while response.data['next']:
+        response = client.get(response.data['next'])
+        seen += ids(response)
+    assert seen == [7, 3, 9, 1, 5]
+    assert client.get('/api/v1/catalog/books/', {'search': 'book', 'cursor': 'bad'}).status_code == 404
+
+
+def test_explicit_ordering_overrides_relevance(client):
+    response = client.get('/api/v1/catalog/books/', {'search': 'book', 'ordering': 'Price'})
+    assert ids(response) == [9, 7]
@@ -0,0 +1,100 @@
+import numpy as np
+
+from apps.catalog.services.search_index import IndexBuilder, SearchIndex, parse_query
+from apps.recommendations.services.artifacts import Artifact
+
+BOOKS = [
+    (10, 'Harry Potter and the Goblet of Fire', 'A young wizard returns to Hogwarts.'),
+    (11, 'The Hobbit', 'A hobbit is swept into a quest by a wizard.'),
+    (12, 'Fire and Blood', 'The history of House Targaryen, fire and dragons.'),
+    (13, 'Harrison Ford: A Life', 'Biography of the actor.'),
+    (14, 'Cooking', 'Recipes for the young potter of clay and fire pits.'),
+]
+
+
+def make_index(books=BOOKS, built_at=None):
+    builder = IndexBuilder(title_boost=3.0)
+    for row in books:
+        builder.add(*row)
+    arrays = builder.arrays()
+    meta = {'avgdl': float(arrays['doc_len'].mean()), 'title_boost': 3.0, 'built_at': built_at}
+    return SearchIndex(Artifact(None, arrays, meta))
+
+
+def ids(hits):
+    return [book_id for book_id, _ in hits]
+
+
+def test_postings_are_sorted_per_term():
+    index = make_index()
+    assert list(index.terms) == sorted(index.terms)
+    for i in range(len(index.terms)):
+        docs = index.docs[index.indptr[i]:index.indptr[i + 1]]
+        assert np.all(np.diff(docs) > 0)
+
+
+def test_all_terms_must_match_and_title_ranks_first():
+    index = make_index()
+    assert ids(index.search('wizard')) and set(ids(index.search('wizard'))) == {10, 11}
+    assert ids(index.search('potter')) == [10, 14]  # title hit beats description hit
+    assert index.search('wizard dragons') == []
+    assert index.search('the of') == []  # stopwords only
+
+
+def test_phrase_and_prefix():
+    index = make_index()
+    assert set(ids(index.search('harry potter'))) == {10}
+    assert ids(index.search('"young potter"')) == [14]
+    assert index.search('"potter young"') == []
+    # a phrase never spans title and description
+    assert index.search('"ford biography"') == []
+    assert set(ids(index.search('harr*'))) == {10, 13}
+    assert set(ids(index.search('hob* wizard'))) == {11}
+
+
+def test_parse_query():
+    assert parse_query('"Goblet of Fire" harr*') == [
+        ('phrase', ['goblet', 'fire'], [0, 2]), ('term', 'harr', True),
+    ]
+
+
+def test_overlay_applies_saved_and_deleted_books():
+    index = make_index()
+    index.update(11, 'The Silmarillion', 'Elves and a wizard.')
+    index.update(20, 'Dragon Rider', 'Fire dragons.')
+    index.remove(12)
+    assert set(ids(index.search('wizard'))) == {10, 11}
+    assert index.search('hobbit') == []
+    assert ids(index.search('dragons')) == [20]
+    assert set(ids(index.search('fire'))) == {10, 14, 20}
+    assert ids(index.search('"fire dragons"')) == [20]
+
+
+def test_new_artifact_keeps_overlay_entries_it_may_have_missed():
+    old = make_index()
+    old.update(20, 'Dragon Rider', 'Fire dragons.')
+    old.changed[20] = 100.0  # saved before the next build started
+    old.update(21, 'Dragon Keeper', 'More dragons.')
+    old.changed[21] = 200.0  # saved while it was reading books
+    old.remove(12)
+    old.changed[12] = 300.0
+
+    # the build read book 20, but not 21, and read 12 before it was deleted
+    new = make_index(BOOKS + [(20, 'Dragon Rider', 'Fire dragons.')], built_at=150.0)
+    new.carry_over(old)
+    assert set(ids(new.search('dragons'))) == {20, 21}
+    assert new.changed.keys() == {21, 12}
+    assert 12 not in ids(new.search('fire'))
+
+
+def test_diacritics_are_folded():
+    index = make_index([(1, 'Tiểu thuyết Đất rừng', 'Truyện về miền Nam.'), (2, 'Thơ', 'Tập thơ.')])
+    assert ids(index.search('tieu thuyet')) == [1]
+    assert ids(index.search('"dat rung"')) == [1]
+    assert ids(index.search('Tiểu Thuyết')) == [1]
+    assert index.search('và') == []  # stopword
+    assert index.search('va') == []  # the same stopword typed without diacritics
+    assert ids(index.search('truyen ve mien nam')) == [1]
+    index = make_index([(3, 'Chiến tranh và hòa bình', 'Leo Tolstoy.')])
+    assert ids(index.search('chien tranh va hoa binh')) == [3]
+    assert ids(index.search('"chien tranh va hoa binh"')) == [3]
@@ -0,0 +1,99 @@
+"""Conditional GET (ETag / Last-Modified) for read-only viewsets.
+
+Each model has a change counter in the ``conditional`` cache: a random token and the
+time it was set, replaced by ``bump`` when a ``post_save``/``post_delete`` commits.
+A response's ETag hashes the tokens of the models it depends on with the full
+request path (so every resource and every list query has its own) and the
+``Accept`` header. ``If-None-Match``/``If-Modified-Since`` are answered with a
+304 right after authentication, before the queryset or serializer run.
+
+Changes made outside the ORM (raw SQL, ``QuerySet.update``) fire no signal,
+so a token also expires after ``VERSION_TTL`` seconds; clients then revalidate
+with one full response. The cache must be shared by all worker processes
+(see ``CACHES``) for a bump in one to reach the others.
+
+Responses are ``private``: the catalog requires authentication, so shared
+caches must not store them; browsers revalidate (``no-cache``) every time.
+"""
+import hashlib
+import time
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+# longest time a change made behind the ORM's back can go unnoticed
+VERSION_TTL = 600
+# CACHES alias holding the change counters
+CACHE_ALIAS = 'conditional'
+
+
+def _key(model) -> str:
+    return f"version:{model._meta.label_lower}"
+
+
+def bump(model):
+    """Record a change to ``model``: new ETags, Last-Modified now."""
+    caches[CACHE_ALIAS].set(_key(model), (uuid.uuid4().hex, time.time()), VERSION_TTL)
+
+
+def version(model):
+    """``(token, last modified timestamp)`` of ``model``; a missing one starts now."""
+    cache = caches[CACHE_ALIAS]
+    value = cache.get(_key(model))
+    if value is None:
+        value = (uuid.uuid4().hex, time.time())
+        if not cache.add(_key(model), value, VERSION_TTL):
+            value = cache.get(_key(model)) or value  # another process started it first
+    return value
+
+
+def on_model_changed(sender, **kwargs):
+    # after commit: a request must not pair the new token with the old rows
+    transaction.on_commit(lambda: bump(sender))
+
+
+class ConditionalGetMixin:
+    """ETag/Last-Modified validators and 304s for ``list`` and ``retrieve``.
+
+    ``etag_models`` lists every model the responses are built from (default:
+    the queryset's model).
+    """
+
+    etag_models = None
+    cache_control = {'private': True, 'no_cache': True}
+
+    def get_etag_models(self):
+        return self.etag_models or (self.get_queryset().model,)
+
+    def get_validators(self, request):
+        versions = [version(model) for model in self.get_etag_models()]
+        digest = hashlib.sha1()
+        for token, _ in versions:
+            digest.update(token.encode())
+        digest.update(request.get_full_path().encode())
+        digest.update(request.META.get('HTTP_ACCEPT', '').encode())
+        return quote_etag(digest.hexdigest()[:32]), int(max(ts for _, ts in versions))
+
+    def _not_modified(self, request):
+        self._validators = self.get_validators(request)
+        etag, last_modified = self._validators
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self._not_modified(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._not_modified(request) or super().retrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, '_validators', None)
+        if validators is not None and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, **self.cache_control)
+        return response
@@ -0,0 +1,27 @@
+"""Database helpers shared by batch jobs (recommendations, exports, rollups)."""
+from django.db import connection
+
+
+def stream_rows(sql, params=None, chunk_size=50000):
+    """Yield lists of result tuples of at most ``chunk_size`` rows.
+
+    On MySQL the query runs on an unbuffered server-side cursor (``SSCursor``),
+    so the whole result set is never materialised in the client; other
+    backends fall back to ``fetchmany`` on a regular cursor.
+    """
+    connection.ensure_connection()
+    if connection.vendor == "mysql":
+        from MySQLdb.cursors import SSCursor
+
+        cursor = connection.connection.cursor(SSCursor)
+    else:
+        cursor = connection.cursor()
+    try:
+        cursor.execute(sql, params or ())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
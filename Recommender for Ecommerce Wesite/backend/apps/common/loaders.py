@@ -0,0 +1,35 @@
+"""Request-scoped batched loading of rows referenced by plain integer id columns.
+
+Several tables keep foreign ids as ``IntegerField`` (``Book.AuthorID`` ...),
+so ``select_related`` cannot follow them and resolving them per row is an
+N+1. A ``BatchLoader`` is primed with every id a page references, fetches the
+missing ones with a single ``IN`` query, and serves later lookups from memory.
+"""
+
+
+class BatchLoader:
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = tuple(fields)
+        self.pk = model._meta.pk.attname
+        self._rows = {}
+        self.queries = 0
+
+    def prime(self, ids):
+        """Fetch the rows of every id in ``ids`` not seen yet, in one query."""
+        missing = {i for i in ids if i is not None and i not in self._rows}
+        if not missing:
+            return
+        self.queries += 1
+        for row in self.model.objects.filter(pk__in=missing).values(self.pk, *self.fields):
+            self._rows[row[self.pk]] = {f: row[f] for f in self.fields}
+        for i in missing:
+            self._rows.setdefault(i, None)
+
+    def get(self, id_):
+        """The row of ``id_`` as a dict of ``fields``, or None (no id, or a dangling one)."""
+        if id_ is None:
+            return None
+        if id_ not in self._rows:
+            self.prime([id_])
+        return self._rows[id_]
@@ -0,0 +1,218 @@
+"""Keyset ("cursor") pagination, opt-in next to the default page numbers.
+
+``?page=N`` counts every matching row (``COUNT(*) OVER ()`` on the page
+query) and skips ``OFFSET (N-1)*PAGE_SIZE`` rows, so deep pages get linearly
+slower. A keyset page instead continues after the sort key of
+the last row it returned, ``WHERE (key, pk) > (last key, last pk)``. When the
+key is indexed (``Title``, ``Price``, ``PublicationDate`` and the pk are) each
+page is an index range scan of its own size; orderings on unindexed columns
+or annotations still sort every match per page, but skip the count and the
+OFFSET.
+
+The cursor carries the sort key values of the last row plus its primary key
+as a tiebreaker (in the direction of the last key), and the ordering it was
+made for. Any ordering on model fields or annotations is supported; NULLs sort
+first ascending and last descending (MySQL's native order) on every backend.
+Pages only go forward.
+
+A filter may instead hand over a bounded sequence already in its final order
+(ranked search results); its cursor is the position of the next row.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Count, F, Q, Window
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def sort_keys(queryset):
+    """``[(field, descending), ...]`` of the queryset's ordering, ending with the pk.
+
+    An appended pk tiebreaker takes the direction of the last key, so
+    ``-Price`` pages as ``Price DESC, BookID DESC`` and one index on
+    ``(Price)`` (which ends in the pk) serves it in a single backward scan.
+    """
+    pk = queryset.model._meta.pk.name
+    keys = []
+    for term in queryset.query.order_by or queryset.model._meta.ordering:
+        if not isinstance(term, str):
+            raise TypeError(f"keyset pagination needs field-name ordering, got {term!r}")
+        field = term.lstrip('-')
+        keys.append((pk if field == 'pk' else field, term.startswith('-')))
+        if keys[-1][0] == pk:
+            return keys
+    return keys + [(pk, keys[-1][1] if keys else False)]
+
+
+def _order_by(keys):
+    return [F(f).desc(nulls_last=True) if desc else F(f).asc(nulls_first=True) for f, desc in keys]
+
+
+def _after(field: str, desc: bool, value) -> Q:
+    """Rows strictly after ``value`` in the direction of ``field``."""
+    if desc:
+        return Q(pk__in=[]) if value is None else Q(**{f"{field}__lt": value}) | Q(**{f"{field}__isnull": True})
+    return Q(**{f"{field}__isnull": False}) if value is None else Q(**{f"{field}__gt": value})
+
+
+def _equal(field: str, value) -> Q:
+    return Q(**{f"{field}__isnull": True}) if value is None else Q(**{field: value})
+
+
+def keyset_filter(keys, values) -> Q:
+    """``(k1, k2, ...) > (v1, v2, ...)`` in sort order, expanded for indexes and NULLs."""
+    condition = Q(pk__in=[])
+    prefix = Q()
+    for (field, desc), value in zip(keys, values):
+        condition |= prefix & _after(field, desc, value)
+        prefix &= _equal(field, value)
+    return condition
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if not hasattr(queryset, 'query'):
+            return self.paginate_sequence(queryset, request)
+        self.keys = sort_keys(queryset)
+        self.ordering = ','.join(('-' if desc else '') + f for f, desc in self.keys)
+        queryset = queryset.order_by(*_order_by(self.keys))
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(keyset_filter(self.keys, self.decode_cursor(encoded, queryset.model)))
+        rows = list(queryset[:self.page_size + 1])
+        self.next_values = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_values = [getattr(rows[-1], f) for f, _ in self.keys]
+        return rows
+
+    def paginate_sequence(self, sequence, request):
+        self.keys, self.ordering = [('position', False)], 'position'
+        encoded = request.query_params.get(self.cursor_query_param)
+        start = self.decode_cursor(encoded, sequence.model)[0] if encoded else 0
+        if not isinstance(start, int) or start < 0:
+            raise NotFound(self.invalid_cursor_message)
+        rows = list(sequence[start:start + self.page_size + 1])
+        self.next_values = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_values = [start + self.page_size]
+        return rows
+
+    def encode_cursor(self, values) -> str:
+        payload = {
+            'o': self.ordering,
+            'v': [v if v is None or isinstance(v, (bool, int, float, str)) else str(v) for v in values],
+        }
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+    def decode_cursor(self, encoded: str, model):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if payload['o'] != self.ordering or len(payload['v']) != len(self.keys):
+                raise ValueError("cursor was made for another ordering")
+            values = []
+            for (field, _), value in zip(self.keys, payload['v']):
+                try:
+                    value = None if value is None else model._meta.get_field(field).to_python(value)
+                except FieldDoesNotExist:
+                    pass  # annotation: JSON value as is
+                values.append(value)
+            return values
+        except (binascii.Error, TypeError, KeyError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_values))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Keyset pagination: pass empty for the first page, then follow "next". '
+                           'No count, no OFFSET; on an indexed ordering deep pages cost the same as the first.',
+            'schema': {'type': 'string'},
+        }]
+
+
+class WindowCountPaginator(Paginator):
+    """Reads the total from ``COUNT(*) OVER ()`` on the page query instead of a separate COUNT.
+
+    An empty page (no results, or past the end) falls back to the COUNT to
+    tell the two apart. DISTINCT querysets and plain lists are counted as usual.
+    """
+
+    total_alias = 'paginator_total'
+
+    def page(self, number):
+        queryset = self.object_list
+        if not hasattr(queryset, 'annotate') or queryset.query.distinct or self.orphans:
+            return super().page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        bottom = (number - 1) * self.per_page
+        rows = list(queryset.annotate(**{self.total_alias: Window(Count('pk'))})[bottom:bottom + self.per_page])
+        if not rows:
+            return super().page(number)
+        # Paginator.count is a cached_property: this stands in for its query
+        self.count = getattr(rows[0], self.total_alias)
+        return self._get_page(rows, number, self)
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """Page numbers by default; keyset pages when the request has ``?cursor=`` (empty for the first).
+
+    A page-number page runs one query: the total comes with the rows.
+    """
+
+    django_paginator_class = WindowCountPaginator
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + \
+            self.keyset_class().get_schema_operation_parameters(view)
@@ -0,0 +1,12 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsStaff(BasePermission):
+    """Django admin (staff) users only.
+
+    Customer principals have no ``is_staff`` attribute, unlike Django users,
+    so DRF's ``IsAdminUser`` cannot be used on its own here.
+    """
+
+    def has_permission(self, request, view):
+        return bool(getattr(request.user, "is_staff", False))
@@ -0,0 +1,48 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from apps.catalog.models import Author, Book
+from apps.common.conditional import ConditionalGetMixin, bump
+
+LOCMEM = {alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'} for alias in ('default', 'conditional')}
+
+
+class FakeViewSet:
+    """Stands in for ReadOnlyModelViewSet: counts how often the handlers run."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def list(self, request, *args, **kwargs):
+        self.calls += 1
+        return HttpResponse('[]')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        return response
+
+
+class BookView(ConditionalGetMixin, FakeViewSet):
+    etag_models = (Book, Author)
+
+
+@override_settings(CACHES=LOCMEM)
+def test_revalidation_skips_the_handler_until_a_model_changes():
+    rf, view = RequestFactory(), BookView()
+    first = view.finalize_response(None, view.list(rf.get('/books/?ordering=Price')))
+    etag = first['ETag']
+    assert first.status_code == 200 and first['Last-Modified'] and 'no-cache' in first['Cache-Control']
+    # the catalog requires authentication: shared caches must not keep a copy
+    assert 'private' in first['Cache-Control'] and 'public' not in first['Cache-Control']
+
+    again = view.finalize_response(None, view.list(rf.get('/books/?ordering=Price', HTTP_IF_NONE_MATCH=etag)))
+    assert again.status_code == 304 and again['ETag'] == etag
+    assert view.calls == 1
+
+    # each list query has its own validator
+    other = view.finalize_response(None, view.list(rf.get('/books/?ordering=Title', HTTP_IF_NONE_MATCH=etag)))
+    assert other.status_code == 200 and other['ETag'] != etag
+
+    bump(Author)  # a dependency changed
+    changed = view.finalize_response(None, view.list(rf.get('/books/?ordering=Price', HTTP_IF_NONE_MATCH=etag)))
+    assert changed.status_code == 200 and changed['ETag'] != etag
+    assert view.calls == 3
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+from rest_framework.test import APIClient
+
+from apps.catalog.api.v1.serializers import BookSerializer
+from apps.catalog.models import Author, Book, Category, Publisher
+from apps.common.loaders import BatchLoader
+from apps.common.pagination import KeysetPagination, PageNumberOrKeysetPagination
+
+
+class FakeModel:
+    """Model stand-in whose manager records the IN queries it answers."""
+
+    _meta = SimpleNamespace(pk=SimpleNamespace(attname='AuthorID'))
+    rows = {1: 'Nguyễn Nhật Ánh', 2: 'Tô Hoài'}
+    queries = []
+
+    class objects:
+        @staticmethod
+        def filter(pk__in):
+            FakeModel.queries.append(set(pk__in))
+            found = [{'AuthorID': i, 'AuthorName': FakeModel.rows[i]} for i in pk__in if i in FakeModel.rows]
+            return SimpleNamespace(values=lambda *fields: found)
+
+
+def test_loader_batches_and_caches():
+    FakeModel.queries = []
+    loader = BatchLoader(FakeModel, ['AuthorName'])
+    loader.prime([1, 2, 1, None, 9])
+    assert FakeModel.queries == [{1, 2, 9}]
+    assert loader.get(2) == {'AuthorName': 'Tô Hoài'}
+    assert loader.get(9) is None and loader.get(None) is None
+    loader.prime([1, 2])
+    assert loader.queries == 1
+
+
+def test_expanded_page_costs_one_query_per_relation():
+    FakeModel.queries = []
+    books = [Book(BookID=i, Title=f'B{i}', AuthorID=1 + i % 3) for i in range(100)]
+    context = {'expand': ('author',), 'loaders': {'author': BatchLoader(FakeModel, ['AuthorID', 'AuthorName'])}}
+    data = BookSerializer(books, many=True, context=context).data
+    assert FakeModel.queries == [{1, 2, 3}]
+    assert data[0]['author'] == {'AuthorID': 1, 'AuthorName': 'Nguyễn Nhật Ánh'}
+    assert data[2]['author'] is None  # AuthorID 3 does not exist
+    assert 'publisher' not in data[0]
+
+
+@pytest.fixture
+def catalog(db, monkeypatch):
+    monkeypatch.setattr(PageNumberOrKeysetPagination, 'page_size', 100)
+    monkeypatch.setattr(KeysetPagination, 'page_size', 100)
+    for i in range(1, 4):
+        Author.objects.create(AuthorID=i, AuthorName=f'Author {i}')
+        Publisher.objects.create(PublisherID=i, PublisherName=f'Publisher {i}')
+        Category.objects.create(CategoryID=i, CategoryName=f'Category {i}')
+    Book.objects.bulk_create([
+        Book(BookID=i, Title=f'Book {i:03}', AuthorID=1 + i % 3, PublisherID=1 + i % 2, CategoryID=1 + i % 3)
+        for i in range(1, 151)
+    ])
+    client = APIClient()
+    client.force_authenticate(SimpleNamespace(is_authenticated=True, pk=1))
+    return client
+
+
+@pytest.mark.parametrize('pagination', ['page=1', 'page=2', 'cursor='])
+def test_expanded_book_page_costs_at_most_four_queries(catalog, django_assert_num_queries, pagination):
+    with django_assert_num_queries(4):
+        response = catalog.get(f'/api/v1/catalog/books/?expand=author,publisher,category&{pagination}')
+    assert response.status_code == 200
+    books = response.json()['results']
+    assert len(books) == (50 if pagination == 'page=2' else 100)
+    assert books[0]['author'] == {'AuthorID': 1 + books[0]['BookID'] % 3,
+                                  'AuthorName': f"Author {1 + books[0]['BookID'] % 3}"}
+    if pagination.startswith('page'):
+        assert response.json()['count'] == 150
+
+
+def test_pages_past_the_end_still_fall_back_to_the_count(catalog):
+    assert catalog.get('/api/v1/catalog/books/?page=3').status_code == 404
+    assert catalog.get('/api/v1/catalog/books/?page=x').status_code == 404
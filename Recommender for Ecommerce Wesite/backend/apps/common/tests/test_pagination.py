@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+import pytest
+from rest_framework.exceptions import NotFound
+from rest_framework.test import APIRequestFactory
+
+from apps.catalog.models import Book
+from apps.common.pagination import KeysetPagination, keyset_filter, sort_keys
+
+
+def _sql(queryset):
+    return str(queryset.query).replace('"', '').replace('`', '')
+
+
+def test_sort_keys_end_with_pk():
+    assert sort_keys(Book.objects.order_by('-Price')) == [('Price', True), ('BookID', True)]
+    assert sort_keys(Book.objects.order_by('Title', 'pk')) == [('Title', False), ('BookID', False)]
+    assert sort_keys(Book.objects.all()) == [('BookID', False)]
+    assert sort_keys(Book.objects.order_by('Title', '-Price')) == [('Title', False), ('Price', True), ('BookID', True)]
+
+
+def test_descending_tiebreaker_pages_backwards():
+    keys = sort_keys(Book.objects.order_by('-Price'))
+    sql = _sql(Book.objects.filter(keyset_filter(keys, [Decimal('9.50'), 7])))
+    assert 'Price < 9.50' in sql and 'BookID < 7' in sql
+
+
+def test_keyset_filter_handles_nulls():
+    keys = [('Price', False), ('BookID', False)]
+    sql = _sql(Book.objects.filter(keyset_filter(keys, [Decimal('9.50'), 7])))
+    assert 'Price > 9.50' in sql and 'BookID > 7' in sql
+    # ascending NULLs come first: after a NULL key, the non-NULL rows follow
+    sql = _sql(Book.objects.filter(keyset_filter(keys, [None, 7])))
+    assert 'Price IS NOT NULL' in sql and 'Price IS NULL' in sql
+
+
+def test_cursor_round_trip_and_tampering():
+    request = APIRequestFactory().get('/books/')
+    paginator = KeysetPagination()
+    paginator.request = request
+    paginator.keys = sort_keys(Book.objects.order_by('-Price'))
+    paginator.ordering = '-Price,-BookID'
+    encoded = paginator.encode_cursor([Decimal('12.30'), 42])
+    assert paginator.decode_cursor(encoded, Book) == [Decimal('12.30'), 42]
+    paginator.ordering = 'Title,BookID'
+    with pytest.raises(NotFound):
+        paginator.decode_cursor(encoded, Book)
+    with pytest.raises(NotFound):
+        paginator.decode_cursor('not-a-cursor', Book)
@@ -0,0 +1,22 @@
+import unicodedata
+
+from apps.common.text import fold, ngrams, normalize, tokenize
+
+
+def test_normalize_matches_precomposed_and_combining_forms():
+    combining = unicodedata.normalize('NFD', 'Tiểu Thuyết')
+    assert combining != 'Tiểu Thuyết'
+    assert normalize(combining) == normalize('Tiểu Thuyết') == 'tiểu thuyết'
+
+
+def test_fold_drops_marks_and_maps_d():
+    assert fold('Đường Xưa Mây Trắng') == 'duong xua may trang'
+    assert fold(None) == ''
+
+
+def test_tokenize_drops_stopwords_and_ngrams_join_syllables():
+    tokens = tokenize('Tuổi thơ và những cuốn sách')
+    assert tokens == ['tuổi', 'thơ', 'cuốn', 'sách']
+    assert tokenize('và sách', stopwords=()) == ['và', 'sách']
+    assert ngrams(tokens) == ['tuổi_thơ', 'thơ_cuốn', 'cuốn_sách']
+    assert ngrams(['một']) == []
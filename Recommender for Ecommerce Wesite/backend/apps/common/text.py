@@ -0,0 +1,45 @@
+"""Vietnamese-aware text normalisation and tokenisation.
+
+Vietnamese writes one syllable per space-separated token and most words are
+two-syllable compounds ("tuổi thơ", "tiểu thuyết"), so callers that care about
+words should also look at syllable bigrams (see :func:`ngrams`).
+"""
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# very common syllables/words that carry no topical signal
+STOPWORDS = frozenset("""
+và của là có cho một những các được trong với không này đã để khi từ người về
+như thì mà lại đến ra vào cũng rất nhiều theo tại trên nên đó nhưng hay
+the a an and of to in for on is are with by at from as or its this that
+""".split())
+
+
+def normalize(text: str) -> str:
+    """NFC-compose and lowercase, so precomposed and combining forms match."""
+    return unicodedata.normalize("NFC", text or "").lower()
+
+
+def fold(text: str) -> str:
+    """:func:`normalize`, then drop tone and vowel marks and map đ to d: "Đường" -> "duong".
+
+    Customers often type Vietnamese without diacritics; search matches on the
+    folded form.
+    """
+    decomposed = unicodedata.normalize("NFD", normalize(text)).replace("đ", "d")
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+# STOPWORDS as they look after fold(), for text typed without diacritics
+FOLDED_STOPWORDS = frozenset(fold(w) for w in STOPWORDS)
+
+
+def tokenize(text: str, stopwords=STOPWORDS) -> list:
+    """Lowercased syllables/words of ``text`` in order, stopwords removed."""
+    return [t for t in TOKEN_RE.findall(normalize(text)) if t not in stopwords]
+
+
+def ngrams(tokens: list, n: int = 2, joiner: str = "_") -> list:
+    return [joiner.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
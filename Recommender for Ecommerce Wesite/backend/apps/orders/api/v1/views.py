@@ -2,10 +2,11 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from django.utils import timezone
 from decimal import Decimal
 
+from apps.common.pagination import KeysetPagination
 from apps.orders.models import Order, OrderDetail
 from apps.catalog.models import Book
 from .serializers import (
@@ -120,6 +121,10 @@ def create_order(request):
 
 @extend_schema(
     tags=["orders"],
+    parameters=[OpenApiParameter(
+        "cursor", str,
+        description='Opt-in keyset pages: empty for the first, then follow "next" (response becomes {next, results})',
+    )],
     responses={200: OrderListSerializer(many=True)}
 )
 @api_view(['GET'])
@@ -131,6 +136,10 @@ def list_orders(request):
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
 
     orders = Order.objects.filter(CustomerID=customer_id).order_by('-OrderDate')
+    paginator = None
+    if KeysetPagination.cursor_query_param in request.query_params:
+        paginator = KeysetPagination()
+        orders = paginator.paginate_queryset(orders, request)
     
     orders_data = []
     for order in orders:
@@ -146,6 +155,8 @@ def list_orders(request):
         })
     
     serializer = OrderListSerializer(orders_data, many=True)
+    if paginator is not None:
+        return paginator.get_paginated_response(serializer.data)
     return Response(serializer.data)
 
 
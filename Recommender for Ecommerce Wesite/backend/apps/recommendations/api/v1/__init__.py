@@ -0,0 +1 @@
+# recommendations api v1 package
@@ -0,0 +1,39 @@
+from rest_framework import serializers
+
+
+class ScoredBookOut(serializers.Serializer):
+    book_id = serializers.IntegerField()
+    score = serializers.FloatField(allow_null=True)
+
+
+class SimilarBooksOut(serializers.Serializer):
+    book_id = serializers.IntegerField()
+    source = serializers.ChoiceField(choices=("cooccurrence", "content", "ann"), allow_null=True)
+    results = ScoredBookOut(many=True)
+
+
+class TrendingOut(serializers.Serializer):
+    category = serializers.IntegerField(allow_null=True)
+    results = ScoredBookOut(many=True)
+
+
+class NextBooksOut(serializers.Serializer):
+    items = serializers.ListField(child=serializers.IntegerField())
+    results = ScoredBookOut(many=True)
+
+
+class RuleBookOut(serializers.Serializer):
+    book_id = serializers.IntegerField()
+    confidence = serializers.FloatField()
+    lift = serializers.FloatField()
+    support = serializers.FloatField()
+
+
+class BoughtTogetherOut(serializers.Serializer):
+    items = serializers.ListField(child=serializers.IntegerField())
+    results = RuleBookOut(many=True)
+
+
+class ForYouOut(serializers.Serializer):
+    source = serializers.ChoiceField(choices=("cache", "stale", "popular"))
+    results = ScoredBookOut(many=True)
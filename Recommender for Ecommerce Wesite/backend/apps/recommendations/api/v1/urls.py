@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import similar, for_you, trending, next_in_session, bought_together
+
+urlpatterns = [
+    path("similar/<int:book_id>/", similar, name="recommendations-similar"),
+    path("for-you/", for_you, name="recommendations-for-you"),
+    path("trending/", trending, name="recommendations-trending"),
+    path("next/", next_in_session, name="recommendations-next"),
+    path("bought-together/", bought_together, name="recommendations-bought-together"),
+]
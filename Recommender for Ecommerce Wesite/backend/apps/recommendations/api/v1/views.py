@@ -0,0 +1,116 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from ...services.baskets import bought_together as bought_together_rules
+from ...services.customer_cache import recommendations_for
+from ...services.sessions import next_books
+from ...services.similar import similar_books
+from ...services.trending import trending_books
+from .serializers import SimilarBooksOut, ForYouOut, TrendingOut, NextBooksOut, BoughtTogetherOut
+
+MAX_LIMIT = 50
+MAX_ITEMS = 20
+
+
+def _limit(request, default=10):
+    try:
+        return max(1, min(MAX_LIMIT, int(request.query_params.get("limit", default))))
+    except ValueError:
+        return default
+
+
+def _items(request):
+    raw = request.query_params.get("items", "")
+    return [int(x) for x in raw.split(",") if x.strip().isdigit()][-MAX_ITEMS:]
+
+
+@extend_schema(
+    summary="Books similar to a book (precomputed item-to-item table)",
+    tags=["Recommendations"],
+    parameters=[OpenApiParameter("limit", int, description=f"Max results (1-{MAX_LIMIT})")],
+    responses={200: SimilarBooksOut},
+)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def similar(request, book_id: int):
+    # lookups only: every source is precomputed offline (see management commands)
+    source, found = similar_books(book_id, _limit(request))
+    results = [{"book_id": bid, "score": round(score, 6)} for bid, score in found]
+    return Response({"book_id": book_id, "source": source, "results": results})
+
+
+@extend_schema(
+    summary="Personalised recommendations for the logged-in customer (cached ALS results)",
+    tags=["Recommendations"],
+    parameters=[OpenApiParameter("limit", int, description=f"Max results (1-{MAX_LIMIT})")],
+    responses={200: ForYouOut},
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def for_you(request):
+    # never computes inline: misses answer with popular books while the
+    # customer's entry is recomputed in the background
+    source, recs = recommendations_for(request.user.id, _limit(request))
+    results = [{"book_id": bid, "score": None if score is None else round(score, 6)} for bid, score in recs]
+    return Response({"source": source, "results": results})
+
+
+@extend_schema(
+    summary="Trending books, overall or within a category (time-decayed activity)",
+    tags=["Recommendations"],
+    parameters=[
+        OpenApiParameter("category", int, description="CategoryID; omit for all books"),
+        OpenApiParameter("limit", int, description=f"Max results (1-{MAX_LIMIT})"),
+    ],
+    responses={200: TrendingOut},
+)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def trending(request):
+    try:
+        category = int(request.query_params["category"])
+    except (KeyError, ValueError):
+        category = None
+    # answered from in-memory per-category top lists; no query per request
+    found = trending_books(category, _limit(request))
+    results = [{"book_id": bid, "score": round(score, 6)} for bid, score in found]
+    return Response({"category": category, "results": results})
+
+
+@extend_schema(
+    summary="Next-book suggestions for the current session (session transition model)",
+    tags=["Recommendations"],
+    parameters=[
+        OpenApiParameter("items", str, description="Comma-separated BookIDs seen this session, oldest first"),
+        OpenApiParameter("limit", int, description=f"Max results (1-{MAX_LIMIT})"),
+    ],
+    responses={200: NextBooksOut},
+)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def next_in_session(request):
+    items = _items(request)
+    found = next_books(items, _limit(request))
+    results = [{"book_id": bid, "score": round(score, 6)} for bid, score in found]
+    return Response({"items": items, "results": results})
+
+
+@extend_schema(
+    summary="Books frequently bought together with the cart's books (association rules)",
+    tags=["Recommendations"],
+    parameters=[
+        OpenApiParameter("items", str, description="Comma-separated BookIDs in the cart"),
+        OpenApiParameter("limit", int, description=f"Max results (1-{MAX_LIMIT})"),
+    ],
+    responses={200: BoughtTogetherOut},
+)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def bought_together(request):
+    items = _items(request)
+    results = [
+        {"book_id": bid, "confidence": round(conf, 6), "lift": round(lift, 6), "support": round(sup, 6)}
+        for bid, conf, lift, sup in bought_together_rules(items, _limit(request))
+    ]
+    return Response({"items": items, "results": results})
@@ -4,4 +4,11 @@ from django.apps import AppConfig
 class RecommendationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.recommendations'
-    label = 'recommendations'
\ No newline at end of file
+    label = 'recommendations'
+
+    def ready(self):
+        from apps.activities.signals import activity_logged
+        from .services import customer_cache, trending
+
+        activity_logged.connect(customer_cache.on_activity_logged, dispatch_uid='recommendations.customer_cache')
+        activity_logged.connect(trending.on_activity_logged, dispatch_uid='recommendations.trending')
@@ -0,0 +1,29 @@
+from django.conf import settings
+
+DEFAULTS = {
+    'MODEL_DIR': 'var/recommender',
+    'ACTION_WEIGHTS': {'view': 1.0, 'add_to_cart': 3.0, 'checkout': 4.0, 'purchase': 5.0},
+    'SIMILAR_TOP_K': 50,
+    'READ_CHUNK_SIZE': 50000,
+    'SIMILARITY_BLOCK_SIZE': 2048,
+    'CONTENT_CANDIDATES': 200,
+    'ALS_FACTORS': 64,
+    'ALS_ITERATIONS': 15,
+    'ALS_REGULARIZATION': 0.1,
+    'ALS_ALPHA': 10.0,
+    'ANN_NPROBE': 16,
+    'CUSTOMER_CACHE_SIZE': 100000,
+    'CUSTOMER_CACHE_TOP_N': 50,
+    'TRENDING_HALF_LIFE_HOURS': 24.0,
+    'TRENDING_TOP_N': 100,
+    'SESSION_GAP_MINUTES': 30,
+    'SESSION_CONTEXT': 3,
+    'BASKET_MIN_SUPPORT': 5,
+    'BASKET_MIN_CONFIDENCE': 0.05,
+    'INTERACTIONS_SOURCE': 'db',
+}
+
+
+def rec_setting(name):
+    """Return a RECOMMENDATIONS setting, falling back to the defaults above."""
+    return getattr(settings, 'RECOMMENDATIONS', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.recommendations.services.ann import add_new_books, evaluate, rebuild_ann_index
+from apps.recommendations.services.artifacts import ArtifactLocked
+
+
+class Command(BaseCommand):
+    help = 'Build the ANN index over ALS book factors and report recall/latency against exact search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lists', type=int, default=None, help='Number of inverted lists (default 4*sqrt(n))')
+        parser.add_argument('--nprobe', type=int, default=None, help='Lists scanned per query when evaluating')
+        parser.add_argument('--queries', type=int, default=200, help='Sample queries used for the recall report')
+        parser.add_argument('--add-new', action='store_true',
+                            help='Only insert books that appeared since the index was built')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options['add_new']:
+                added = add_new_books()
+                self.stdout.write(self.style.SUCCESS(f"Inserted {added} new books"))
+                return
+            built = rebuild_ann_index(options['lists'])
+        except ArtifactLocked as e:
+            raise CommandError(str(e))
+        if built is None:
+            raise CommandError("No ALS model found; run `manage.py train_als` first")
+        index, ids, vectors = built
+        self.stdout.write(
+            f"Indexed {len(index)} books in {index.n_lists} lists in {time.perf_counter() - started:.1f}s"
+        )
+        report = evaluate(index, ids, vectors, queries=options['queries'], nprobe=options['nprobe'])
+        self.stdout.write(self.style.SUCCESS(
+            f"recall@10={report['recall']:.3f} p50={report['p50_ms']:.2f}ms p99={report['p99_ms']:.2f}ms"
+        ))
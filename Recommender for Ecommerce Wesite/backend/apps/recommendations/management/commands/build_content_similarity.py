@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.recommendations.services.artifacts import ArtifactLocked
+from apps.recommendations.services.content import add_new_books, rebuild_content_similarity
+
+
+class Command(BaseCommand):
+    help = 'Build TF-IDF content neighbours for every book (or only for books added since the last build)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None, help='Neighbours stored per book')
+        parser.add_argument('--new-only', action='store_true',
+                            help='Vectorise only books added since the last build')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options['new_only']:
+                added = add_new_books()
+                self.stdout.write(self.style.SUCCESS(
+                    f"Added {added} books in {time.perf_counter() - started:.1f}s"
+                ))
+                return
+            table = rebuild_content_similarity(k=options['top_k'])
+        except ArtifactLocked as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored top-{table.k} content neighbours for {len(table.book_ids)} books "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.recommendations.services.batch import build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Precompute top-N recommendations for every customer into customerrecommendation (parallel, resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Books stored per customer')
+        parser.add_argument('--shard-size', type=int, default=10000, help='CustomerIDs per shard')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--batch-rows', type=int, default=1000, help='Rows per multi-row INSERT')
+        parser.add_argument('--restart', action='store_true', help='Ignore progress from an interrupted run')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        customers = build_recommendations(
+            limit=options['limit'],
+            shard_size=options['shard_size'],
+            workers=options['workers'],
+            batch_rows=options['batch_rows'],
+            restart=options['restart'],
+            stdout=self.stdout,
+        )
+        if customers is None:
+            raise CommandError("No ALS model found; run train_als first")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored recommendations for {customers} customers in {elapsed:.1f}s "
+            f"({customers / max(elapsed, 1e-9):.0f} customers/s)"
+        ))
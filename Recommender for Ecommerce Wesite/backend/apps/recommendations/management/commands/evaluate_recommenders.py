@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.recommendations.services.evaluation import ALGORITHMS, evaluate
+
+
+class Command(BaseCommand):
+    help = 'Time-split UserActivity, train each recommender and report quality and cost as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithms', default=','.join(ALGORITHMS),
+                            help=f"Comma-separated subset of: {', '.join(ALGORITHMS)}")
+        parser.add_argument('--k', type=int, default=10, help='Cut-off for recall@K / NDCG@K')
+        parser.add_argument('--test-fraction', type=float, default=0.2,
+                            help='Share of the most recent activity held out for testing')
+        parser.add_argument('--max-customers', type=int, default=5000, help='Test customers sampled')
+        parser.add_argument('--in-process', action='store_true',
+                            help='Run every algorithm in this process (peak RSS is then shared)')
+        parser.add_argument('--output', default=None, help='Write the JSON report here instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            report = evaluate(
+                names=[n.strip() for n in options['algorithms'].split(',') if n.strip()],
+                k=options['k'],
+                test_fraction=options['test_fraction'],
+                max_customers=options['max_customers'],
+                isolate=not options['in_process'],
+                stdout=self.stderr,
+            )
+        except (KeyError, ValueError) as e:
+            raise CommandError(str(e))
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(payload)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(payload)
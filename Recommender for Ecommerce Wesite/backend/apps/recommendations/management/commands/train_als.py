@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.recommendations.services.als import rebuild_als
+from apps.recommendations.services.artifacts import ArtifactLocked
+
+
+class Command(BaseCommand):
+    help = 'Train the implicit-feedback ALS model on UserActivity and store its factor matrices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=None)
+        parser.add_argument('--iterations', type=int, default=None)
+        parser.add_argument('--regularization', type=float, default=None)
+        parser.add_argument('--alpha', type=float, default=None)
+
+    def handle(self, *args, **options):
+        params = {
+            key: options[key]
+            for key in ('factors', 'iterations', 'regularization', 'alpha')
+            if options[key] is not None
+        }
+        started = time.perf_counter()
+        try:
+            U, V = rebuild_als(stdout=self.stdout, **params)
+        except ArtifactLocked as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {U.shape[0]} customer and {V.shape[0]} book factors (f={U.shape[1]}) "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
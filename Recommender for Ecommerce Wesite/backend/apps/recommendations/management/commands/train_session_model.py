@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.recommendations.services.artifacts import ArtifactLocked
+from apps.recommendations.services.sessions import train_session_model
+
+
+class Command(BaseCommand):
+    help = 'Train the session next-item transition model from time-ordered UserActivity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None, help='Successors stored per book')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            n_books = train_session_model(k=options['top_k'], stdout=self.stdout)
+        except ArtifactLocked as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored next-item transitions for {n_books} books in {time.perf_counter() - started:.1f}s"
+        ))
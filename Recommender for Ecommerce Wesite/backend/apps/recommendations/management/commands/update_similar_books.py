@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.recommendations.services.artifacts import ArtifactLocked
+from apps.recommendations.services.item_similarity import update_similar_books
+
+
+class Command(BaseCommand):
+    help = 'Fold UserActivity rows newer than the stored ActivityID watermark into the similar-books table'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            refreshed = update_similar_books(stdout=self.stdout)
+        except ArtifactLocked as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        if refreshed is None:
+            self.stdout.write(self.style.SUCCESS(f"No model found; ran a full rebuild in {elapsed:.1f}s"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} books in {elapsed:.1f}s"))
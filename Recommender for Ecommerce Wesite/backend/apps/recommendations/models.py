@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class CustomerRecommendation(models.Model):
+    """Precomputed top-N books per customer, written by ``build_recommendations``."""
+    RecommendationID = models.BigAutoField(primary_key=True, db_column='RecommendationID')
+    CustomerID = models.IntegerField(db_column='CustomerID')
+    Position = models.SmallIntegerField(db_column='Position')
+    BookID = models.IntegerField(db_column='BookID')
+    Score = models.FloatField(null=True, blank=True, db_column='Score')
+    Source = models.CharField(max_length=20, db_column='Source')
+    GeneratedAt = models.DateTimeField(db_column='GeneratedAt')
+
+    class Meta:
+        managed = False
+        db_table = 'customerrecommendation'
+        unique_together = (('CustomerID', 'Position'),)
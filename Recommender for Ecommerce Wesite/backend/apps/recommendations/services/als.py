@@ -0,0 +1,182 @@
+"""Implicit-feedback matrix factorisation (Hu, Koren & Volinsky ALS).
+
+The action-weighted customer x book matrix R gives preferences p = [R > 0]
+and confidences c = 1 + alpha * R. Each half-step solves the regularised
+least-squares system of every customer (or book) with a few warm-started
+conjugate-gradient steps (Takacs et al., 2011) that run for all rows at once,
+so there is no Python loop per customer and no f x f system per row.
+
+Factors are stored as ``.npy`` artifacts and opened with ``mmap_mode='r'`` by
+the serving code, so all workers share one page-cached copy of the model.
+"""
+import numpy as np
+from scipy import sparse
+
+from apps.activities.services.watermarks import settled_mark
+from ..conf import rec_setting
+from .artifacts import ArtifactLocked, artifact_lock, get_artifact, save_artifact
+from .interactions import interaction_matrix, load_training_interactions
+from .neighbors import top_k
+
+ARTIFACT = 'als'
+# extra ANN candidates fetched to make room for filtering already-seen books
+MAX_SEEN_SKIP = 200
+# non-zeros per gather when computing (C - I) products; bounds temporary memory
+NNZ_CHUNK = 1 << 18
+
+
+def _weighted_gram(R: sparse.csr_matrix, rows_of: np.ndarray, Y: np.ndarray, X: np.ndarray) -> np.ndarray:
+    """Row u of the result is sum_i R[u, i] * (y_i . x_u) * y_i, for every u at once."""
+    dots = np.empty(R.nnz, dtype=np.float32)
+    for s in range(0, R.nnz, NNZ_CHUNK):
+        e = s + NNZ_CHUNK
+        dots[s:e] = np.einsum('ij,ij->i', Y[R.indices[s:e]], X[rows_of[s:e]])
+    M = sparse.csr_matrix((R.data * dots, R.indices, R.indptr), shape=R.shape)
+    return M @ Y
+
+
+def _half_step(R: sparse.csr_matrix, Y: np.ndarray, X: np.ndarray, alpha: float, reg: float,
+               cg_steps: int) -> np.ndarray:
+    """Refine the row factors X given the column factors Y with a few CG steps.
+
+    Every row u solves (Y^T C_u Y + reg I) x_u = Y^T C_u p_u. The conjugate
+    gradient iterations run for all rows simultaneously: each step is one
+    gather over the non-zeros plus sparse products, O(nnz * f), instead of
+    building and factorising an f x f system per row.
+    """
+    W = R.copy()
+    W.data = (alpha * W.data).astype(np.float32)          # c - 1 on the non-zeros
+    rows_of = np.repeat(np.arange(R.shape[0], dtype=np.int32), np.diff(R.indptr))
+    YtY = (Y.T @ Y).astype(np.float32)
+    C = W.copy()
+    C.data = C.data + 1.0
+    b = C @ Y
+
+    def apply(V):
+        return V @ YtY + reg * V + _weighted_gram(W, rows_of, Y, V)
+
+    X = X.copy()
+    r = b - apply(X)
+    p = r.copy()
+    rs_old = np.einsum('ij,ij->i', r, r)
+    for _ in range(cg_steps):
+        Ap = apply(p)
+        denom = np.einsum('ij,ij->i', p, Ap)
+        step = np.divide(rs_old, denom, out=np.zeros_like(rs_old), where=denom > 0)
+        X += step[:, None] * p
+        r -= step[:, None] * Ap
+        rs_new = np.einsum('ij,ij->i', r, r)
+        beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+        p = r + beta[:, None] * p
+        rs_old = rs_new
+    return X
+
+
+def train_als(R: sparse.csr_matrix, factors: int = None, iterations: int = None,
+              regularization: float = None, alpha: float = None, cg_steps: int = 3, seed: int = 0):
+    """Return ``(user_factors, item_factors)`` for the customer x book matrix R."""
+    factors = factors or rec_setting('ALS_FACTORS')
+    iterations = iterations or rec_setting('ALS_ITERATIONS')
+    regularization = regularization if regularization is not None else rec_setting('ALS_REGULARIZATION')
+    alpha = alpha if alpha is not None else rec_setting('ALS_ALPHA')
+
+    R = R.tocsr().astype(np.float32)
+    R.eliminate_zeros()
+    Rt = R.T.tocsr()
+    rng = np.random.default_rng(seed)
+    U = (rng.standard_normal((R.shape[0], factors)) * 0.01).astype(np.float32)
+    V = (rng.standard_normal((R.shape[1], factors)) * 0.01).astype(np.float32)
+    for _ in range(iterations):
+        U = _half_step(R, V, U, alpha, regularization, cg_steps)
+        V = _half_step(Rt, U, V, alpha, regularization, cg_steps)
+    return U, V
+
+
+def rebuild_als(stdout=None, **params):
+    """Train on the whole UserActivity table and store the factor matrices.
+
+    An existing ANN index is rebuilt from the new item factors; until then
+    customers are scored exactly.
+    """
+    from . import ann
+
+    with artifact_lock(ARTIFACT):
+        # cut at the settled ActivityID, which add_new_books continues from
+        watermark, _ = settled_mark()
+        inter = load_training_interactions().through(watermark)
+        R, customer_ids, book_ids = interaction_matrix(inter)
+        if stdout:
+            stdout.write(f"Training on {R.nnz} customer/book pairs ({len(customer_ids)} x {len(book_ids)})")
+        U, V = train_als(R, **params)
+        popularity = np.asarray(R.sum(axis=0)).ravel()
+        save_artifact(
+            ARTIFACT,
+            {
+                'user_factors': U,
+                'item_factors': V,
+                'customer_ids': customer_ids.astype(np.int32),
+                'book_ids': book_ids.astype(np.int32),
+                'seen_indptr': R.indptr.astype(np.int64),
+                'seen_indices': R.indices.astype(np.int32),
+                'popular_book_ids': book_ids[np.argsort(-popularity, kind='stable')].astype(np.int32),
+            },
+            meta={'factors': int(U.shape[1]), 'watermark': watermark},
+        )
+    if get_artifact(ann.ARTIFACT) is not None:
+        try:
+            ann.rebuild_ann_index()
+        except ArtifactLocked:
+            # an index build is running; the periodic add_new_books re-indexes if it used the old model
+            if stdout:
+                stdout.write("ANN index is being rebuilt elsewhere; customers are scored exactly until it matches")
+    return U, V
+
+
+def score_customer(artifact, row: int, limit: int, exclude_seen: bool = True):
+    """``[(book_id, score), ...]`` for the customer at ``row`` of the artifact."""
+    scores = artifact['item_factors'] @ artifact['user_factors'][row]
+    if exclude_seen:
+        indptr = artifact['seen_indptr']
+        scores[artifact['seen_indices'][indptr[row]:indptr[row + 1]]] = -np.inf
+    best = top_k(scores, limit)
+    best = best[np.isfinite(scores[best])]
+    return list(zip(artifact['book_ids'][best].tolist(), scores[best].tolist()))
+
+
+def customer_row(artifact, customer_id: int):
+    ids = artifact['customer_ids']
+    i = int(np.searchsorted(ids, customer_id))
+    if i < len(ids) and ids[i] == customer_id:
+        return i
+    return None
+
+
+def popular_books(limit: int = 10):
+    artifact = get_artifact(ARTIFACT)
+    if artifact is None:
+        return []
+    return artifact['popular_book_ids'][:limit].tolist()
+
+
+def recommend_for_customer(customer_id: int, limit: int = 10):
+    """Personalised top-``limit`` books, or None if the customer is not in the model.
+
+    Uses the ANN index over the item factors when one has been built from this
+    model and falls back to exact scoring of every book otherwise.
+    """
+    from .ann import index_for
+
+    artifact = get_artifact(ARTIFACT)
+    if artifact is None:
+        return None
+    row = customer_row(artifact, customer_id)
+    if row is None:
+        return None
+    index = index_for(artifact)
+    if index is None:
+        return score_customer(artifact, row, limit)
+    indptr = artifact['seen_indptr']
+    seen = artifact['book_ids'][artifact['seen_indices'][indptr[row]:indptr[row + 1]]]
+    ids, scores = index.search(artifact['user_factors'][row], limit + min(len(seen), MAX_SEEN_SKIP))
+    keep = ~np.isin(ids, seen)
+    return list(zip(ids[keep][:limit].tolist(), scores[keep][:limit].tolist()))
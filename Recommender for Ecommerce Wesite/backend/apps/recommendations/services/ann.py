@@ -0,0 +1,288 @@
+"""In-process approximate nearest-neighbour search over book embeddings (IVF).
+
+Vectors are clustered with k-means into ``n_lists`` inverted lists. The lists
+are stored contiguously (CSR style: ``list_offsets`` into ``list_ids`` /
+``list_vectors``) so a query scores the centroids, then a few contiguous slices
+of the ``nprobe`` closest lists, and finishes with an argpartition top-K.
+
+Books added after the index was built go to a small pending segment that is
+scanned exhaustively and merged into the lists on the next save.
+
+The index records the ALS artifact version its vectors come from. Customer
+factors of any other version live in a different space, so customer searches
+only use an index built from the current model (:func:`index_for`) and
+``rebuild_als`` re-indexes after training.
+"""
+import time
+
+import numpy as np
+from scipy import sparse
+
+from apps.activities.services.watermarks import settled_mark
+from ..conf import rec_setting
+from . import als
+from .artifacts import artifact_lock, get_artifact, save_artifact
+from .interactions import load_interactions
+from .neighbors import top_k
+
+ARTIFACT = 'ann_items'
+# rows per matrix product when assigning vectors to centroids
+ASSIGN_CHUNK = 65536
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid (L2) for every vector."""
+    half_norms = 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+    out = np.empty(len(vectors), dtype=np.int32)
+    for s in range(0, len(vectors), ASSIGN_CHUNK):
+        out[s:s + ASSIGN_CHUNK] = np.argmax(vectors[s:s + ASSIGN_CHUNK] @ centroids.T - half_norms, axis=1)
+    return out
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 10, sample: int = 64, seed: int = 0):
+    """Lloyd's k-means on at most ``sample`` points per centroid."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > k * sample:
+        vectors = vectors[rng.choice(len(vectors), k * sample, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+        members = sparse.csr_matrix(
+            (np.ones(len(labels), dtype=np.float32), (labels, np.arange(len(labels)))),
+            shape=(k, len(vectors)),
+        )
+        sums = members @ vectors
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # re-seed empty clusters from random points
+        if not filled.all():
+            centroids[~filled] = vectors[rng.choice(len(vectors), int((~filled).sum()))]
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index keyed by BookID; scores are inner product or cosine."""
+
+    def __init__(self, centroids, list_offsets, list_ids, list_vectors, norms=None, id_order=None):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.list_vectors = list_vectors
+        if norms is None:
+            norms = np.maximum(np.linalg.norm(list_vectors, axis=1), 1e-12).astype(np.float32)
+        self.norms = norms
+        self.id_order = np.argsort(list_ids, kind='stable') if id_order is None else id_order
+        self.pending_ids = np.empty(0, np.int32)
+        self.pending_vectors = np.empty((0, centroids.shape[1]), np.float32)
+
+    @classmethod
+    def build(cls, ids, vectors, n_lists: int = None, iterations: int = 10):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int32)
+        n_lists = n_lists or max(1, min(len(vectors), int(4 * np.sqrt(len(vectors)))))
+        centroids = kmeans(vectors, n_lists, iterations)
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind='stable')
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=n_lists))
+        return cls(centroids, offsets, ids[order], vectors[order])
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.list_ids) + len(self.pending_ids)
+
+    def __contains__(self, book_id):
+        return self.vector(book_id) is not None
+
+    def add(self, ids, vectors):
+        """Insert new books; they are searchable immediately."""
+        self.pending_ids = np.concatenate([self.pending_ids, np.asarray(ids, dtype=np.int32)])
+        self.pending_vectors = np.concatenate([self.pending_vectors, np.asarray(vectors, dtype=np.float32)])
+
+    def compact(self):
+        """Merge the pending segment into the inverted lists (no re-clustering)."""
+        if not len(self.pending_ids):
+            return self
+        labels = np.concatenate([
+            np.repeat(np.arange(self.n_lists, dtype=np.int32), np.diff(self.list_offsets)),
+            _assign(self.pending_vectors, self.centroids),
+        ])
+        ids = np.concatenate([self.list_ids, self.pending_ids])
+        vectors = np.concatenate([self.list_vectors, self.pending_vectors])
+        order = np.argsort(labels, kind='stable')
+        offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=self.n_lists))
+        return IVFIndex(self.centroids, offsets, ids[order], vectors[order])
+
+    def vector(self, book_id: int):
+        pos = np.searchsorted(self.list_ids, book_id, sorter=self.id_order)
+        if pos < len(self.id_order) and self.list_ids[self.id_order[pos]] == book_id:
+            return self.list_vectors[self.id_order[pos]]
+        hit = np.flatnonzero(self.pending_ids == book_id)
+        return self.pending_vectors[hit[0]] if len(hit) else None
+
+    def search(self, query, k: int = 10, nprobe: int = None, cosine: bool = False):
+        """Approximate top-``k`` ``(ids, scores)`` for ``query``."""
+        nprobe = min(self.n_lists, nprobe or rec_setting('ANN_NPROBE'))
+        query = np.asarray(query, dtype=np.float32)
+        probe = top_k(self.centroids @ query, nprobe)
+        slices = [slice(self.list_offsets[c], self.list_offsets[c + 1]) for c in probe]
+        ids = [self.list_ids[s] for s in slices]
+        scores = [self.list_vectors[s] @ query for s in slices]
+        if cosine:
+            scores = [sc / self.norms[s] for sc, s in zip(scores, slices)]
+        if len(self.pending_ids):
+            ids.append(self.pending_ids)
+            pending = self.pending_vectors @ query
+            if cosine:
+                pending = pending / np.maximum(np.linalg.norm(self.pending_vectors, axis=1), 1e-12)
+            scores.append(pending)
+        ids = np.concatenate(ids)
+        scores = np.concatenate(scores)
+        best = top_k(scores, k)
+        if cosine:
+            scores = scores / max(float(np.linalg.norm(query)), 1e-12)
+        return ids[best], scores[best]
+
+    def save(self, name: str = ARTIFACT, meta: dict = None):
+        index = self.compact()
+        return save_artifact(name, {
+            'centroids': index.centroids,
+            'list_offsets': index.list_offsets,
+            'list_ids': index.list_ids,
+            'list_vectors': index.list_vectors,
+            'norms': index.norms,
+            'id_order': index.id_order,
+        }, meta)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls(
+            artifact['centroids'], artifact['list_offsets'], artifact['list_ids'],
+            artifact['list_vectors'], artifact['norms'], artifact['id_order'],
+        )
+
+
+_loaded = {}
+
+
+def current_index(name: str = ARTIFACT):
+    """The stored index, rebuilt as an object only when the artifact changes."""
+    artifact = get_artifact(name)
+    if artifact is None:
+        return None
+    if _loaded.get(name, (None,))[0] is not artifact:
+        _loaded[name] = (artifact, IVFIndex.from_artifact(artifact))
+    return _loaded[name][1]
+
+
+def model_version(model) -> str:
+    """Identity of one stored ALS artifact version."""
+    return model.path.name
+
+
+def index_for(model):
+    """The index if it was built from the ALS artifact ``model``, else None."""
+    artifact = get_artifact(ARTIFACT)
+    if artifact is None or artifact.meta.get('als_version') != model_version(model):
+        return None
+    return current_index()
+
+
+def exact_search(vectors, ids, query, k, cosine=False):
+    scores = vectors @ query
+    if cosine:
+        scores = scores / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+    best = top_k(scores, k)
+    return ids[best]
+
+
+def evaluate(index: IVFIndex, ids, vectors, queries: int = 200, k: int = 10, nprobe: int = None, seed: int = 0):
+    """Recall@k against exact search plus per-query latency percentiles (ms)."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), min(queries, len(vectors)), replace=False)
+    hits, latencies = 0, []
+    for i in picks:
+        expected = set(exact_search(vectors, ids, vectors[i], k).tolist())
+        started = time.perf_counter()
+        found, _ = index.search(vectors[i], k, nprobe)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(expected.intersection(found.tolist()))
+    latencies = np.array(latencies)
+    return {
+        'recall': hits / (len(picks) * k),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+    }
+
+
+def _meta(model, watermark: int) -> dict:
+    return {'source': als.ARTIFACT, 'als_version': model_version(model), 'watermark': watermark}
+
+
+def _build(model, n_lists: int = None):
+    ids, vectors = np.array(model['book_ids']), np.array(model['item_factors'])
+    index = IVFIndex.build(ids, vectors, n_lists)
+    index.save(meta=_meta(model, model.meta['watermark']))
+    return index, ids, vectors
+
+
+def rebuild_ann_index(n_lists: int = None):
+    """Index the ALS item factors; returns ``(index, ids, vectors)`` or None without a model."""
+    with artifact_lock(ARTIFACT):
+        model = get_artifact(als.ARTIFACT)
+        if model is None:
+            return None
+        return _build(model, n_lists)
+
+
+def add_new_books():
+    """Fold books that appeared after the ALS model was trained into the index.
+
+    Their vectors are solved against the stored customer factors (one ALS
+    half-step over just the new books), so no retraining is needed. Only
+    activity up to the settled ActivityID is read (see
+    ``apps.activities.services.watermarks``), so a new book's vector is not
+    built while rows for it may still be committing. An index built from an
+    older model is rebuilt from the current one instead. Returns the number
+    of books added.
+    """
+    with artifact_lock(ARTIFACT):
+        model, stored = get_artifact(als.ARTIFACT), get_artifact(ARTIFACT)
+        if model is None or stored is None:
+            return 0
+        if stored.meta.get('als_version') != model_version(model):
+            # the stored vectors and the current customer factors are different spaces
+            index, _, _ = _build(model)
+            return len(index)
+        index = IVFIndex.from_artifact(stored)
+        watermark = stored.meta['watermark']
+        high, _ = settled_mark()
+        if high <= watermark:
+            return 0
+        delta = load_interactions(after_id=watermark, up_to=high)
+        customer_ids = model['customer_ids']
+        rows = np.searchsorted(customer_ids, delta.customer_id)
+        rows[rows == len(customer_ids)] = 0
+        known = customer_ids[rows] == delta.customer_id
+        indexed = np.concatenate([np.asarray(index.list_ids), index.pending_ids])
+        new = known & ~np.isin(delta.book_id, indexed)
+        book_ids, cols = np.unique(delta.book_id[new], return_inverse=True)
+        if len(book_ids):
+            R = sparse.csr_matrix(
+                (delta.weights()[new], (cols, rows[new])),
+                shape=(len(book_ids), len(customer_ids)), dtype=np.float32,
+            )
+            R.sum_duplicates()
+            U = np.asarray(model['user_factors'])
+            vectors = als._half_step(
+                R, U, np.zeros((len(book_ids), U.shape[1]), dtype=np.float32),
+                rec_setting('ALS_ALPHA'), rec_setting('ALS_REGULARIZATION'), cg_steps=U.shape[1],
+            )
+            index.add(book_ids, vectors)
+        index.save(meta=_meta(model, high))
+    return len(book_ids)
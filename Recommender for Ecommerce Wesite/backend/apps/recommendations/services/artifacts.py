@@ -0,0 +1,144 @@
+"""Versioned on-disk storage for precomputed model arrays.
+
+Each artifact is a directory of ``.npy`` files plus ``meta.json``. A small
+``<name>.current`` pointer file names the live version and is swapped with
+``os.replace`` so readers never observe a half-written model. Readers open the
+arrays with ``mmap_mode='r'``, which lets every worker process share a single
+page-cached copy.
+"""
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from ..conf import rec_setting
+
+KEEP_VERSIONS = 2
+# a build lock older than this is assumed to belong to a crashed process
+STALE_LOCK_SECONDS = 6 * 3600
+
+
+class Artifact:
+    """Read-only view over one stored artifact version."""
+
+    def __init__(self, path: Path, arrays: dict, meta: dict):
+        self.path = path
+        self.arrays = arrays
+        self.meta = meta
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def __contains__(self, key):
+        return key in self.arrays
+
+
+def model_dir() -> Path:
+    path = Path(rec_setting('MODEL_DIR'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _pointer(name: str) -> Path:
+    return model_dir() / f"{name}.current"
+
+
+def save_artifact(name: str, arrays: dict, meta: dict = None) -> Path:
+    """Write ``arrays`` as a new version of ``name`` and make it current."""
+    base = model_dir()
+    version = f"{name}-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{time.monotonic_ns() % 10**6}"
+    target = base / version
+    target.mkdir()
+    for key, value in arrays.items():
+        np.save(target / f"{key}.npy", np.ascontiguousarray(value), allow_pickle=False)
+    with open(target / "meta.json", "w", encoding="utf-8") as fh:
+        json.dump({**(meta or {}), "created_at": time.time()}, fh)
+
+    tmp = base / f".{name}.current.{os.getpid()}"
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, _pointer(name))
+    _prune(name, keep=version)
+    return target
+
+
+def _prune(name: str, keep: str):
+    versions = sorted(
+        (p for p in model_dir().glob(f"{name}-*") if p.is_dir() and p.name != keep),
+        key=lambda p: p.stat().st_mtime,
+    )
+    # older versions may still be mapped by workers that have not reloaded yet
+    for path in versions[: max(0, len(versions) - (KEEP_VERSIONS - 1))]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def load_artifact(name: str, mmap: bool = True):
+    """Load the current version of ``name`` or return None if it was never built."""
+    try:
+        version = _pointer(name).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return open_artifact(model_dir() / version, mmap)
+
+
+def open_artifact(path: Path, mmap: bool = True) -> Artifact:
+    """Open one specific artifact version (e.g. to pin it across worker processes)."""
+    path = Path(path)
+    arrays = {
+        f.stem: np.load(f, mmap_mode="r" if mmap else None, allow_pickle=False)
+        for f in path.glob("*.npy")
+    }
+    with open(path / "meta.json", encoding="utf-8") as fh:
+        meta = json.load(fh)
+    return Artifact(path, arrays, meta)
+
+
+_cache = {}
+
+
+def get_artifact(name: str):
+    """Return the current artifact, reloading only when its pointer changed.
+
+    This is what request handlers call; the check is a single ``stat``.
+    """
+    try:
+        stamp = _pointer(name).stat().st_mtime_ns
+    except FileNotFoundError:
+        _cache.pop(name, None)
+        return None
+    cached = _cache.get(name)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, load_artifact(name))
+        _cache[name] = cached
+    return cached[1]
+
+
+class ArtifactLocked(Exception):
+    pass
+
+
+@contextmanager
+def artifact_lock(name: str):
+    """Serialise writers (full rebuild vs. incremental update) of one artifact."""
+    path = model_dir() / f"{name}.lock"
+    try:
+        if time.time() - path.stat().st_mtime > STALE_LOCK_SECONDS:
+            path.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        raise ArtifactLocked(f"{name} is being rebuilt by another process")
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,217 @@
+"""Frequently-bought-together rules mined from order baskets.
+
+A basket is the set of books of one order whose Status is not ``cart``,
+``pending`` or ``cancelled`` (case-insensitive). Rows are streamed ordered by
+OrderID through a server-side cursor and turned into sparse basket x book
+indicator blocks; a basket split across chunks is carried over to the next
+one. Mining is level-wise (Apriori) with three streaming passes, so memory
+depends on the number of frequent items and pairs, never on the number of
+baskets:
+
+1. support of every book;
+2. co-occurrence of frequent books, ``B^T B`` per block;
+3. for every frequent pair, the books found with it (pair-indicator ``^T B``).
+
+Rules ``A -> C`` and ``{A, B} -> C`` are stored with their support,
+confidence and lift, sorted by antecedent so a lookup is one slice.
+"""
+import numpy as np
+from django.db import connection
+from scipy import sparse
+
+from apps.common.db import stream_rows
+from apps.orders.models import Order, OrderDetail
+from ..conf import rec_setting
+from .artifacts import artifact_lock, get_artifact, save_artifact
+
+ARTIFACT = 'bought_together'
+EXCLUDED_STATUSES = ('cart', 'pending', 'cancelled')
+# baskets with more distinct books than this (bulk/B2B orders) are skipped
+MAX_BASKET_ITEMS = 100
+
+
+def _basket_sql():
+    qn = connection.ops.quote_name
+    statuses = ", ".join(f"'{s}'" for s in EXCLUDED_STATUSES)
+    return (
+        f"SELECT d.{qn('OrderID')}, d.{qn('BookID')} "
+        f"FROM {qn(OrderDetail._meta.db_table)} d "
+        f"JOIN {qn(Order._meta.db_table)} o ON o.{qn('OrderID')} = d.{qn('OrderID')} "
+        f"WHERE d.{qn('BookID')} IS NOT NULL AND o.{qn('Status')} IS NOT NULL "
+        f"AND LOWER(o.{qn('Status')}) NOT IN ({statuses}) "
+        f"ORDER BY d.{qn('OrderID')}"
+    )
+
+
+def basket_blocks(chunk_size: int = None):
+    """Yield ``(basket_rows, book_ids)`` arrays of whole baskets, duplicates removed.
+
+    ``basket_rows`` numbers the baskets of one block from 0.
+    """
+    chunk_size = chunk_size or rec_setting('READ_CHUNK_SIZE')
+    carry = np.empty((0, 2), dtype=np.int64)
+
+    def block(rows):
+        rows = np.unique(rows, axis=0)  # sorted by (OrderID, BookID), quantity rows merged
+        _, basket = np.unique(rows[:, 0], return_inverse=True)
+        sizes = np.bincount(basket)
+        keep = sizes[basket] <= MAX_BASKET_ITEMS
+        _, basket = np.unique(basket[keep], return_inverse=True)
+        return basket, rows[keep, 1]
+
+    for chunk in stream_rows(_basket_sql(), chunk_size=chunk_size):
+        rows = np.concatenate([carry, np.array(chunk, dtype=np.int64)])
+        # the last order may continue in the next chunk
+        tail = rows[:, 0] == rows[-1, 0]
+        carry = rows[tail]
+        if (~tail).any():
+            yield block(rows[~tail])
+    if len(carry):
+        yield block(carry)
+
+
+def _indicator(basket, cols, n_baskets, n_cols):
+    return sparse.csr_matrix(
+        (np.ones(len(basket), dtype=np.float32), (basket, cols)), shape=(n_baskets, n_cols),
+    )
+
+
+def mine_rules(blocks, min_support: int, min_confidence: float):
+    """Mine pair and triple rules; ``blocks`` is a callable returning a fresh block iterator."""
+    # pass 1: baskets per book
+    counts, n_baskets = np.zeros(0, dtype=np.int64), 0
+    for basket, books in blocks():
+        n_baskets += int(basket.max()) + 1 if len(basket) else 0
+        found = np.bincount(books)
+        if len(found) > len(counts):
+            counts = np.pad(counts, (0, len(found) - len(counts)))
+        counts[:len(found)] += found
+    items = np.flatnonzero(counts >= min_support)
+    col_of = np.full(len(counts), -1, dtype=np.int64)
+    col_of[items] = np.arange(len(items))
+    n = len(items)
+
+    def frequent(basket, books):
+        cols = col_of[books]
+        keep = cols >= 0
+        return _indicator(basket[keep], cols[keep], int(basket.max()) + 1, n)
+
+    # pass 2: pair counts among frequent books
+    pairs = sparse.csr_matrix((n, n), dtype=np.float32)
+    for basket, books in blocks():
+        if len(basket):
+            B = frequent(basket, books)
+            pairs = pairs + sparse.triu(B.T @ B, k=1).tocsr()
+    pairs = pairs.tocoo()
+    keep = pairs.data >= min_support
+    pa, pb, n_ab = pairs.row[keep], pairs.col[keep], pairs.data[keep]
+
+    # pass 3: for each frequent pair (a, b), baskets also holding c > b
+    triples = sparse.csr_matrix((len(pa), n), dtype=np.float32)
+    for basket, books in blocks():
+        if len(basket) and len(pa):
+            B = frequent(basket, books).tocsc()
+            both = B[:, pa].multiply(B[:, pb]).tocsr()
+            triples = triples + (both.T @ B).tocsr()
+    triples = triples.tocoo()
+    keep = (triples.data >= min_support) & (triples.col > pb[triples.row])
+    ta, tb, tc = pa[triples.row[keep]], pb[triples.row[keep]], triples.col[keep]
+    n_abc = triples.data[keep]
+
+    support = counts[items] / max(n_baskets, 1)
+    pair_count = sparse.csr_matrix((n_ab, (pa, pb)), shape=(n, n))
+    pair_count = pair_count + pair_count.T
+
+    def count_of(x, y):
+        return np.asarray(pair_count[x, y]).ravel()
+
+    # pair rules in both directions
+    ant = np.concatenate([pa, pb])
+    con = np.concatenate([pb, pa])
+    n_pair = np.concatenate([n_ab, n_ab])
+    pair_rules = _rules(items[ant], None, items[con], n_pair, counts[items][ant], support[con],
+                        n_baskets, min_confidence)
+
+    # triple rules with each of the three books as the consequent
+    a = np.concatenate([ta, ta, tb])
+    b = np.concatenate([tb, tc, tc])
+    c = np.concatenate([tc, tb, ta])
+    n_triple = np.concatenate([n_abc, n_abc, n_abc])
+    triple_rules = _rules(items[a], items[b], items[c], n_triple, count_of(a, b) if len(a) else n_triple,
+                          support[c], n_baskets, min_confidence)
+    return pair_rules, triple_rules, n_baskets
+
+
+def _rules(first, second, consequent, together, antecedent_count, consequent_support, n_baskets,
+           min_confidence):
+    confidence = together / np.maximum(antecedent_count, 1)
+    keep = confidence >= min_confidence
+    rules = {
+        'first': first[keep].astype(np.int32),
+        'consequent': consequent[keep].astype(np.int32),
+        'support': (together[keep] / max(n_baskets, 1)).astype(np.float32),
+        'confidence': confidence[keep].astype(np.float32),
+        'lift': (confidence[keep] / np.maximum(consequent_support[keep], 1e-12)).astype(np.float32),
+    }
+    if second is not None:
+        rules['second'] = second[keep].astype(np.int32)
+    # grouped by antecedent, most confident first
+    keys = [-rules['confidence'], rules['first']] if second is None else \
+        [-rules['confidence'], rules['second'], rules['first']]
+    order = np.lexsort(keys)
+    return {k: v[order] for k, v in rules.items()}
+
+
+def _antecedent_keys(first, second=None):
+    keys = first.astype(np.int64) << 32
+    return keys if second is None else keys | second.astype(np.int64)
+
+
+def rebuild_bought_together(min_support: int = None, min_confidence: float = None, stdout=None):
+    """Mine confirmed orders and store the rules; returns ``(pair rules, triple rules, baskets)``."""
+    min_support = min_support or rec_setting('BASKET_MIN_SUPPORT')
+    min_confidence = min_confidence if min_confidence is not None else rec_setting('BASKET_MIN_CONFIDENCE')
+    with artifact_lock(ARTIFACT):
+        pair_rules, triple_rules, n_baskets = mine_rules(basket_blocks, min_support, min_confidence)
+        arrays = {f'pair_{k}': v for k, v in pair_rules.items()}
+        arrays.update({f'triple_{k}': v for k, v in triple_rules.items()})
+        arrays['pair_keys'] = _antecedent_keys(pair_rules['first'])
+        arrays['triple_keys'] = _antecedent_keys(triple_rules['first'], triple_rules['second'])
+        save_artifact(ARTIFACT, arrays, {
+            'baskets': n_baskets, 'min_support': min_support, 'min_confidence': min_confidence,
+        })
+    if stdout:
+        stdout.write(f"Mined {n_baskets} baskets")
+    return len(pair_rules['first']), len(triple_rules['first']), n_baskets
+
+
+def bought_together(book_ids, limit: int = 10):
+    """``[(book_id, confidence, lift, support), ...]`` for books in a cart.
+
+    Every rule whose antecedent is in the cart votes; a candidate keeps its
+    most confident rule, triple rules being more specific than pair rules.
+    """
+    artifact = get_artifact(ARTIFACT)
+    cart = sorted(set(int(b) for b in book_ids))
+    if artifact is None or not cart:
+        return []
+    lookups = [('pair', _antecedent_keys(np.array(cart)))]
+    if len(cart) > 1:
+        a, b = np.triu_indices(len(cart), k=1)
+        lookups.append(('triple', _antecedent_keys(np.array(cart)[a], np.array(cart)[b])))
+
+    best = {}
+    for kind, keys in lookups:
+        stored = artifact[f'{kind}_keys']
+        lo, hi = np.searchsorted(stored, keys, 'left'), np.searchsorted(stored, keys, 'right')
+        for s, e in zip(lo.tolist(), hi.tolist()):
+            for c, conf, lift, sup in zip(
+                artifact[f'{kind}_consequent'][s:e].tolist(), artifact[f'{kind}_confidence'][s:e].tolist(),
+                artifact[f'{kind}_lift'][s:e].tolist(), artifact[f'{kind}_support'][s:e].tolist(),
+            ):
+                if c not in best or conf > best[c][0]:
+                    best[c] = (conf, lift, sup)
+    for c in cart:
+        best.pop(c, None)
+    ranked = sorted(best.items(), key=lambda kv: (-kv[1][0], -kv[1][1]))[:limit]
+    return [(c, conf, lift, sup) for c, (conf, lift, sup) in ranked]
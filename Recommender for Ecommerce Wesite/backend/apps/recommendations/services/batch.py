@@ -0,0 +1,159 @@
+"""Precompute recommendations for every customer, sharded across processes.
+
+Customers are split into CustomerID ranges. Each worker process opens one
+pinned version of the ALS artifact with ``mmap_mode='r'`` (all workers share
+the page cache), scores its customers in blocks with one matrix product per
+block, and replaces the shard's rows in ``customerrecommendation`` with
+multi-row INSERTs inside a single transaction, so re-running a shard is safe.
+
+Completed shards are recorded in a progress file next to the model artifacts;
+a later run with the same model and parameters skips them.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from apps.users.models import Customer
+from ..models import CustomerRecommendation
+from . import als
+from .artifacts import get_artifact, model_dir, open_artifact
+
+PROGRESS_FILE = 'build_recommendations.progress.json'
+# score cells (customers x books) materialised per block; bounds worker memory
+SCORE_CELLS = 1 << 23
+COLUMNS = ('CustomerID', 'Position', 'BookID', 'Score', 'Source', 'GeneratedAt')
+
+_model = None
+
+
+def _init_worker(model_path: str):
+    import django
+
+    django.setup()
+    global _model
+    _model = open_artifact(model_path)
+
+
+def top_n_block(artifact, rows: np.ndarray, limit: int):
+    """``(book_ids, scores)`` of shape ``(len(rows), limit)`` for model rows, seen books excluded.
+
+    Slots left without a candidate hold -inf scores.
+    """
+    V = artifact['item_factors']
+    S = np.asarray(artifact['user_factors'][rows]) @ V.T
+    indptr = artifact['seen_indptr']
+    lens = indptr[rows + 1] - indptr[rows]
+    offsets = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens) + np.repeat(indptr[rows], lens)
+    S[np.repeat(np.arange(len(rows)), lens), artifact['seen_indices'][offsets]] = -np.inf
+    limit = min(limit, S.shape[1])
+    part = np.argpartition(-S, limit - 1, axis=1)[:, :limit]
+    vals = np.take_along_axis(S, part, axis=1)
+    order = np.argsort(-vals, axis=1, kind='stable')
+    return artifact['book_ids'][np.take_along_axis(part, order, axis=1)], np.take_along_axis(vals, order, axis=1)
+
+
+def _insert_rows(rows: list, batch_rows: int):
+    qn = connection.ops.quote_name
+    table = qn(CustomerRecommendation._meta.db_table)
+    columns = ", ".join(qn(c) for c in COLUMNS)
+    placeholder = "(" + ", ".join(["%s"] * len(COLUMNS)) + ")"
+    with connection.cursor() as cursor:
+        for s in range(0, len(rows), batch_rows):
+            batch = rows[s:s + batch_rows]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([placeholder] * len(batch))}",
+                [value for row in batch for value in row],
+            )
+
+
+def build_shard(lo: int, hi: int, limit: int, batch_rows: int = 1000, artifact=None):
+    """Recompute and store recommendations of customers with ``lo <= CustomerID < hi``.
+
+    Returns ``(lo, customers, seconds)``.
+    """
+    started = time.perf_counter()
+    artifact = artifact or _model
+    customer_ids = np.array(
+        Customer.objects.filter(CustomerID__gte=lo, CustomerID__lt=hi)
+        .order_by('CustomerID').values_list('CustomerID', flat=True),
+        dtype=np.int64,
+    )
+    model_ids = artifact['customer_ids']
+    pos = np.searchsorted(model_ids, customer_ids)
+    pos[pos == len(model_ids)] = 0
+    known = model_ids[pos] == customer_ids if len(model_ids) else np.zeros(len(customer_ids), bool)
+
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = []
+    block = max(1, SCORE_CELLS // max(1, len(artifact['book_ids'])))
+    known_ids, known_rows = customer_ids[known], pos[known]
+    for s in range(0, len(known_rows), block):
+        book_ids, scores = top_n_block(artifact, known_rows[s:s + block], limit)
+        for cid, books, vals in zip(known_ids[s:s + block].tolist(), book_ids.tolist(), scores.tolist()):
+            rows.extend(
+                (cid, i, bid, score, 'als', now)
+                for i, (bid, score) in enumerate(zip(books, vals)) if score != -np.inf
+            )
+    popular = artifact['popular_book_ids'][:limit].tolist()
+    for cid in customer_ids[~known].tolist():
+        rows.extend((cid, i, bid, None, 'popular', now) for i, bid in enumerate(popular))
+
+    with transaction.atomic():
+        CustomerRecommendation.objects.filter(CustomerID__gte=lo, CustomerID__lt=hi).delete()
+        _insert_rows(rows, batch_rows)
+    return lo, len(customer_ids), time.perf_counter() - started
+
+
+def _write_progress(path, params: dict, done: set):
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'params': params, 'done': sorted(done)}), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def build_recommendations(limit: int = 20, shard_size: int = 10000, workers: int = None,
+                          batch_rows: int = 1000, restart: bool = False, stdout=None):
+    """Fill ``customerrecommendation`` for every customer; returns the number processed.
+
+    Returns None when there is no ALS model yet.
+    """
+    artifact = get_artifact(als.ARTIFACT)
+    if artifact is None:
+        return None
+    bounds = Customer.objects.aggregate(lo=Min('CustomerID'), hi=Max('CustomerID'))
+    if bounds['lo'] is None:
+        return 0
+    shards = [(lo, min(lo + shard_size, bounds['hi'] + 1)) for lo in range(bounds['lo'], bounds['hi'] + 1, shard_size)]
+
+    progress = model_dir() / PROGRESS_FILE
+    params = {'model': str(artifact.path), 'limit': limit, 'shard_size': shard_size, 'first': bounds['lo']}
+    done = set()
+    if not restart and progress.exists():
+        saved = json.loads(progress.read_text(encoding='utf-8'))
+        if saved['params'] == params:
+            done = set(saved['done'])
+    todo = [s for s in shards if s[0] not in done]
+    if stdout and done:
+        stdout.write(f"Resuming: {len(done)} of {len(shards)} shards already done")
+
+    customers = 0
+    # forked workers must not share the parent's database connection
+    connections.close_all()
+    with ProcessPoolExecutor(workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(str(artifact.path),)) as pool:
+        futures = {pool.submit(build_shard, lo, hi, limit, batch_rows): (lo, hi) for lo, hi in todo}
+        for future in as_completed(futures):
+            lo, n, seconds = future.result()
+            customers += n
+            done.add(lo)
+            _write_progress(progress, params, done)
+            if stdout:
+                hi = futures[future][1]
+                stdout.write(f"Shard [{lo}, {hi}): {n} customers in {seconds:.1f}s ({len(done)}/{len(shards)})")
+    progress.unlink(missing_ok=True)
+    return customers
@@ -0,0 +1,213 @@
+"""Content-based "similar books" for cold-start items (no UserActivity needed).
+
+Each book becomes a hashed TF-IDF vector over its Title and Description
+syllables and syllable bigrams. Neighbours are found by text cosine with
+blocked sparse products, so only ``block_size`` rows of the similarity matrix
+exist at any time; each row keeps its best ``CONTENT_CANDIDATES`` books, which
+are then re-weighted by a shared author or category. Author and category are
+not vector features: a one-hot column shared by a whole category would make
+every product dense across it.
+
+Document frequencies are stored with the vectors: books added later are
+vectorised with the stored statistics and merged into existing neighbour lists
+without re-vectorising the catalog.
+"""
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+from apps.catalog.models import Book
+from apps.common.text import STOPWORDS, ngrams, tokenize
+from ..conf import rec_setting
+from .artifacts import artifact_lock, load_artifact
+from .neighbors import EMPTY, NeighborTable, top_k, topk_per_row
+
+ARTIFACT = 'content_similarity'
+N_FEATURES = 1 << 20
+TITLE_WEIGHT = 2.0
+# added to the text cosine of a candidate by the same author / in the same category
+AUTHOR_BONUS = 0.3
+CATEGORY_BONUS = 0.2
+
+BOOK_FIELDS = ('BookID', 'Title', 'Description', 'AuthorID', 'CategoryID')
+
+
+def _hash(feature: str) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(feature.encode('utf-8')) % N_FEATURES
+
+
+def book_features(title, description) -> dict:
+    """Weighted term counts ``{feature_index: weight}`` of one book's text."""
+    counts = {}
+
+    def add(features, weight):
+        for f in features:
+            h = _hash(f)
+            counts[h] = counts.get(h, 0.0) + weight
+
+    for text, weight in ((title, TITLE_WEIGHT), (description, 1.0)):
+        syllables = tokenize(text, stopwords=())
+        add((s for s in syllables if s not in STOPWORDS), weight)
+        add(ngrams(syllables), weight)
+    return counts
+
+
+def term_matrix(rows) -> tuple:
+    """``(book_ids, TF, tags)`` for ``Book`` value rows.
+
+    TF uses sublinear 1 + log(tf); ``tags`` is ``(n, 2)`` AuthorID, CategoryID
+    with ``EMPTY`` for a missing one.
+    """
+    book_ids, tags, indptr, indices, data = [], [], [0], [], []
+    for book_id, title, description, author_id, category_id in rows:
+        counts = book_features(title, description)
+        book_ids.append(book_id)
+        tags.append((EMPTY if author_id is None else author_id, EMPTY if category_id is None else category_id))
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+    tf = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+        shape=(len(book_ids), N_FEATURES),
+    )
+    tf.sum_duplicates()
+    tf.data = 1.0 + np.log(tf.data)
+    return np.asarray(book_ids, dtype=np.int32), tf, np.asarray(tags, dtype=np.int32).reshape(-1, 2)
+
+
+def tfidf(tf: sparse.csr_matrix, df: np.ndarray, n_docs: int) -> sparse.csr_matrix:
+    """Apply smoothed idf and L2-normalise rows."""
+    idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    X = tf.multiply(idf[None, :]).tocsr().astype(np.float32)
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms).dot(X).tocsr().astype(np.float32)
+
+
+def blend(text, q_tags, x_tags):
+    """Text cosine re-weighted by a shared author / category, scaled back into [0, 1]."""
+    same = (q_tags == x_tags) & (q_tags != EMPTY)
+    bonus = same[..., 0] * AUTHOR_BONUS + same[..., 1] * CATEGORY_BONUS
+    return ((text + bonus) / (1.0 + AUTHOR_BONUS + CATEGORY_BONUS)).astype(np.float32)
+
+
+def blocked_topk(Q: sparse.csr_matrix, X: sparse.csr_matrix, k: int, q_tags, x_tags,
+                 self_offset: int = None, block_size: int = None):
+    """Top-``k`` neighbours among the rows of X for every row of Q.
+
+    Each block keeps the best ``CONTENT_CANDIDATES`` rows of X by text cosine
+    and ranks only those by :func:`blend`. With ``self_offset`` set, row i of Q
+    is row ``self_offset + i`` of X and is excluded from its own neighbours.
+    """
+    block_size = block_size or rec_setting('SIMILARITY_BLOCK_SIZE')
+    n_candidates = max(k, rec_setting('CONTENT_CANDIDATES'))
+    Xt = X.T.tocsr()
+    cols = np.empty((Q.shape[0], k), dtype=np.int64)
+    vals = np.empty((Q.shape[0], k), dtype=np.float32)
+    for start in range(0, Q.shape[0], block_size):
+        S = (Q[start:start + block_size] @ Xt).tocsr()
+        stop = start + S.shape[0]
+        if self_offset is not None:
+            row_of = np.repeat(np.arange(S.shape[0]), np.diff(S.indptr))
+            S.data[S.indices == row_of + start + self_offset] = 0
+            S.eliminate_zeros()
+        cand, text = topk_per_row(S, n_candidates)
+        scores = np.where(cand == EMPTY, -np.inf, blend(text, q_tags[start:stop, None], x_tags[cand]))
+        best = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        cand = np.take_along_axis(cand, best, axis=1)
+        cols[start:stop] = cand
+        vals[start:stop] = np.where(cand == EMPTY, 0, np.take_along_axis(scores, best, axis=1))
+    return cols, vals
+
+
+def _save(table: NeighborTable, X, tags, df, n_docs, k):
+    table.save(
+        ARTIFACT,
+        meta={'k': k, 'n_docs': n_docs},
+        extra={'df': df, 'tags': tags, 'x_indptr': X.indptr, 'x_indices': X.indices, 'x_data': X.data},
+    )
+
+
+def _rebuild(k: int) -> NeighborTable:
+    rows = Book.objects.order_by('BookID').values_list(*BOOK_FIELDS).iterator(chunk_size=2000)
+    book_ids, tf, tags = term_matrix(rows)
+    df = np.bincount(tf.indices, minlength=N_FEATURES).astype(np.int32)
+    X = tfidf(tf, df, len(book_ids))
+    cols, vals = blocked_topk(X, X, k, tags, tags, self_offset=0)
+    table = NeighborTable.from_topk(book_ids, cols, vals)
+    _save(table, X, tags, df, len(book_ids), k)
+    return table
+
+
+def rebuild_content_similarity(k: int = None) -> NeighborTable:
+    """Vectorise the whole catalog and store its top-K content neighbours."""
+    with artifact_lock(ARTIFACT):
+        return _rebuild(k or rec_setting('SIMILAR_TOP_K'))
+
+
+def add_new_books() -> int:
+    """Vectorise books missing from the stored model and merge them in.
+
+    New rows get their own neighbour lists; existing rows only change where a
+    new book beats their current K-th neighbour. Returns the number added.
+    """
+    with artifact_lock(ARTIFACT):
+        # read under the lock: df and n_docs are cumulative, like the rows they count
+        artifact = load_artifact(ARTIFACT, mmap=False)
+        if artifact is None or 'tags' not in artifact:
+            # no model yet, or one with author/category still inside the vectors
+            return len(_rebuild(rec_setting('SIMILAR_TOP_K')).book_ids)
+        table = NeighborTable.from_artifact(artifact)
+        known = table.book_ids
+        rows = (
+            Book.objects.filter(BookID__gt=int(known[-1]) if len(known) else 0)
+            .order_by('BookID').values_list(*BOOK_FIELDS)
+        )
+        new_ids, tf, new_tags = term_matrix(rows)
+        if not len(new_ids):
+            return 0
+        k = artifact.meta['k']
+        df = artifact['df'] + np.bincount(tf.indices, minlength=N_FEATURES).astype(np.int32)
+        n_docs = artifact.meta['n_docs'] + len(new_ids)
+        X_new = tfidf(tf, df, n_docs)
+        X_old = sparse.csr_matrix(
+            (artifact['x_data'], artifact['x_indices'], artifact['x_indptr']),
+            shape=(len(known), N_FEATURES),
+        )
+        X = sparse.vstack([X_old, X_new]).tocsr()
+        all_ids = np.concatenate([known, new_ids])
+        old_tags = artifact['tags']
+        tags = np.concatenate([old_tags, new_tags])
+
+        # neighbour lists of the new books, against the whole catalog
+        cols, vals = blocked_topk(X_new, X, k, new_tags, tags, self_offset=len(known))
+        fresh = NeighborTable.from_topk(new_ids, cols, vals, col_ids=all_ids)
+
+        # new books entering existing lists: merge old top-K with new candidates
+        S = (X_old @ X_new.T).tocsr()
+        row_of = np.repeat(np.arange(S.shape[0]), np.diff(S.indptr))
+        S.data = blend(S.data, old_tags[row_of], new_tags[S.indices])
+        worst = np.where(table.neighbors[:, -1] == EMPTY, 0.0, table.scores[:, -1])
+        touched = np.unique(row_of[S.data > worst[row_of]])
+        merged_n, merged_s = table.neighbors.copy(), table.scores.copy()
+        for i in touched:
+            cand_ids = np.concatenate([table.neighbors[i], new_ids])
+            old_scores = np.where(table.neighbors[i] == EMPTY, -np.inf, table.scores[i])
+            cand_scores = np.concatenate([old_scores, S.getrow(i).toarray().ravel()])
+            best = top_k(cand_scores, k)
+            best = best[np.isfinite(cand_scores[best]) & (cand_scores[best] > 0)]
+            merged_n[i], merged_s[i] = EMPTY, 0
+            merged_n[i, :len(best)], merged_s[i, :len(best)] = cand_ids[best], cand_scores[best]
+
+        table = NeighborTable(known, merged_n, merged_s).update(fresh.book_ids, fresh.neighbors, fresh.scores)
+        _save(table, X, tags, df, n_docs, k)
+    return len(new_ids)
+
+
+def content_similar_books(book_id: int, limit: int = 10):
+    table = NeighborTable.current(ARTIFACT)
+    if table is None:
+        return []
+    return table.lookup(book_id, limit)
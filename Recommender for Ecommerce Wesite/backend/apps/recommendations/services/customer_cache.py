@@ -0,0 +1,178 @@
+"""Per-customer cache of personalised top-N lists.
+
+Entries are compact ``array('i')`` BookIDs plus ``array('f')`` float32 scores
+(about 8 bytes per recommendation) kept in an LRU with a hard size cap. An
+``add_to_cart`` / ``purchase`` logged for a customer marks their entry dirty
+and drops that book from it; a dirty or missing entry is recomputed on a
+background thread while the request is answered from the stale entry or, on a
+miss, from the popularity list. Retraining the model invalidates every entry.
+Customers the model does not know are cached as empty entries so they are not
+recomputed on every request.
+
+The cache lives in process memory, so each worker keeps its own copy and only
+sees invalidations for events it logged itself.
+"""
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from ..conf import rec_setting
+from . import als
+from .artifacts import get_artifact
+
+logger = logging.getLogger(__name__)
+
+INVALIDATING_ACTIONS = ('add_to_cart', 'purchase')
+
+
+class CacheEntry:
+    __slots__ = ('book_ids', 'scores', 'model', 'personalised', 'dirty', 'dropped')
+
+    def __init__(self, book_ids: array, scores: array, model, personalised: bool = True):
+        self.book_ids = book_ids
+        self.scores = scores
+        self.model = model
+        self.personalised = personalised
+        self.dirty = False
+        # books acted on since the model was trained; kept out of recomputed lists
+        self.dropped = array('i')
+
+    def discard(self, book_id: int):
+        if book_id not in self.dropped:
+            self.dropped.append(book_id)
+        try:
+            i = self.book_ids.index(book_id)
+        except ValueError:
+            return
+        del self.book_ids[i]
+        del self.scores[i]
+
+
+class RecommendationCache:
+    def __init__(self, max_entries: int, compute, workers: int = 1):
+        self.max_entries = max_entries
+        self.compute = compute
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rec-cache')
+        self.hits = self.stale_hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, customer_id: int, model=None):
+        """Return ``(entry, fresh)``; schedules a refresh unless the entry is fresh."""
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is not None:
+                self._entries.move_to_end(customer_id)
+        fresh = entry is not None and not entry.dirty and entry.model == model
+        if entry is None:
+            self.misses += 1
+        elif fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        if not fresh:
+            self.refresh(customer_id)
+        return entry, fresh
+
+    def put(self, customer_id: int, recs, model=None):
+        """Store ``[(book_id, score), ...]``; None records a customer without recommendations."""
+        entry = CacheEntry(
+            array('i', (bid for bid, _ in recs or ())),
+            array('f', (score for _, score in recs or ())),
+            model,
+            personalised=recs is not None,
+        )
+        with self._lock:
+            previous = self._entries.get(customer_id)
+            if previous is not None and previous.model == model:
+                for bid in previous.dropped:
+                    entry.discard(bid)
+            self._entries[customer_id] = entry
+            self._entries.move_to_end(customer_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def mark_dirty(self, customer_id: int, book_id: int = None):
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is not None:
+                entry.dirty = True
+                if book_id is not None:
+                    entry.discard(book_id)
+
+    def refresh(self, customer_id: int):
+        """Recompute one entry in the background (deduplicated per customer)."""
+        with self._lock:
+            if customer_id in self._refreshing:
+                return
+            self._refreshing.add(customer_id)
+        self._executor.submit(self._refresh, customer_id)
+
+    def _refresh(self, customer_id: int):
+        try:
+            model, recs = self.compute(customer_id)
+            self.put(customer_id, recs, model)
+        except Exception:
+            logger.exception(f"Recomputing recommendations for customer {customer_id} failed")
+        finally:
+            with self._lock:
+                self._refreshing.discard(customer_id)
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def _model_version():
+    artifact = get_artifact(als.ARTIFACT)
+    return str(artifact.path) if artifact is not None else None
+
+
+def _compute(customer_id: int):
+    model = _model_version()
+    return model, als.recommend_for_customer(customer_id, rec_setting('CUSTOMER_CACHE_TOP_N'))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> RecommendationCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RecommendationCache(rec_setting('CUSTOMER_CACHE_SIZE'), _compute)
+    return _cache
+
+
+def recommendations_for(customer_id: int, limit: int = 10):
+    """Return ``(source, [(book_id, score), ...])`` without computing inline.
+
+    ``source`` is ``cache`` (fresh), ``stale`` (refresh scheduled) or
+    ``popular`` (miss, or a customer the model does not know).
+    """
+    entry, fresh = get_cache().get(customer_id, _model_version())
+    if entry is not None and entry.personalised:
+        n = min(limit, len(entry.book_ids))
+        return ('cache' if fresh else 'stale'), list(zip(entry.book_ids[:n], entry.scores[:n]))
+    return 'popular', [(bid, None) for bid in als.popular_books(limit)]
+
+
+def on_activity_logged(sender, customer_id=None, book_id=None, action=None, **kwargs):
+    if customer_id is not None and action in INVALIDATING_ACTIONS:
+        get_cache().mark_dirty(customer_id, book_id)
@@ -0,0 +1,277 @@
+"""Offline evaluation of the recommenders on a time split of UserActivity.
+
+Activity before the cutoff trains each registered algorithm; for every test
+customer (one with activity on both sides), the books they interacted with
+after the cutoff and had not seen before are the relevant set. Reported per
+algorithm:
+
+* quality: recall@K, NDCG@K (binary relevance), catalog coverage;
+* cost: training wall time, peak RSS of the process that trained and served
+  it, model size on disk, and p50/p99 latency of one ``recommend`` call.
+
+Each algorithm runs in a freshly spawned process so that peak RSS is its own.
+"""
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import django
+import numpy as np
+from django.db import connection
+from scipy import sparse
+
+from apps.activities.models import UserActivity
+from apps.common.db import stream_rows
+from ..conf import rec_setting
+from .als import train_als
+from .interactions import Interactions, action_code_sql, interaction_matrix
+from .item_similarity import cooccurrence_topk
+from .neighbors import EMPTY, top_k
+
+ALGORITHMS = {}
+
+
+def register(name: str):
+    """Class decorator adding a recommender to the evaluation registry."""
+    def decorator(cls):
+        ALGORITHMS[name] = cls
+        return cls
+    return decorator
+
+
+class Recommender(ABC):
+    """Interface evaluated by :func:`evaluate`; rows and columns index the train matrix."""
+
+    @abstractmethod
+    def fit(self, R: sparse.csr_matrix):
+        """Train on R; implementations keep it as ``self.R`` for :meth:`_seen`."""
+
+    @abstractmethod
+    def recommend(self, row: int, k: int) -> np.ndarray:
+        """Column indices of the top-``k`` books for customer ``row``, seen books excluded."""
+
+    @abstractmethod
+    def arrays(self) -> dict:
+        """Arrays that make up the stored model (used for the size on disk)."""
+
+    def _seen(self, row):
+        return self.R.indices[self.R.indptr[row]:self.R.indptr[row + 1]]
+
+
+@register('popular')
+class PopularRecommender(Recommender):
+    def fit(self, R):
+        self.R = R
+        self.order = np.argsort(-np.asarray(R.sum(axis=0)).ravel(), kind='stable').astype(np.int32)
+
+    def recommend(self, row, k):
+        seen = self._seen(row)
+        head = self.order[:k + len(seen)]
+        return head[~np.isin(head, seen)][:k]
+
+    def arrays(self):
+        return {'order': self.order}
+
+
+@register('cooccurrence')
+class CooccurrenceRecommender(Recommender):
+    def fit(self, R):
+        self.R = R
+        self.neighbors, self.scores = cooccurrence_topk(R, rec_setting('SIMILAR_TOP_K'))
+
+    def recommend(self, row, k):
+        seen = self._seen(row)
+        weights = self.R.data[self.R.indptr[row]:self.R.indptr[row + 1]]
+        cols = self.neighbors[seen].ravel()
+        scores = (self.scores[seen] * weights[:, None]).ravel()
+        keep = (cols != EMPTY) & ~np.isin(cols, seen)
+        candidates, inverse = np.unique(cols[keep], return_inverse=True)
+        totals = np.bincount(inverse, scores[keep])
+        return candidates[top_k(totals, k)]
+
+    def arrays(self):
+        return {'neighbors': self.neighbors.astype(np.int32), 'scores': self.scores}
+
+
+@register('als')
+class ALSRecommender(Recommender):
+    def fit(self, R):
+        self.R = R
+        self.user_factors, self.item_factors = train_als(R)
+
+    def recommend(self, row, k):
+        scores = self.item_factors @ self.user_factors[row]
+        scores[self._seen(row)] = -np.inf
+        best = top_k(scores, k)
+        return best[np.isfinite(scores[best])]
+
+    def arrays(self):
+        return {'user_factors': self.user_factors, 'item_factors': self.item_factors}
+
+
+def _events_sql():
+    qn = connection.ops.quote_name
+    return (
+        f"SELECT {qn('ActivityID')}, {qn('CustomerID')}, {qn('BookID')}, {action_code_sql()}, "
+        f"{qn('ActivityTime')} FROM {qn(UserActivity._meta.db_table)} ORDER BY {qn('ActivityID')}"
+    )
+
+
+def load_timed_interactions():
+    """``(Interactions, unix seconds)`` for the whole UserActivity table."""
+    ids, seconds = [], []
+    for rows in stream_rows(_events_sql(), chunk_size=rec_setting('READ_CHUNK_SIZE')):
+        rows = np.array(rows, dtype=object)
+        ids.append(rows[:, :4].astype(np.int64))
+        seconds.append(rows[:, 4].astype('datetime64[us]').astype(np.int64) / 1e6)
+    if not ids:
+        return Interactions.from_rows(np.empty((0, 4), dtype=np.int64)), np.empty(0)
+    ids, seconds = np.concatenate(ids), np.concatenate(seconds)
+    known = ids[:, 3] >= 0
+    return Interactions.from_rows(ids[known]), seconds[known]
+
+
+def _subset(inter: Interactions, mask) -> Interactions:
+    return Interactions(inter.activity_id[mask], inter.customer_id[mask], inter.book_id[mask], inter.action[mask])
+
+
+class Split:
+    """Train matrix plus, per test customer, the relevant (train-column) books after the cutoff."""
+
+    def __init__(self, R, test_rows, relevant_indptr, relevant_indices, cutoff, n_train, n_test):
+        self.R = R
+        self.test_rows = test_rows
+        self.relevant_indptr = relevant_indptr
+        self.relevant_indices = relevant_indices
+        self.cutoff = cutoff
+        self.n_train = n_train
+        self.n_test = n_test
+
+    def relevant(self, i: int) -> np.ndarray:
+        return self.relevant_indices[self.relevant_indptr[i]:self.relevant_indptr[i + 1]]
+
+
+def time_split(inter: Interactions, seconds, test_fraction: float = 0.2, max_customers: int = None,
+               seed: int = 0) -> Split:
+    """Everything before the ``1 - test_fraction`` time quantile trains; the rest is test."""
+    cutoff = float(np.quantile(seconds, 1 - test_fraction))
+    train, test = _subset(inter, seconds < cutoff), _subset(inter, seconds >= cutoff)
+    R, customer_ids, book_ids = interaction_matrix(train)
+
+    # keep test pairs whose customer and book both exist in the train matrix
+    rows = np.searchsorted(customer_ids, test.customer_id).clip(max=max(len(customer_ids) - 1, 0))
+    cols = np.searchsorted(book_ids, test.book_id).clip(max=max(len(book_ids) - 1, 0))
+    ok = (customer_ids[rows] == test.customer_id) & (book_ids[cols] == test.book_id)
+    T = sparse.csr_matrix((np.ones(ok.sum(), np.float32), (rows[ok], cols[ok])), shape=R.shape)
+    T.sum_duplicates()
+    T = T - T.multiply(R > 0)  # books already seen in training are not "new" relevant items
+    T.eliminate_zeros()
+
+    test_rows = np.flatnonzero(np.diff(T.indptr) > 0)
+    if max_customers and len(test_rows) > max_customers:
+        test_rows = np.sort(np.random.default_rng(seed).choice(test_rows, max_customers, replace=False))
+    T = T[test_rows]
+    return Split(R, test_rows, T.indptr, T.indices, cutoff, len(train), len(test))
+
+
+def ranking_metrics(recommended, relevant, k: int):
+    """``(recall@k, ndcg@k)`` of one ranked list; recall is over min(k, |relevant|)."""
+    hits = np.isin(recommended[:k], relevant)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(k, len(relevant))].sum()
+    return hits.sum() / min(k, len(relevant)), float((hits * discounts[:len(hits)]).sum() / ideal)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
+
+
+def run_algorithm(name: str, split: Split, k: int) -> dict:
+    """Train, size, score and time one registered algorithm on ``split``."""
+    algorithm = ALGORITHMS[name]()
+    started = time.perf_counter()
+    algorithm.fit(split.R)
+    train_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for key, value in algorithm.arrays().items():
+            np.save(Path(tmp) / f"{key}.npy", value, allow_pickle=False)
+        size = sum(f.stat().st_size for f in Path(tmp).iterdir())
+
+    recalls, ndcgs, latencies, covered = [], [], [], set()
+    for i, row in enumerate(split.test_rows):
+        t0 = time.perf_counter()
+        recommended = algorithm.recommend(row, k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        recall, ndcg = ranking_metrics(recommended, split.relevant(i), k)
+        recalls.append(recall)
+        ndcgs.append(ndcg)
+        covered.update(recommended.tolist())
+    latencies = np.array(latencies or [0.0])
+    return {
+        f'recall@{k}': round(float(np.mean(recalls)), 5) if recalls else None,
+        f'ndcg@{k}': round(float(np.mean(ndcgs)), 5) if ndcgs else None,
+        'coverage': round(len(covered) / max(split.R.shape[1], 1), 5),
+        'train_seconds': round(train_seconds, 3),
+        'peak_rss_mb': _peak_rss_mb(),
+        'model_bytes': size,
+        'p50_ms': round(float(np.percentile(latencies, 50)), 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 4),
+    }
+
+
+def evaluate(names=None, k: int = 10, test_fraction: float = 0.2, max_customers: int = 5000,
+             isolate: bool = True, stdout=None) -> dict:
+    """Evaluate the named algorithms (default: all registered) and return a JSON-ready report."""
+    names = list(names or ALGORITHMS)
+    unknown = set(names) - set(ALGORITHMS)
+    if unknown:
+        raise KeyError(f"Unknown algorithms: {', '.join(sorted(unknown))}")
+    inter, seconds = load_timed_interactions()
+    if not len(inter):
+        raise ValueError("UserActivity is empty")
+    split = time_split(inter, seconds, test_fraction, max_customers)
+    if stdout:
+        stdout.write(
+            f"Split at {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(split.cutoff))} UTC: "
+            f"{split.n_train} train / {split.n_test} test events, {len(split.test_rows)} test customers"
+        )
+
+    results = {}
+    for name in names:
+        if isolate:
+            # a fresh interpreter per algorithm, so peak RSS is not shared between them
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn'), initializer=django.setup) as pool:
+                results[name] = pool.submit(run_algorithm, name, split, k).result()
+        else:
+            results[name] = run_algorithm(name, split, k)
+        if stdout:
+            stdout.write(f"{name}: {results[name]}")
+    return {
+        'k': k,
+        'split': {
+            'cutoff': split.cutoff,
+            'test_fraction': test_fraction,
+            'train_events': split.n_train,
+            'test_events': split.n_test,
+            'test_customers': int(len(split.test_rows)),
+            'customers': int(split.R.shape[0]),
+            'books': int(split.R.shape[1]),
+        },
+        'params': {
+            key: rec_setting(key)
+            for key in ('ALS_FACTORS', 'ALS_ITERATIONS', 'ALS_REGULARIZATION', 'ALS_ALPHA', 'SIMILAR_TOP_K')
+        },
+        'results': results,
+        'created_at': time.time(),
+    }
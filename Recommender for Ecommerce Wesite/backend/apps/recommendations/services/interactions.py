@@ -0,0 +1,195 @@
+"""Load UserActivity into NumPy column arrays and sparse customer x book matrices.
+
+Rows are streamed from the database in chunks and converted to arrays chunk by
+chunk; nothing downstream iterates over individual activity rows in Python.
+Full rebuilds can read the columnar activity archive instead of the database
+(``INTERACTIONS_SOURCE = 'archive'``).
+"""
+from datetime import datetime, time as dtime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from scipy import sparse
+from django.db import connection
+
+from apps.activities.models import UserActivity
+from apps.activities.services.archive import covered_through, iter_archive, missing_days, partitions
+from apps.common.db import stream_rows
+from ..conf import rec_setting
+
+# Stable small-integer codes for UserActivity.Action; the order matters because
+# artifacts store these codes.
+ACTION_CODES = {'view': 0, 'add_to_cart': 1, 'checkout': 2, 'purchase': 3}
+
+
+def action_weights(weights: dict = None) -> np.ndarray:
+    """Weight per action code, indexable by an array of codes."""
+    weights = weights or rec_setting('ACTION_WEIGHTS')
+    out = np.zeros(len(ACTION_CODES), dtype=np.float32)
+    for action, code in ACTION_CODES.items():
+        out[code] = weights.get(action, 0.0)
+    return out
+
+
+class Interactions:
+    """Column-oriented batch of activity rows."""
+
+    def __init__(self, activity_id, customer_id, book_id, action):
+        self.activity_id = np.asarray(activity_id, dtype=np.int64)
+        self.customer_id = np.asarray(customer_id, dtype=np.int64)
+        self.book_id = np.asarray(book_id, dtype=np.int64)
+        self.action = np.asarray(action, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.activity_id)
+
+    @property
+    def max_activity_id(self) -> int:
+        return int(self.activity_id.max()) if len(self) else 0
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray):
+        """Build from an (n, 4) array of (ActivityID, CustomerID, BookID, code)."""
+        rows = rows[rows[:, 3] >= 0]
+        return cls(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3])
+
+    def weights(self, weights: dict = None) -> np.ndarray:
+        return action_weights(weights)[self.action]
+
+    def through(self, activity_id: int) -> 'Interactions':
+        """The rows with ActivityID <= ``activity_id``."""
+        keep = self.activity_id <= activity_id
+        return Interactions(self.activity_id[keep], self.customer_id[keep], self.book_id[keep], self.action[keep])
+
+
+def action_code_sql() -> str:
+    """SQL expression mapping the Action column to its ACTION_CODES code (-1 if unknown)."""
+    case = " ".join(f"WHEN '{action}' THEN {code}" for action, code in ACTION_CODES.items())
+    return f"CASE {connection.ops.quote_name('Action')} {case} ELSE -1 END"
+
+
+def _activity_sql(bounded: bool = False):
+    qn = connection.ops.quote_name
+    upper = f" AND {qn('ActivityID')} <= %s" if bounded else ""
+    return (
+        f"SELECT {qn('ActivityID')}, {qn('CustomerID')}, {qn('BookID')}, {action_code_sql()} "
+        f"FROM {qn(UserActivity._meta.db_table)} "
+        f"WHERE {qn('ActivityID')} > %s{upper} ORDER BY {qn('ActivityID')}"
+    )
+
+
+def _stream(sql, params, chunk_size=None):
+    chunk_size = chunk_size or rec_setting('READ_CHUNK_SIZE')
+    return [np.array(rows, dtype=np.int64) for rows in stream_rows(sql, params, chunk_size=chunk_size)]
+
+
+def _from_parts(parts) -> Interactions:
+    if not parts:
+        return Interactions.from_rows(np.empty((0, 4), dtype=np.int64))
+    return Interactions.from_rows(np.concatenate(parts))
+
+
+def load_interactions(after_id: int = 0, up_to: int = None, chunk_size: int = None) -> Interactions:
+    """Stream every UserActivity row with ``after_id < ActivityID <= up_to`` (no upper bound by default)."""
+    if up_to is None:
+        return _from_parts(_stream(_activity_sql(), [after_id], chunk_size))
+    return _from_parts(_stream(_activity_sql(bounded=True), [after_id, up_to], chunk_size))
+
+
+def _unarchived_sql(n_ranges):
+    qn = connection.ops.quote_name
+    when = qn('ActivityTime')
+    ranges = "".join(f" OR ({when} >= %s AND {when} < %s)" for _ in range(n_ranges))
+    return (
+        f"SELECT {qn('ActivityID')}, {qn('CustomerID')}, {qn('BookID')}, {action_code_sql()} "
+        f"FROM {qn(UserActivity._meta.db_table)} "
+        f"WHERE {qn('ActivityID')} > %s OR {when} >= %s{ranges} ORDER BY {qn('ActivityID')}"
+    )
+
+
+def _day_start(day):
+    return connection.ops.adapt_datetimefield_value(datetime.combine(day, dtime.min, tzinfo=dt_timezone.utc))
+
+
+def load_archived_interactions() -> Interactions:
+    """The archive, topped up from UserActivity with every row it may be missing.
+
+    Archived rows are taken up to :func:`covered_through` the archive. Rows
+    past that id, rows dated after the last archived day (not exported yet)
+    and rows dated on days missing between archived ones are read from the
+    database. The result therefore holds every row up to its
+    ``max_activity_id``, which incremental updates continue from.
+    """
+    found = partitions()
+    if not found:
+        return load_interactions()
+    covered = covered_through(path for _, path in found)
+    columns = ('activity_id', 'customer_id', 'book_id', 'action')
+    parts = []
+    for _, batch in iter_archive(columns=columns):
+        keep = batch['activity_id'] <= covered
+        # per-file vocabulary -> ACTION_CODES (-1 for actions without a code)
+        remap = np.array([ACTION_CODES.get(a, -1) for a in batch['actions']], dtype=np.int64)
+        parts.append(np.column_stack([
+            batch['activity_id'][keep], batch['customer_id'][keep], batch['book_id'][keep],
+            remap[batch['action'][keep]],
+        ]).astype(np.int64))
+    gaps = missing_days(day for day, _ in found)
+    params = [covered, _day_start(found[-1][0] + timedelta(days=1))]
+    for day in gaps:
+        params += [_day_start(day), _day_start(day + timedelta(days=1))]
+    parts += _stream(_unarchived_sql(len(gaps)), params)
+    return _from_parts(parts)
+
+
+def load_training_interactions() -> Interactions:
+    """Everything a full rebuild trains on, from the source named by INTERACTIONS_SOURCE.
+
+    Callers cut it at a settled ActivityID (``Interactions.through``) and store
+    that id as the watermark incremental updates continue from.
+    """
+    if rec_setting('INTERACTIONS_SOURCE') == 'archive':
+        return load_archived_interactions()
+    return load_interactions()
+
+
+def interaction_matrix(inter: Interactions, weights: dict = None):
+    """Return ``(X, customer_ids, book_ids)`` with X a CSR customer x book matrix.
+
+    Repeated (customer, book) events are summed, so X is linear in the rows it
+    was built from; the incremental updater relies on this.
+    """
+    customer_ids, rows = np.unique(inter.customer_id, return_inverse=True)
+    book_ids, cols = np.unique(inter.book_id, return_inverse=True)
+    X = sparse.csr_matrix(
+        (inter.weights(weights), (rows, cols)),
+        shape=(len(customer_ids), len(book_ids)),
+        dtype=np.float32,
+    )
+    X.sum_duplicates()
+    return X, customer_ids, book_ids
+
+
+def extend_matrix(X: sparse.csr_matrix, customer_ids, book_ids, delta: Interactions, weights: dict = None):
+    """Add ``delta`` rows to a matrix built by :func:`interaction_matrix`.
+
+    Returns ``(X, customer_ids, book_ids, touched)`` where ``touched`` holds the
+    row indices (in the new matrix) of customers that have new activity.
+    """
+    new_customers = np.union1d(customer_ids, delta.customer_id)
+    new_books = np.union1d(book_ids, delta.book_id)
+    old = X.tocoo()
+    rows = np.concatenate([
+        np.searchsorted(new_customers, np.asarray(customer_ids)[old.row]),
+        np.searchsorted(new_customers, delta.customer_id),
+    ])
+    cols = np.concatenate([
+        np.searchsorted(new_books, np.asarray(book_ids)[old.col]),
+        np.searchsorted(new_books, delta.book_id),
+    ])
+    data = np.concatenate([old.data, delta.weights(weights)])
+    X = sparse.csr_matrix(
+        (data, (rows, cols)), shape=(len(new_customers), len(new_books)), dtype=np.float32,
+    )
+    X.sum_duplicates()
+    touched = np.unique(np.searchsorted(new_customers, delta.customer_id))
+    return X, new_customers, new_books, touched
@@ -0,0 +1,141 @@
+"""Item-to-item ("customers who interacted with this also ...") recommender.
+
+The customer x book matrix X is built from UserActivity, the co-occurrence
+matrix C = X^T X is computed block by block with sparse products, normalised to
+cosine similarity and reduced to the top-K neighbours per book. Request-time
+code only looks rows up in the stored table.
+
+X is stored next to the table together with the settled ActivityID it was
+built up to (the watermark, see ``apps.activities.services.watermarks``), so
+newer activity can be folded in without reading the whole UserActivity table
+again, including rows that commit after a higher id was already visible.
+"""
+import numpy as np
+from scipy import sparse
+
+from apps.activities.services.watermarks import settled_mark
+from ..conf import rec_setting
+from .artifacts import artifact_lock, load_artifact
+from .interactions import extend_matrix, interaction_matrix, load_interactions, load_training_interactions
+from .neighbors import NeighborTable, topk_per_row
+
+ARTIFACT = 'item_similarity'
+
+
+def cooccurrence_topk(X: sparse.csr_matrix, k: int, rows=None, block_size: int = None):
+    """Top-``k`` cosine neighbours (column indices, scores) for item ``rows``.
+
+    ``rows`` defaults to every column of X. Items are scored ``block_size`` at a
+    time so only one block of C is ever materialised.
+    """
+    block_size = block_size or rec_setting('SIMILARITY_BLOCK_SIZE')
+    n_items = X.shape[1]
+    rows = np.arange(n_items) if rows is None else np.asarray(rows)
+    Xt = X.T.tocsr()
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel()).astype(np.float32)
+    norms[norms == 0] = 1.0
+
+    cols = np.empty((len(rows), k), dtype=np.int64)
+    vals = np.empty((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        C = (Xt[block] @ X).tocsr()
+        # cosine: divide each entry by the norms of its row item and column item
+        row_of = np.repeat(np.arange(C.shape[0]), np.diff(C.indptr))
+        C.data = C.data / (norms[block][row_of] * norms[C.indices])
+        # an item is not its own neighbour
+        C.data[C.indices == block[row_of]] = 0
+        C.eliminate_zeros()
+        cols[start:start + len(block)], vals[start:start + len(block)] = topk_per_row(C, k)
+    return cols, vals
+
+
+def _save(table: NeighborTable, X, customer_ids, k: int, watermark: int):
+    table.save(
+        ARTIFACT,
+        meta={'k': k, 'watermark': watermark, 'nnz': int(X.nnz)},
+        extra={
+            'customer_ids': customer_ids,
+            'x_indptr': X.indptr,
+            'x_indices': X.indices,
+            'x_data': X.data,
+        },
+    )
+
+
+def _rebuild(k: int, stdout=None) -> NeighborTable:
+    watermark, _ = settled_mark()
+    inter = load_training_interactions().through(watermark)
+    X, customer_ids, book_ids = interaction_matrix(inter)
+    if stdout:
+        stdout.write(
+            f"Loaded {len(inter)} activities: {len(customer_ids)} customers x {len(book_ids)} books"
+        )
+    cols, vals = cooccurrence_topk(X, k)
+    table = NeighborTable.from_topk(book_ids, cols, vals)
+    _save(table, X, customer_ids, k, watermark)
+    return table
+
+
+def rebuild_similar_books(k: int = None, stdout=None) -> NeighborTable:
+    """Recompute the whole similarity table from UserActivity and store it."""
+    with artifact_lock(ARTIFACT):
+        return _rebuild(k or rec_setting('SIMILAR_TOP_K'), stdout)
+
+
+def update_similar_books(stdout=None):
+    """Fold activity newer than the stored watermark into the model.
+
+    Only books whose co-occurrence row changed (every book seen by a customer
+    with new activity) get their top-K list recomputed. Scores of untouched
+    rows that point at a changed book keep their old normalisation until the
+    next full rebuild. Returns the number of refreshed books, or None when no
+    model existed and a full rebuild was run instead.
+    """
+    with artifact_lock(ARTIFACT):
+        # read under the lock: X is additive, so folding the delta into a copy
+        # another writer has since replaced would count its rows twice
+        artifact = load_artifact(ARTIFACT, mmap=False)
+        if artifact is None or 'x_indptr' not in artifact:
+            _rebuild(rec_setting('SIMILAR_TOP_K'), stdout)
+            return None
+        watermark = artifact.meta['watermark']
+        high, _ = settled_mark()
+        if high <= watermark:
+            return 0
+        delta = load_interactions(after_id=watermark, up_to=high)
+        if not len(delta):
+            return 0
+        customer_ids, book_ids = artifact['customer_ids'], artifact['book_ids']
+        X = sparse.csr_matrix(
+            (artifact['x_data'], artifact['x_indices'], artifact['x_indptr']),
+            shape=(len(customer_ids), len(book_ids)),
+        )
+        X, customer_ids, book_ids, touched = extend_matrix(X, customer_ids, book_ids, delta)
+        changed = np.unique(X[touched].indices)
+        if stdout:
+            stdout.write(
+                f"Folding {len(delta)} activities after #{watermark}: "
+                f"{len(touched)} customers, {len(changed)} books to refresh"
+            )
+
+        k = artifact.meta['k']
+        cols, vals = cooccurrence_topk(X, k, rows=changed)
+        refreshed = NeighborTable.from_topk(book_ids[changed], cols, vals, col_ids=book_ids)
+        table = NeighborTable.from_artifact(artifact).update(
+            refreshed.book_ids, refreshed.neighbors, refreshed.scores,
+        )
+        _save(table, X, customer_ids, k, high)
+    return len(changed)
+
+
+def similar_books(book_id: int, limit: int = 10):
+    """Precomputed co-occurrence neighbours of ``book_id``; empty until the table is built.
+
+    Books without a row fall back to content, then ANN neighbours in
+    :func:`.similar.similar_books`, which is what the endpoint calls.
+    """
+    table = NeighborTable.current(ARTIFACT)
+    if table is None:
+        return []
+    return table.lookup(book_id, limit)
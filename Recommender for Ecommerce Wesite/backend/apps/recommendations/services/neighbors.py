@@ -0,0 +1,106 @@
+"""Fixed-width top-K neighbour tables keyed by BookID."""
+import numpy as np
+from scipy import sparse
+
+from .artifacts import get_artifact, save_artifact
+
+EMPTY = -1
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` largest scores, best first (argpartition + small sort)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind='stable')]
+
+
+def topk_per_row(S: sparse.csr_matrix, k: int):
+    """Top-``k`` column indices and values of every row of ``S``.
+
+    Fully vectorised: one lexsort over the non-zeros, then each entry's rank
+    inside its row decides whether it is kept. Returns ``(cols, vals)`` of shape
+    ``(n_rows, k)``, padded with ``EMPTY`` / 0.
+    """
+    S = S.tocsr()
+    n_rows = S.shape[0]
+    cols = np.full((n_rows, k), EMPTY, dtype=np.int64)
+    vals = np.zeros((n_rows, k), dtype=np.float32)
+    if S.nnz == 0 or k == 0:
+        return cols, vals
+    row_of = np.repeat(np.arange(n_rows), np.diff(S.indptr))
+    order = np.lexsort((-S.data, row_of))
+    row_sorted = row_of[order]
+    rank = np.arange(S.nnz) - S.indptr[row_sorted]
+    keep = rank < k
+    cols[row_sorted[keep], rank[keep]] = S.indices[order][keep]
+    vals[row_sorted[keep], rank[keep]] = S.data[order][keep]
+    return cols, vals
+
+
+class NeighborTable:
+    """Sorted ``book_ids`` with an ``(n, k)`` block of neighbour BookIDs and scores."""
+
+    def __init__(self, book_ids, neighbors, scores):
+        self.book_ids = book_ids
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @classmethod
+    def from_topk(cls, book_ids, cols, vals, col_ids=None):
+        """Translate column indices from :func:`topk_per_row` into BookIDs."""
+        col_ids = book_ids if col_ids is None else col_ids
+        neighbors = np.where(cols == EMPTY, EMPTY, col_ids[np.maximum(cols, 0)])
+        return cls(
+            np.asarray(book_ids, dtype=np.int32),
+            neighbors.astype(np.int32),
+            vals.astype(np.float32),
+        )
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    def row(self, book_id: int):
+        i = int(np.searchsorted(self.book_ids, book_id))
+        if i < len(self.book_ids) and self.book_ids[i] == book_id:
+            return i
+        return None
+
+    def lookup(self, book_id: int, limit: int = 10):
+        """Return ``[(book_id, score), ...]`` for ``book_id`` (empty if unknown)."""
+        i = self.row(book_id)
+        if i is None:
+            return []
+        ids = self.neighbors[i, :limit]
+        scores = self.scores[i, :limit]
+        mask = ids != EMPTY
+        return list(zip(ids[mask].tolist(), scores[mask].tolist()))
+
+    def update(self, book_ids, neighbors, scores):
+        """Return a new table with rows for ``book_ids`` replaced or inserted."""
+        book_ids = np.asarray(book_ids, dtype=np.int32)
+        merged_ids = np.union1d(self.book_ids, book_ids).astype(np.int32)
+        out_n = np.full((len(merged_ids), self.k), EMPTY, dtype=np.int32)
+        out_s = np.zeros((len(merged_ids), self.k), dtype=np.float32)
+        out_n[np.searchsorted(merged_ids, self.book_ids)] = self.neighbors
+        out_s[np.searchsorted(merged_ids, self.book_ids)] = self.scores
+        pos = np.searchsorted(merged_ids, book_ids)
+        out_n[pos] = neighbors
+        out_s[pos] = scores
+        return NeighborTable(merged_ids, out_n, out_s)
+
+    def save(self, name: str, meta: dict = None, extra: dict = None):
+        arrays = {'book_ids': self.book_ids, 'neighbors': self.neighbors, 'scores': self.scores}
+        arrays.update(extra or {})
+        return save_artifact(name, arrays, meta)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls(artifact['book_ids'], artifact['neighbors'], artifact['scores'])
+
+    @classmethod
+    def current(cls, name: str):
+        artifact = get_artifact(name)
+        return cls.from_artifact(artifact) if artifact is not None else None
@@ -0,0 +1,169 @@
+"""Session-based next-item suggestions from UserActivity.SessionID sequences.
+
+Training streams activity in ActivityTime order and counts first-order
+transitions ``a -> b`` between consecutive books of the same session (steps
+further apart than ``SESSION_GAP_MINUTES`` start a new visit). Each chunk is
+grouped by session with NumPy; only the last book of every open session is
+carried to the next chunk. Each row of the resulting transition matrix is
+normalised to probabilities, cut to its top K, and stored as CSR arrays.
+
+Serving blends the rows of the last few books of the current session, with
+weight halving per step back, so a suggestion is a handful of array slices.
+"""
+import numpy as np
+from django.db import connection
+from scipy import sparse
+
+from apps.activities.models import UserActivity
+from apps.common.db import stream_rows
+from ..conf import rec_setting
+from .artifacts import artifact_lock, get_artifact, save_artifact
+from .interactions import action_code_sql, action_weights
+from .neighbors import EMPTY, top_k, topk_per_row
+
+ARTIFACT = 'session_next'
+# transition pairs buffered before they are folded into the sparse counts
+FOLD_EVERY = 2_000_000
+# weight of the i-th most recent session item is CONTEXT_DECAY ** i
+CONTEXT_DECAY = 0.5
+
+
+def _session_sql():
+    qn = connection.ops.quote_name
+    return (
+        f"SELECT {qn('SessionID')}, {qn('BookID')}, {action_code_sql()}, {qn('ActivityTime')} "
+        f"FROM {qn(UserActivity._meta.db_table)} "
+        f"WHERE {qn('SessionID')} IS NOT NULL AND {qn('SessionID')} <> '' "
+        f"ORDER BY {qn('ActivityTime')}, {qn('ActivityID')}"
+    )
+
+
+class TransitionCounter:
+    """Accumulates weighted ``(book, next book)`` counts over time-ordered chunks."""
+
+    def __init__(self, gap_seconds: float, weights: np.ndarray):
+        self.gap = gap_seconds
+        self.weights = weights
+        # session id -> (last BookID, last time in seconds) of sessions still open
+        self.open = {}
+        self.src, self.dst, self.val = [], [], []
+        self.buffered = 0
+        self.counts = None
+        self.rows = 0
+
+    def add_chunk(self, sessions, book_ids, actions, seconds):
+        """One chunk of rows, already sorted by time across the whole stream."""
+        keep = actions >= 0
+        sessions, book_ids, actions, seconds = sessions[keep], book_ids[keep], actions[keep], seconds[keep]
+        if not len(sessions):
+            return
+        self.rows += len(sessions)
+        codes_of, codes = np.unique(sessions, return_inverse=True)
+        order = np.argsort(codes, kind='stable')  # by session, time order kept inside
+        codes, book_ids = codes[order], book_ids[order]
+        actions, seconds = actions[order], seconds[order]
+        first = np.r_[True, codes[1:] != codes[:-1]]
+
+        # predecessor of every row: previous row of the session, or the carried-over tail
+        prev_book = np.r_[EMPTY, book_ids[:-1]]
+        prev_time = np.r_[-np.inf, seconds[:-1]]
+        for i in np.flatnonzero(first):
+            prev_book[i], prev_time[i] = self.open.get(codes_of[codes[i]], (EMPTY, -np.inf))
+        ok = (prev_book != EMPTY) & (prev_book != book_ids) & (seconds - prev_time <= self.gap)
+        self._push(prev_book[ok], book_ids[ok], self.weights[actions[ok]])
+
+        last = np.r_[first[1:], True]
+        self.open.update(zip(codes_of[codes[last]].tolist(), zip(book_ids[last].tolist(), seconds[last].tolist())))
+        # sessions idle for longer than the gap can no longer produce transitions
+        horizon = seconds.max() - self.gap
+        self.open = {s: v for s, v in self.open.items() if v[1] >= horizon}
+
+    def _push(self, src, dst, val):
+        self.src.append(src)
+        self.dst.append(dst)
+        self.val.append(val.astype(np.float32))
+        self.buffered += len(src)
+        if self.buffered >= FOLD_EVERY:
+            self._fold()
+
+    def _fold(self):
+        if not self.buffered:
+            return
+        src, dst, val = np.concatenate(self.src), np.concatenate(self.dst), np.concatenate(self.val)
+        self.src, self.dst, self.val, self.buffered = [], [], [], 0
+        # keyed by raw BookID; the shape grows with the largest id seen so far
+        n = int(max(src.max(), dst.max())) + 1
+        batch = sparse.csr_matrix((val, (src, dst)), shape=(n, n))
+        if self.counts is None:
+            self.counts = batch
+        else:
+            m = max(n, self.counts.shape[0])
+            self.counts.resize((m, m))
+            batch.resize((m, m))
+            self.counts = self.counts + batch
+
+    def matrix(self):
+        """``(book_ids, T)`` with T the compact book x book count matrix."""
+        self._fold()
+        if self.counts is None:
+            return np.empty(0, np.int32), sparse.csr_matrix((0, 0), dtype=np.float32)
+        T = self.counts.tocoo()
+        book_ids = np.union1d(T.row, T.col).astype(np.int32)
+        rows, cols = np.searchsorted(book_ids, T.row), np.searchsorted(book_ids, T.col)
+        return book_ids, sparse.csr_matrix((T.data, (rows, cols)), shape=(len(book_ids),) * 2)
+
+
+def train_session_model(k: int = None, stdout=None):
+    """Stream session activity, build the transition model and store it."""
+    k = k or rec_setting('SIMILAR_TOP_K')
+    counter = TransitionCounter(rec_setting('SESSION_GAP_MINUTES') * 60, action_weights())
+    with artifact_lock(ARTIFACT):
+        for rows in stream_rows(_session_sql(), chunk_size=rec_setting('READ_CHUNK_SIZE')):
+            rows = np.array(rows, dtype=object)
+            counter.add_chunk(
+                rows[:, 0].astype(str), rows[:, 1].astype(np.int64), rows[:, 2].astype(np.int64),
+                rows[:, 3].astype('datetime64[us]').astype(np.int64) / 1e6,
+            )
+        book_ids, T = counter.matrix()
+        if stdout:
+            stdout.write(f"{counter.rows} session events, {T.nnz} distinct transitions over {len(book_ids)} books")
+
+        # P(next | current), then keep the K most likely successors per book
+        out_sum = np.asarray(T.sum(axis=1)).ravel()
+        out_sum[out_sum == 0] = 1.0
+        P = sparse.diags(1.0 / out_sum).dot(T).tocsr()
+        cols, vals = topk_per_row(P, k)
+        keep = cols != EMPTY
+        indptr = np.r_[0, np.cumsum(keep.sum(axis=1))].astype(np.int64)
+        save_artifact(ARTIFACT, {
+            'book_ids': book_ids,
+            'indptr': indptr,
+            'indices': cols[keep].astype(np.int32),
+            'data': vals[keep].astype(np.float32),
+        }, {'k': k, 'events': counter.rows})
+    return len(book_ids)
+
+
+def next_books(items, limit: int = 10):
+    """Likely next books ``[(book_id, score), ...]`` after a session's ``items`` (oldest first)."""
+    artifact = get_artifact(ARTIFACT)
+    if artifact is None or not len(items) or not len(artifact['book_ids']):
+        return []
+    book_ids, indptr = artifact['book_ids'], artifact['indptr']
+    context = np.asarray(items[::-1][:rec_setting('SESSION_CONTEXT')], dtype=np.int64)
+    rows = np.searchsorted(book_ids, context)
+    rows[rows == len(book_ids)] = 0
+    cols, scores = [], []
+    for step, (row, known) in enumerate(zip(rows, book_ids[rows] == context)):
+        if known:
+            s = slice(indptr[row], indptr[row + 1])
+            cols.append(artifact['indices'][s])
+            scores.append(artifact['data'][s] * CONTEXT_DECAY ** step)
+    if not cols:
+        return []
+    candidates, inverse = np.unique(np.concatenate(cols), return_inverse=True)
+    totals = np.bincount(inverse, np.concatenate(scores))
+    totals[np.isin(book_ids[candidates], items)] = 0
+    best = top_k(totals, limit)
+    best = best[totals[best] > 0]
+    return list(zip(book_ids[candidates[best]].tolist(), totals[best].tolist()))
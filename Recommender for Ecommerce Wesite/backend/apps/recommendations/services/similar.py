@@ -0,0 +1,32 @@
+"""Pick the best available source of "similar books" for a book."""
+from .ann import current_index
+from .content import content_similar_books
+from .item_similarity import similar_books as cooccurrence_similar_books
+
+
+def ann_similar_books(book_id: int, limit: int = 10):
+    """Cosine neighbours of the book's ALS vector in the ANN index."""
+    index = current_index()
+    vector = index.vector(book_id) if index is not None else None
+    if vector is None:
+        return []
+    ids, scores = index.search(vector, limit + 1, cosine=True)
+    keep = ids != book_id
+    return list(zip(ids[keep][:limit].tolist(), scores[keep][:limit].tolist()))
+
+
+# behavioural signal first; content vectors cover books nobody interacted with
+SOURCES = (
+    ('cooccurrence', cooccurrence_similar_books),
+    ('content', content_similar_books),
+    ('ann', ann_similar_books),
+)
+
+
+def similar_books(book_id: int, limit: int = 10):
+    """Return ``(source, [(book_id, score), ...])`` from the first source with results."""
+    for name, lookup in SOURCES:
+        found = lookup(book_id, limit)
+        if found:
+            return name, found
+    return None, []
@@ -0,0 +1,275 @@
+"""Trending books overall and per category, from exponentially decayed counters.
+
+Every activity adds ``weight * 2 ** ((t - landmark) / half_life)`` to its
+book's score (forward decay, Cormode et al. 2009). Scores only ever grow, so
+ranking never needs a pass over all books and a short top-N list per category
+can be kept exactly as events arrive; reading one is a slice of that list.
+The decayed count as of ``now`` is ``score * 2 ** -((now - landmark) / half_life)``.
+
+Counters live in each web process and are fed by ``activity_logged``. A
+periodic job folds UserActivity rows past an ActivityID watermark, up to the
+settled ActivityID (see ``apps.activities.services.watermarks``), into a
+checkpoint artifact; processes adopt new checkpoints and replay only their own
+events the checkpoint does not cover, so every process converges on the
+database. An event logged with its ActivityID is covered when the id is at or
+below the watermark; one logged before its row existed (buffered, bulk) is
+covered when it was logged before the settled id was observed.
+"""
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection
+from django.utils import timezone
+
+from apps.activities.models import UserActivity
+from apps.activities.services.watermarks import settled_mark
+from apps.catalog.models import Book
+from apps.common.db import stream_rows
+from ..conf import rec_setting
+from .artifacts import artifact_lock, get_artifact, load_artifact, save_artifact
+from .interactions import action_code_sql, action_weights
+
+ARTIFACT = 'trending'
+NO_CATEGORY = -1
+# scores are rebased once the forward-decay exponent passes this (keeps floats finite)
+REBASE_AT = 60.0
+# the first build only reads activity from this many half-lives back
+HORIZON_HALF_LIVES = 10
+# books whose decayed count falls below this are dropped at checkpoint time
+PRUNE_BELOW = 0.01
+# live events kept per process for replay on top of a newer checkpoint
+JOURNAL_SIZE = 100000
+
+
+def _half_life() -> float:
+    return rec_setting('TRENDING_HALF_LIFE_HOURS') * 3600
+
+
+def _tau() -> float:
+    return _half_life() / math.log(2)
+
+
+class TrendingCounters:
+    """Forward-decayed book scores plus exact top-N lists per category."""
+
+    def __init__(self, landmark: float, tau: float, top_n: int):
+        self.landmark = landmark
+        self.tau = tau
+        self.top_n = top_n
+        self.scores = {}
+        self.category_of = {}
+        # category (None: all books) -> [(-score, book_id)], best first
+        self.tops = {}
+        self._lock = threading.Lock()
+
+    def add(self, book_id: int, category_id, weight: float, ts: float):
+        with self._lock:
+            exponent = (ts - self.landmark) / self.tau
+            if exponent > REBASE_AT:
+                self._rebase(ts)
+                exponent = 0.0
+            score = self.scores.get(book_id, 0.0) + weight * math.exp(exponent)
+            self.scores[book_id] = score
+            self.category_of[book_id] = category_id
+            self._bump(None, book_id, score)
+            if category_id is not None:
+                self._bump(category_id, book_id, score)
+
+    def _bump(self, key, book_id: int, score: float):
+        top = self.tops.setdefault(key, [])
+        for i, (_, bid) in enumerate(top):
+            if bid == book_id:
+                del top[i]
+                break
+        else:
+            if len(top) >= self.top_n and -score >= top[-1][0]:
+                return
+        bisect.insort(top, (-score, book_id))
+        del top[self.top_n:]
+
+    def _rebase(self, landmark: float):
+        factor = math.exp((self.landmark - landmark) / self.tau)
+        self.scores = {bid: s * factor for bid, s in self.scores.items()}
+        self.tops = {key: [(s * factor, bid) for s, bid in top] for key, top in self.tops.items()}
+        self.landmark = landmark
+
+    def top(self, category_id=None, limit: int = 10, now: float = None):
+        """``[(book_id, decayed count now), ...]`` for a category (None: all books)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            items = self.tops.get(category_id, [])[:limit]
+            decay = math.exp((self.landmark - now) / self.tau)
+        return [(bid, -s * decay) for s, bid in items]
+
+    @classmethod
+    def from_arrays(cls, book_ids, scores, category_ids, landmark: float, tau: float, top_n: int):
+        counters = cls(landmark, tau, top_n)
+        counters.scores = dict(zip(book_ids.tolist(), scores.tolist()))
+        counters.category_of = {
+            bid: (None if cid == NO_CATEGORY else cid)
+            for bid, cid in zip(book_ids.tolist(), category_ids.tolist())
+        }
+        # best top_n per category: sort by (category, -score), keep the head of each group
+        order = np.lexsort((-scores, category_ids))
+        cats = category_ids[order]
+        starts = np.flatnonzero(np.r_[True, cats[1:] != cats[:-1]])
+        rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        keep = order[(rank < top_n) & (cats != NO_CATEGORY)]
+        for bid, cid, s in zip(book_ids[keep].tolist(), category_ids[keep].tolist(), scores[keep].tolist()):
+            counters.tops.setdefault(cid, []).append((-s, bid))
+        best = np.argsort(-scores, kind='stable')[:top_n]
+        counters.tops[None] = [(-s, bid) for bid, s in zip(book_ids[best].tolist(), scores[best].tolist())]
+        return counters
+
+    @classmethod
+    def from_artifact(cls, artifact, top_n: int):
+        return cls.from_arrays(
+            np.asarray(artifact['book_ids']), np.asarray(artifact['scores']),
+            np.asarray(artifact['category_ids']), artifact.meta['landmark'], _tau(), top_n,
+        )
+
+
+def _events_sql(since: bool) -> str:
+    qn = connection.ops.quote_name
+    sql = (
+        f"SELECT {qn('ActivityID')}, {qn('BookID')}, {action_code_sql()}, {qn('ActivityTime')} "
+        f"FROM {qn(UserActivity._meta.db_table)} WHERE {qn('ActivityID')} > %s AND {qn('ActivityID')} <= %s"
+    )
+    if since:
+        sql += f" AND {qn('ActivityTime')} >= %s"
+    return sql + f" ORDER BY {qn('ActivityID')}"
+
+
+def load_events(after_id: int, up_to: int, since=None):
+    """``(activity_id, book_id, action code, unix seconds)`` arrays of activity in ``(after_id, up_to]``."""
+    params = [after_id, up_to]
+    if since is not None:
+        params.append(connection.ops.adapt_datetimefield_value(since))
+    parts = []
+    for rows in stream_rows(_events_sql(since is not None), params, chunk_size=rec_setting('READ_CHUNK_SIZE')):
+        rows = np.array(rows, dtype=object)
+        seconds = rows[:, 3].astype('datetime64[us]').astype(np.int64) / 1e6
+        parts.append(np.column_stack([rows[:, :3].astype(np.int64), seconds]))
+    if not parts:
+        return (np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0))
+    events = np.concatenate(parts)
+    events = events[events[:, 2] >= 0]
+    return events[:, 0].astype(np.int64), events[:, 1].astype(np.int64), events[:, 2].astype(np.int64), events[:, 3]
+
+
+def _categories(book_ids) -> np.ndarray:
+    found = {}
+    ids = [int(b) for b in book_ids]
+    for s in range(0, len(ids), 1000):
+        found.update(Book.objects.filter(BookID__in=ids[s:s + 1000]).values_list('BookID', 'CategoryID'))
+    return np.array([found.get(b) if found.get(b) is not None else NO_CATEGORY for b in ids], dtype=np.int64)
+
+
+def update_trending() -> int:
+    """Fold activity past the checkpoint watermark into the checkpoint.
+
+    Without a checkpoint, the last ``HORIZON_HALF_LIVES`` half-lives of
+    activity are read. Returns the number of activity rows applied.
+    """
+    tau, now = _tau(), time.time()
+    high, seen_at = settled_mark()
+    with artifact_lock(ARTIFACT):
+        stored = load_artifact(ARTIFACT, mmap=False)
+        if stored is None:
+            book_ids, scores, categories = np.empty(0, np.int64), np.empty(0), np.empty(0, np.int64)
+            watermark, landmark = 0, now
+            since = timezone.now() - timedelta(seconds=HORIZON_HALF_LIVES * _half_life())
+        else:
+            book_ids, scores, categories = stored['book_ids'], stored['scores'], stored['category_ids']
+            watermark, landmark, since = stored.meta['watermark'], stored.meta['landmark'], None
+            if high <= watermark:
+                return 0
+        activity_id, book_id, action, ts = load_events(watermark, high, since)
+
+        # rebase the stored scores to now, then add the new events
+        scores = scores * math.exp((landmark - now) / tau)
+        ids, inverse = np.unique(book_id, return_inverse=True)
+        added = np.bincount(inverse, action_weights()[action] * np.exp((ts - now) / tau), minlength=len(ids))
+        all_ids = np.union1d(book_ids, ids)
+        all_scores = np.zeros(len(all_ids))
+        all_scores[np.searchsorted(all_ids, book_ids)] += scores
+        all_scores[np.searchsorted(all_ids, ids)] += added
+        all_categories = np.full(len(all_ids), NO_CATEGORY, dtype=np.int64)
+        all_categories[np.searchsorted(all_ids, book_ids)] = categories
+        new = ~np.isin(all_ids, book_ids)
+        all_categories[new] = _categories(all_ids[new])
+
+        keep = all_scores >= PRUNE_BELOW
+        save_artifact(ARTIFACT, {
+            'book_ids': all_ids[keep],
+            'scores': all_scores[keep],
+            'category_ids': all_categories[keep],
+        }, {
+            'landmark': now,
+            'watermark': high,
+            # journal events without an ActivityID logged before this are in the checkpoint
+            'covered_at': seen_at.timestamp() if seen_at else None,
+        })
+    return len(activity_id)
+
+
+_state = {'artifact': None, 'counters': None}
+_state_lock = threading.Lock()
+# (activity_id or None, logged_at, book_id, category_id, weight, ts) of events logged by this process
+_journal = deque(maxlen=JOURNAL_SIZE)
+
+
+def _covered(event, meta) -> bool:
+    """Whether a journal event is already counted in the checkpoint with ``meta``."""
+    activity_id, logged_at = event[:2]
+    if activity_id is not None:
+        return activity_id <= meta['watermark']
+    covered_at = meta.get('covered_at')
+    return covered_at is not None and logged_at < covered_at
+
+
+def current_counters() -> TrendingCounters:
+    """This process's counters, re-based on the latest checkpoint when it changes."""
+    artifact = get_artifact(ARTIFACT)
+    with _state_lock:
+        if _state['counters'] is None or artifact is not _state['artifact']:
+            top_n = rec_setting('TRENDING_TOP_N')
+            if artifact is None:
+                counters = TrendingCounters(time.time(), _tau(), top_n)
+            else:
+                counters = TrendingCounters.from_artifact(artifact, top_n)
+                newer = [e for e in _journal if not _covered(e, artifact.meta)]
+                _journal.clear()
+                _journal.extend(newer)
+            for _, _, book_id, category_id, weight, ts in _journal:
+                counters.add(book_id, category_id, weight, ts)
+            _state.update(artifact=artifact, counters=counters)
+        return _state['counters']
+
+
+def _category_of(counters: TrendingCounters, book_id: int):
+    if book_id not in counters.category_of:
+        counters.category_of[book_id] = (
+            Book.objects.filter(BookID=book_id).values_list('CategoryID', flat=True).first()
+        )
+    return counters.category_of[book_id]
+
+
+def on_activity_logged(sender, activity_id=None, book_id=None, action=None, when=None, **kwargs):
+    weight = rec_setting('ACTION_WEIGHTS').get(action, 0.0)
+    if not weight or book_id is None:
+        return
+    counters = current_counters()
+    category_id = _category_of(counters, book_id)
+    ts = (when or timezone.now()).timestamp()
+    _journal.append((activity_id or None, time.time(), book_id, category_id, weight, ts))
+    counters.add(book_id, category_id, weight, ts)
+
+
+def trending_books(category_id: int = None, limit: int = 10):
+    return current_counters().top(category_id, limit)
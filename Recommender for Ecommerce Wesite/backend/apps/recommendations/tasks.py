@@ -0,0 +1,53 @@
+import logging
+
+from celery import shared_task
+
+from .services import ann, content, trending
+from .services.artifacts import ArtifactLocked
+from .services.item_similarity import update_similar_books
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def update_similar_books_task():
+    """Fold new UserActivity rows into the item-to-item model (see CELERY_BEAT_SCHEDULE)."""
+    try:
+        refreshed = update_similar_books()
+    except ArtifactLocked:
+        logger.info("Skipping similar-books update: a rebuild is already running")
+        return
+    logger.info(f"Similar-books update refreshed {refreshed} books")
+
+
+@shared_task(ignore_result=True)
+def add_new_books_to_content_model_task():
+    """Vectorise newly inserted books so they get content neighbours right away."""
+    try:
+        added = content.add_new_books()
+    except ArtifactLocked:
+        logger.info("Skipping content-model update: a rebuild is already running")
+        return
+    logger.info(f"Content model picked up {added} new books")
+
+
+@shared_task(ignore_result=True)
+def add_new_books_to_ann_index_task():
+    """Insert new books into the ANN index, or re-index it if the ALS model changed."""
+    try:
+        added = ann.add_new_books()
+    except ArtifactLocked:
+        logger.info("Skipping ANN index update: a rebuild is already running")
+        return
+    logger.info(f"ANN index picked up {added} books")
+
+
+@shared_task(ignore_result=True)
+def update_trending_task():
+    """Checkpoint the trending counters from UserActivity; web processes pick it up."""
+    try:
+        applied = trending.update_trending()
+    except ArtifactLocked:
+        logger.info("Skipping trending checkpoint: another update is running")
+        return
+    logger.info(f"Trending checkpoint applied {applied} activity rows")
@@ -0,0 +1,28 @@
+import numpy as np
+from scipy import sparse
+
+from apps.recommendations.services.als import _half_step
+from apps.recommendations.services.neighbors import top_k
+
+
+def test_cg_half_step_matches_exact_solve():
+    rng = np.random.default_rng(0)
+    R = sparse.random(50, 30, density=0.1, random_state=rng, format='csr', dtype=np.float32)
+    R.data = np.ceil(R.data * 5)
+    Y = rng.standard_normal((30, 6)).astype(np.float32)
+    alpha, reg = 10.0, 0.1
+
+    X = _half_step(R, Y, np.zeros((50, 6), dtype=np.float32), alpha, reg, cg_steps=10)
+
+    dense = R.toarray()
+    for u in range(50):
+        c = 1 + alpha * dense[u]
+        A = Y.T @ (c[:, None] * Y) + reg * np.eye(6)
+        b = Y.T @ (c * (dense[u] > 0))
+        assert np.allclose(X[u], np.linalg.solve(A, b), atol=1e-3)
+
+
+def test_top_k_returns_best_first():
+    scores = np.array([0.1, 0.9, -np.inf, 0.5, 0.7])
+    assert top_k(scores, 3).tolist() == [1, 4, 3]
+    assert len(top_k(scores, 10)) == 5
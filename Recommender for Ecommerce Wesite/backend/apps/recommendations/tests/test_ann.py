@@ -0,0 +1,93 @@
+import numpy as np
+
+from apps.recommendations.services import als, ann, artifacts
+from apps.recommendations.services.ann import IVFIndex, evaluate
+from apps.recommendations.services.interactions import Interactions
+
+
+def _clustered(n=3000, d=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((30, d))
+    vectors = centers[rng.integers(0, 30, n)] + 0.3 * rng.standard_normal((n, d))
+    return np.arange(1, n + 1), vectors.astype(np.float32)
+
+
+def test_ivf_recall_against_exact_search():
+    ids, vectors = _clustered()
+    index = IVFIndex.build(ids, vectors, n_lists=40)
+    report = evaluate(index, ids, vectors, queries=50, nprobe=8)
+    assert report['recall'] >= 0.9
+
+
+def test_inserted_books_are_searchable_before_and_after_compaction():
+    ids, vectors = _clustered()
+    index = IVFIndex.build(ids, vectors, n_lists=40)
+    new_vector = vectors[0] * 10
+    index.add([99999], new_vector[None, :])
+    assert 99999 in index
+    assert index.search(new_vector, 1, nprobe=8)[0].tolist() == [99999]
+
+    compacted = index.compact()
+    assert len(compacted) == len(ids) + 1
+    assert compacted.search(new_vector, 1, nprobe=8)[0].tolist() == [99999]
+
+
+def test_customers_are_searched_only_in_an_index_of_the_current_model(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    n = 600
+    inter = Interactions(np.arange(1, n + 1), rng.integers(1, 40, n), rng.integers(1, 80, n), rng.integers(0, 4, n))
+    monkeypatch.setattr(artifacts, 'model_dir', lambda: tmp_path)
+    monkeypatch.setattr(als, 'load_training_interactions', lambda: inter)
+    monkeypatch.setattr(als, 'settled_mark', lambda: (n, None))
+    monkeypatch.setattr(ann, 'settled_mark', lambda: (n, None))
+    als.rebuild_als(factors=4, iterations=2)
+    assert ann.add_new_books() == 0  # no index yet
+    ann.rebuild_ann_index(n_lists=4)
+    assert ann.index_for(artifacts.get_artifact(als.ARTIFACT)) is not None
+
+    # retrained while the index could not be rebuilt: exact scoring, not stale vectors
+    rebuild_ann_index = ann.rebuild_ann_index
+    monkeypatch.setattr(ann, 'rebuild_ann_index', lambda: None)
+    als.rebuild_als(factors=4, iterations=2, seed=1)
+    model = artifacts.get_artifact(als.ARTIFACT)
+    assert ann.index_for(model) is None
+    customer = int(model['customer_ids'][0])
+    assert als.recommend_for_customer(customer, 5) == als.score_customer(model, 0, 5)
+
+    # the periodic insert re-indexes from the current model
+    assert ann.add_new_books() == len(model['book_ids'])
+    assert ann.index_for(model) is not None
+
+    # a retrain re-indexes right away
+    monkeypatch.setattr(ann, 'rebuild_ann_index', rebuild_ann_index)
+    als.rebuild_als(factors=4, iterations=2, seed=2)
+    assert ann.index_for(artifacts.get_artifact(als.ARTIFACT)) is not None
+
+
+def test_new_books_are_folded_only_up_to_the_settled_id(tmp_path, monkeypatch):
+    rng = np.random.default_rng(2)
+    n = 600
+    inter = Interactions(np.arange(1, n + 1), rng.integers(1, 40, n), rng.integers(1, 80, n), rng.integers(0, 4, n))
+    # rows 601-620 are for a new book 500; 611-620 are not settled yet
+    late = Interactions(np.arange(n + 1, n + 21), rng.integers(1, 40, 20), np.full(20, 500), np.zeros(20))
+    settled = [n]
+    reads = []
+
+    def load_interactions(after_id, up_to):
+        reads.append((after_id, up_to))
+        return late.through(up_to)
+
+    monkeypatch.setattr(artifacts, 'model_dir', lambda: tmp_path)
+    monkeypatch.setattr(als, 'load_training_interactions', lambda: inter)
+    monkeypatch.setattr(als, 'settled_mark', lambda: (settled[0], None))
+    monkeypatch.setattr(ann, 'settled_mark', lambda: (settled[0], None))
+    monkeypatch.setattr(ann, 'load_interactions', load_interactions)
+    als.rebuild_als(factors=4, iterations=2)
+    ann.rebuild_ann_index(n_lists=4)
+    assert ann.add_new_books() == 0 and reads == []  # nothing settled past the model
+
+    settled[0] = n + 10
+    assert ann.add_new_books() == 1
+    assert reads == [(n, n + 10)]
+    stored = artifacts.get_artifact(ann.ARTIFACT)
+    assert stored.meta['watermark'] == n + 10 and 500 in IVFIndex.from_artifact(stored)
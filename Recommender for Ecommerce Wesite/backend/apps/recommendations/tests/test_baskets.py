@@ -0,0 +1,37 @@
+from itertools import combinations
+
+import numpy as np
+
+from apps.recommendations.services.baskets import mine_rules
+
+
+def _blocks(baskets, block_size=7):
+    def blocks():
+        for s in range(0, len(baskets), block_size):
+            part = baskets[s:s + block_size]
+            rows = np.concatenate([np.full(len(b), i) for i, b in enumerate(part)])
+            yield rows, np.concatenate([np.array(sorted(b)) for b in part])
+    return blocks
+
+
+def test_rules_match_brute_force_counts():
+    rng = np.random.default_rng(0)
+    baskets = [set(rng.choice(12, rng.integers(1, 5), replace=False).tolist()) for _ in range(300)]
+    pair_rules, triple_rules, n = mine_rules(_blocks(baskets), min_support=3, min_confidence=0.0)
+    assert n == 300
+
+    def count(*items):
+        return sum(set(items) <= b for b in baskets)
+
+    for a, c, conf, lift in zip(pair_rules['first'], pair_rules['consequent'],
+                                pair_rules['confidence'], pair_rules['lift']):
+        assert np.isclose(conf, count(a, c) / count(a))
+        assert np.isclose(lift, conf / (count(c) / n))
+    expected = {(a, b, c) for a, b, c in combinations(range(12), 3) if count(a, b, c) >= 3}
+    found = {tuple(sorted((a, b, c))) for a, b, c in
+             zip(triple_rules['first'], triple_rules['second'], triple_rules['consequent'])}
+    assert found == expected
+    for a, b, c, conf in zip(triple_rules['first'], triple_rules['second'],
+                             triple_rules['consequent'], triple_rules['confidence']):
+        assert a < b
+        assert np.isclose(conf, count(a, b, c) / count(a, b))
@@ -0,0 +1,24 @@
+import numpy as np
+
+from apps.recommendations.services.als import score_customer
+from apps.recommendations.services.artifacts import Artifact
+from apps.recommendations.services.batch import top_n_block
+
+
+def test_block_scoring_matches_per_customer_scoring():
+    rng = np.random.default_rng(0)
+    n_customers, n_books = 40, 60
+    seen = [np.sort(rng.choice(n_books, rng.integers(0, 10), replace=False)) for _ in range(n_customers)]
+    artifact = Artifact(None, {
+        'user_factors': rng.standard_normal((n_customers, 8)).astype(np.float32),
+        'item_factors': rng.standard_normal((n_books, 8)).astype(np.float32),
+        'book_ids': np.arange(100, 100 + n_books, dtype=np.int32),
+        'seen_indptr': np.r_[0, np.cumsum([len(s) for s in seen])].astype(np.int64),
+        'seen_indices': np.concatenate(seen).astype(np.int32),
+    }, {})
+    rows = np.arange(5, 25)
+    book_ids, scores = top_n_block(artifact, rows, 10)
+    for j, row in enumerate(rows):
+        expected = score_customer(artifact, row, 10)
+        assert book_ids[j].tolist() == [bid for bid, _ in expected]
+        np.testing.assert_allclose(scores[j], [s for _, s in expected], rtol=1e-5)
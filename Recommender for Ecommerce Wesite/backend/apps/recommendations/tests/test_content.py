@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from apps.catalog.models import Book
+from apps.recommendations.services import artifacts, content, similar
+from apps.recommendations.services.content import _hash, blocked_topk, book_features, term_matrix, tfidf
+from apps.recommendations.services.neighbors import EMPTY, NeighborTable
+
+ROWS = [
+    (1, 'Dế Mèn phiêu lưu ký', 'Cuộc phiêu lưu của chú dế', 7, 2),
+    (2, 'Dế Mèn phiêu lưu ký (tái bản)', 'Chú dế mèn và những cuộc phiêu lưu', 7, 2),
+    (3, 'Kinh tế học vĩ mô', 'Giáo trình kinh tế', 9, 5),
+    (4, 'Kinh tế học vi mô', 'Giáo trình kinh tế cơ bản', 9, 5),
+]
+
+
+def test_book_features_drop_stopword_unigrams_but_keep_them_in_bigrams():
+    features = book_features('Chiến tranh và hòa bình', None)
+    assert _hash('và') not in features
+    assert features[_hash('tranh_và')] == content.TITLE_WEIGHT
+
+
+def test_tfidf_rows_are_unit_length_and_match_by_content():
+    book_ids, tf, tags = term_matrix(ROWS)
+    df = np.bincount(tf.indices, minlength=content.N_FEATURES)
+    X = tfidf(tf, df, len(book_ids))
+    assert np.allclose(np.asarray(X.multiply(X).sum(axis=1)).ravel(), 1.0)
+    assert tags.tolist() == [[7, 2], [7, 2], [9, 5], [9, 5]]
+    cols, vals = blocked_topk(X, X, 1, tags, tags, self_offset=0, block_size=3)
+    assert book_ids[cols[:, 0]].tolist() == [2, 1, 4, 3]
+    assert (vals[:, 0] > 0).all() and (vals[:, 0] < 1).all()
+
+
+def test_author_and_category_only_reweight_text_candidates(settings):
+    X = sparse.csr_matrix(np.array([
+        [1.0, 0.0, 0.0],
+        [0.9, np.sqrt(1 - 0.81), 0.0],
+        [0.8, 0.0, 0.6],
+        [0.0, 0.0, 1.0],  # same category as the first book, no shared text
+    ], dtype=np.float32))
+    tags = np.array([[1, 1], [2, 2], [3, 1], [4, 1]], dtype=np.int32)
+    cols, vals = blocked_topk(X[:1], X, 3, tags[:1], tags, self_offset=0)
+    assert cols[0].tolist() == [2, 1, EMPTY]
+    assert vals[0, 0] > vals[0, 1] > 0 and vals[0, 2] == 0
+    # only the best text match is a candidate
+    settings.RECOMMENDATIONS = {'CONTENT_CANDIDATES': 1}
+    cols, _ = blocked_topk(X[:1], X, 1, tags[:1], tags, self_offset=0)
+    assert cols[0].tolist() == [1]
+
+
+@pytest.mark.django_db
+def test_new_books_are_merged_into_the_stored_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, 'model_dir', lambda: tmp_path)
+    for book_id, title, description, author_id, category_id in ROWS[:3]:
+        Book.objects.create(BookID=book_id, Title=title, Description=description,
+                            AuthorID=author_id, CategoryID=category_id)
+    content.rebuild_content_similarity(k=2)
+    assert content.add_new_books() == 0
+
+    book_id, title, description, author_id, category_id = ROWS[3]
+    Book.objects.create(BookID=book_id, Title=title, Description=description,
+                        AuthorID=author_id, CategoryID=category_id)
+    assert content.add_new_books() == 1
+    table = NeighborTable.from_artifact(artifacts.load_artifact(content.ARTIFACT))
+    assert table.book_ids.tolist() == [1, 2, 3, 4]
+    # the new book gets its own list and enters the list of its closest book
+    assert table.lookup(4)[0][0] == 3
+    assert table.lookup(3)[0][0] == 4
+    assert content.add_new_books() == 0
+
+
+def test_similar_books_uses_the_first_source_with_results(monkeypatch):
+    monkeypatch.setattr(similar, 'SOURCES', (
+        ('cooccurrence', lambda book_id, limit: []),
+        ('content', lambda book_id, limit: [(book_id + 1, 0.5)][:limit]),
+        ('ann', lambda book_id, limit: [(book_id + 2, 0.9)]),
+    ))
+    assert similar.similar_books(10) == ('content', [(11, 0.5)])
+    monkeypatch.setattr(similar, 'SOURCES', (('cooccurrence', lambda book_id, limit: []),))
+    assert similar.similar_books(10) == (None, [])
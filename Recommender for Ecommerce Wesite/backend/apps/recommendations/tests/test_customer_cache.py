@@ -0,0 +1,45 @@
+import threading
+
+from apps.recommendations.services.customer_cache import RecommendationCache
+
+
+def _cache(max_entries=2, recs=None):
+    done = threading.Event()
+
+    def compute(customer_id):
+        done.set()
+        return 'model-1', recs
+
+    return RecommendationCache(max_entries, compute), done
+
+
+def test_lru_evicts_least_recently_used():
+    cache, _ = _cache()
+    cache.put(1, [(10, 0.5)], 'model-1')
+    cache.put(2, [(20, 0.5)], 'model-1')
+    cache.get(1, 'model-1')
+    cache.put(3, [(30, 0.5)], 'model-1')
+    assert len(cache) == 2
+    assert cache.stats()['evictions'] == 1
+    assert cache.get(2, 'model-1')[0] is None
+
+
+def test_purchase_marks_dirty_and_drops_book_from_refills():
+    cache, done = _cache(recs=[(10, 0.9), (11, 0.8)])
+    cache.put(1, [(10, 0.9), (11, 0.8)], 'model-1')
+    cache.mark_dirty(1, book_id=10)
+    entry, fresh = cache.get(1, 'model-1')
+    assert not fresh
+    assert list(entry.book_ids) == [11]
+
+    assert done.wait(5)
+    cache._executor.shutdown(wait=True)
+    entry, fresh = cache.get(1, 'model-1')
+    assert fresh
+    assert list(entry.book_ids) == [11]
+
+
+def test_new_model_invalidates_entries():
+    cache, _ = _cache()
+    cache.put(1, [(10, 0.9)], 'model-1')
+    assert cache.get(1, 'model-2')[1] is False
@@ -0,0 +1,41 @@
+import math
+
+import numpy as np
+import pytest
+
+from apps.recommendations.services.evaluation import Recommender, ranking_metrics, time_split
+from apps.recommendations.services.interactions import Interactions
+
+
+def test_ranking_metrics():
+    recall, ndcg = ranking_metrics(np.array([5, 1, 7]), np.array([1, 9]), k=3)
+    assert recall == 0.5
+    assert math.isclose(ndcg, (1 / math.log2(3)) / (1 + 1 / math.log2(3)))
+
+
+def test_time_split_keeps_only_new_books_of_known_customers():
+    # (activity, customer, book, action) with times 0..9; the cutoff is 4.5
+    inter = Interactions(
+        np.arange(1, 11),
+        [1, 1, 2, 2, 2, 1, 1, 2, 3, 2],
+        [10, 11, 12, 10, 10, 12, 10, 13, 11, 11],
+        [0] * 10,
+    )
+    split = time_split(inter, np.arange(10.0), test_fraction=0.5)
+    # train: customers 1, 2 x books 10, 11, 12
+    assert split.R.shape == (2, 3)
+    assert (split.n_train, split.n_test) == (5, 5)
+    # kept: customer 1 -> book 12, customer 2 -> book 11; dropped: customer 1 -> book 10
+    # (seen in training), customer 2 -> book 13 (unknown book), customer 3 (unknown customer)
+    assert split.test_rows.tolist() == [0, 1]
+    assert split.relevant(0).tolist() == [2]
+    assert split.relevant(1).tolist() == [1]
+
+
+def test_recommenders_must_implement_the_interface():
+    class Incomplete(Recommender):
+        def fit(self, R):
+            self.R = R
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,64 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pytest
+
+from apps.activities.models import UserActivity
+from apps.activities.services.archive import export_days, write_partition
+from apps.recommendations.services.interactions import (
+    ACTION_CODES, load_archived_interactions, load_interactions,
+)
+
+
+@pytest.fixture
+def archive(tmp_path, settings):
+    settings.ACTIVITY_INGEST = {'ARCHIVE_DIR': str(tmp_path)}
+    return tmp_path
+
+
+def _activity(activity_id, day, action='view', customer_id=1, book_id=1):
+    UserActivity.objects.create(
+        ActivityID=activity_id, CustomerID=customer_id, BookID=book_id, Action=action,
+        ActivityTime=datetime(2026, 1, day, 12, tzinfo=timezone.utc),
+    )
+
+
+@pytest.mark.django_db
+def test_archived_actions_are_remapped_to_action_codes(archive):
+    # a file vocabulary in a different order, with an action that has no code
+    write_partition(date(2026, 1, 1), {
+        'activity_id': np.array([1, 2, 3], np.int64),
+        'customer_id': np.array([7, 7, 8], np.int32),
+        'book_id': np.array([10, 11, 12], np.int32),
+        'action': np.array([0, 1, 2], np.uint8),
+        'ts': np.zeros(3, np.int64),
+        'session': np.full(3, -1, np.int32),
+        'actions': np.array(['purchase', 'wishlist', 'view']),
+        'sessions': np.empty(0, dtype='U1'),
+        'high_id': np.array(3, np.int64),
+    }, archive)
+    inter = load_archived_interactions()
+    assert inter.activity_id.tolist() == [1, 3]
+    assert inter.action.tolist() == [ACTION_CODES['purchase'], ACTION_CODES['view']]
+    assert inter.book_id.tolist() == [10, 12]
+    assert inter.max_activity_id == 3
+
+
+@pytest.mark.django_db
+def test_rows_the_archive_misses_are_read_from_the_database(archive):
+    for activity_id, day in [(1, 1), (2, 2), (3, 3), (4, 1)]:
+        _activity(activity_id, day, book_id=activity_id)
+    # day 2 failed to export
+    export_days(date(2026, 1, 1), date(2026, 1, 2))
+    export_days(date(2026, 1, 3), date(2026, 1, 4))
+    # a client-dated row backfilled into an archived day, and one for today
+    _activity(5, 1, action='purchase', book_id=5)
+    _activity(6, 9, book_id=6)
+
+    inter = load_archived_interactions()
+    expected = load_interactions()
+    assert sorted(inter.activity_id.tolist()) == [1, 2, 3, 4, 5, 6]
+    order = np.argsort(inter.activity_id)
+    assert inter.book_id[order].tolist() == expected.book_id.tolist()
+    assert inter.action[order].tolist() == expected.action.tolist()
+    assert inter.max_activity_id == 6
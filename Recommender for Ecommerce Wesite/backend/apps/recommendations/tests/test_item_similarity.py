@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from apps.recommendations import tasks
+from apps.recommendations.services import artifacts, item_similarity
+from apps.recommendations.services.artifacts import ArtifactLocked
+from apps.recommendations.services.interactions import Interactions, extend_matrix, interaction_matrix
+from apps.recommendations.services.item_similarity import cooccurrence_topk
+from apps.recommendations.services.neighbors import EMPTY, NeighborTable, topk_per_row
+
+
+def test_topk_per_row_orders_and_pads():
+    S = sparse.csr_matrix(np.array([
+        [0.0, 0.5, 0.9, 0.1],
+        [0.0, 0.0, 0.0, 0.0],
+        [0.3, 0.0, 0.0, 0.0],
+    ]))
+    cols, vals = topk_per_row(S, 2)
+    assert cols.tolist() == [[2, 1], [EMPTY, EMPTY], [0, EMPTY]]
+    assert np.allclose(vals, [[0.9, 0.5], [0, 0], [0.3, 0]])
+
+
+def test_cooccurrence_topk_matches_dense_cosine():
+    rng = np.random.default_rng(7)
+    X = sparse.random(60, 25, density=0.2, random_state=rng, format='csr', dtype=np.float32)
+    cols, vals = cooccurrence_topk(X, k=5, block_size=7)
+
+    D = (X.T @ X).toarray()
+    norms = np.sqrt(np.diag(D))
+    norms[norms == 0] = 1.0
+    S = D / np.outer(norms, norms)
+    np.fill_diagonal(S, 0)
+    expected = -np.sort(-S, axis=1)[:, :5]
+    assert np.allclose(vals, expected, atol=1e-5)
+
+
+def test_neighbor_table_lookup_and_update():
+    table = NeighborTable(
+        np.array([10, 20], dtype=np.int32),
+        np.array([[20, EMPTY], [10, EMPTY]], dtype=np.int32),
+        np.array([[0.5, 0], [0.5, 0]], dtype=np.float32),
+    )
+    assert table.lookup(10) == [(20, 0.5)]
+    assert table.lookup(99) == []
+
+    table = table.update([15], np.array([[10, 20]]), np.array([[0.8, 0.2]]))
+    assert table.book_ids.tolist() == [10, 15, 20]
+    assert table.lookup(15, limit=1) == [(10, pytest.approx(0.8))]
+
+
+
+def _interactions(rows):
+    return Interactions.from_rows(np.array(rows, dtype=np.int64).reshape(-1, 4))
+
+
+def test_incremental_update_matches_full_rebuild(tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    rows = [(i + 1, c, b, a) for i, (c, b, a) in enumerate(zip(
+        rng.integers(1, 30, 400).tolist(), rng.integers(1, 40, 400).tolist(), rng.integers(0, 4, 400).tolist(),
+    ))]
+    settled = [250]
+    monkeypatch.setattr(artifacts, 'model_dir', lambda: tmp_path)
+    monkeypatch.setattr(item_similarity, 'settled_mark', lambda: (settled[0], None))
+    monkeypatch.setattr(item_similarity, 'load_training_interactions', lambda: _interactions(rows[:300]))
+    monkeypatch.setattr(item_similarity, 'load_interactions',
+                        lambda after_id, up_to: _interactions(rows[after_id:up_to]))
+    # rows 251-300 are visible but not settled: the rebuild stops before them
+    item_similarity.rebuild_similar_books(k=5)
+    assert artifacts.load_artifact(item_similarity.ARTIFACT).meta['watermark'] == 250
+    settled[0] = 400
+    refreshed = item_similarity.update_similar_books()
+    incremental = artifacts.load_artifact(item_similarity.ARTIFACT)
+    assert refreshed > 0 and incremental.meta['watermark'] == 400
+    assert item_similarity.update_similar_books() == 0
+
+    monkeypatch.setattr(item_similarity, 'load_training_interactions', lambda: _interactions(rows))
+    item_similarity.rebuild_similar_books(k=5)
+    full = artifacts.load_artifact(item_similarity.ARTIFACT)
+    for key in ('customer_ids', 'book_ids', 'x_indptr', 'x_indices'):
+        assert np.array_equal(incremental[key], full[key])
+    assert np.allclose(incremental['x_data'], full['x_data'])
+    # every book seen by a customer with new activity has its full-rebuild neighbours
+    new = _interactions(rows[250:])
+    changed = np.unique(_interactions(rows).book_id[np.isin(_interactions(rows).customer_id, new.customer_id)])
+    old_table, new_table = NeighborTable.from_artifact(incremental), NeighborTable.from_artifact(full)
+    for book_id in changed.tolist():
+        assert old_table.lookup(book_id) == pytest.approx(new_table.lookup(book_id))
+
+
+def test_extend_matrix_matches_building_from_all_rows():
+    old = _interactions([(1, 5, 10, 0), (2, 5, 11, 3), (3, 7, 10, 1)])
+    delta = _interactions([(4, 6, 12, 0), (5, 5, 10, 0), (6, 7, 12, 2)])
+    X, customer_ids, book_ids = interaction_matrix(old)
+    X, customer_ids, book_ids, touched = extend_matrix(X, customer_ids, book_ids, delta)
+    full, full_customers, full_books = interaction_matrix(_interactions([
+        (1, 5, 10, 0), (2, 5, 11, 3), (3, 7, 10, 1), (4, 6, 12, 0), (5, 5, 10, 0), (6, 7, 12, 2),
+    ]))
+    assert customer_ids.tolist() == full_customers.tolist() == [5, 6, 7]
+    assert book_ids.tolist() == full_books.tolist() == [10, 11, 12]
+    assert np.allclose(X.toarray(), full.toarray())
+    assert touched.tolist() == [0, 1, 2]
+
+
+def test_update_task_skips_while_locked(monkeypatch):
+    def locked():
+        raise ArtifactLocked('busy')
+    monkeypatch.setattr(tasks, 'update_similar_books', locked)
+    tasks.update_similar_books_task()
@@ -0,0 +1,40 @@
+import numpy as np
+
+from apps.recommendations.services.sessions import TransitionCounter
+
+WEIGHTS = np.ones(4, dtype=np.float32)
+
+
+def _events(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.uniform(0, 50 * 3600, n))
+    sessions = np.array([f"s{i}" for i in rng.integers(0, 60, n)])
+    return sessions, rng.integers(1, 30, n), rng.integers(0, 4, n), seconds
+
+
+def _counts(counter):
+    book_ids, T = counter.matrix()
+    T = T.tocoo()
+    return {(int(book_ids[r]), int(book_ids[c])): float(v) for r, c, v in zip(T.row, T.col, T.data)}
+
+
+def test_chunked_stream_matches_a_single_pass():
+    sessions, books, actions, seconds = _events()
+    whole = TransitionCounter(1800, WEIGHTS)
+    whole.add_chunk(sessions, books, actions, seconds)
+    chunked = TransitionCounter(1800, WEIGHTS)
+    for s in range(0, len(books), 97):
+        chunked.add_chunk(sessions[s:s + 97], books[s:s + 97], actions[s:s + 97], seconds[s:s + 97])
+    assert _counts(chunked) == _counts(whole)
+
+
+def test_transitions_respect_sessions_and_idle_gap():
+    counter = TransitionCounter(1800, WEIGHTS)
+    counter.add_chunk(
+        np.array(["a", "b", "a", "a", "a"]),
+        np.array([1, 9, 2, 2, 3]),
+        np.zeros(5, dtype=np.int64),
+        np.array([0.0, 10.0, 60.0, 120.0, 4000.0]),
+    )
+    # b is another session, 2 -> 2 is a repeat, 2 -> 3 is after the idle gap
+    assert _counts(counter) == {(1, 2): 1.0}
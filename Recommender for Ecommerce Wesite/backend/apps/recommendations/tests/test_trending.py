@@ -0,0 +1,66 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from apps.activities.models import UserActivity
+from apps.recommendations.services import artifacts, trending
+from apps.recommendations.services.trending import TrendingCounters, _covered
+
+HOUR = 3600.0
+TAU = HOUR / math.log(2)  # one-hour half-life
+
+
+def test_recent_activity_outranks_older_activity():
+    counters = TrendingCounters(landmark=0.0, tau=TAU, top_n=10)
+    counters.add(1, 7, 3.0, ts=0.0)
+    counters.add(2, 7, 1.0, ts=3 * HOUR)
+    ranked = counters.top(7, now=3 * HOUR)
+    assert [bid for bid, _ in ranked] == [2, 1]
+    assert math.isclose(ranked[1][1], 3.0 / 8)
+
+
+def test_top_lists_are_capped_and_match_a_rebuild_from_arrays():
+    rng = np.random.default_rng(0)
+    counters = TrendingCounters(landmark=0.0, tau=TAU, top_n=5)
+    for book, ts in zip(rng.integers(1, 40, 500).tolist(), np.sort(rng.uniform(0, 200 * HOUR, 500)).tolist()):
+        counters.add(book, book % 3, 1.0, ts)
+    ids = np.array(sorted(counters.scores))
+    rebuilt = TrendingCounters.from_arrays(
+        ids, np.array([counters.scores[b] for b in ids]), ids % 3, counters.landmark, TAU, 5,
+    )
+    for category in (None, 0, 1, 2):
+        assert len(counters.top(category)) == 5
+        assert counters.top(category, now=0) == rebuilt.top(category, now=0)
+
+
+@pytest.mark.django_db
+def test_update_trending_waits_for_late_commits_below_the_settled_id(tmp_path, monkeypatch):
+    now = datetime.now(timezone.utc)
+    settled = [(2, now)]
+    monkeypatch.setattr(artifacts, 'model_dir', lambda: tmp_path)
+    monkeypatch.setattr(trending, 'settled_mark', lambda: settled[0])
+    for activity_id in (1, 2, 4):
+        UserActivity.objects.create(ActivityID=activity_id, CustomerID=1, BookID=activity_id,
+                                    Action='view', ActivityTime=now - timedelta(minutes=5))
+    assert trending.update_trending() == 2
+    checkpoint = artifacts.load_artifact(trending.ARTIFACT)
+    assert checkpoint.meta['watermark'] == 2 and checkpoint.meta['covered_at'] == now.timestamp()
+    assert trending.update_trending() == 0  # nothing settled past the watermark
+
+    # id 3 commits after 4 was visible; it is still folded in once settled
+    UserActivity.objects.create(ActivityID=3, CustomerID=1, BookID=3, Action='view', ActivityTime=now)
+    settled[0] = (4, now + timedelta(seconds=30))
+    assert trending.update_trending() == 2
+    assert sorted(artifacts.load_artifact(trending.ARTIFACT)['book_ids'].tolist()) == [1, 2, 3, 4]
+
+
+def test_journal_events_without_an_id_are_kept_until_covered():
+    meta = {'watermark': 10, 'covered_at': 1000.0}
+    assert _covered((10, 5000.0), meta)
+    assert not _covered((11, 0.0), meta)
+    # buffered or bulk events: by when they were logged
+    assert _covered((None, 999.0), meta)
+    assert not _covered((None, 1000.0), meta)
+    assert not _covered((None, 0.0), {'watermark': 10, 'covered_at': None})
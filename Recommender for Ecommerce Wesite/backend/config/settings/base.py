@@ -95,7 +95,8 @@ REST_FRAMEWORK = {
     "rest_framework.authentication.SessionAuthentication",
   ],
   "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
-  "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+  # ?page=N by default; ?cursor= switches a list to keyset pages (apps/common/pagination.py)
+  "DEFAULT_PAGINATION_CLASS": "apps.common.pagination.PageNumberOrKeysetPagination",
   "PAGE_SIZE": 20,
 }
 
@@ -151,3 +152,144 @@ if PAYMENT_GATEWAY['SANDBOX_MODE']:
         'FORCE_SUCCESS': os.getenv('PAYMENT_FORCE_SUCCESS', '0') == '1',  # For testing
         'LOG_ALL_REQUESTS': os.getenv('PAYMENT_LOG_REQUESTS', '1') == '1',
     })
+
+# 'default' is Django's own default. 'conditional' holds the catalog change counters
+# behind the ETags of the catalog endpoints (apps/common/conditional.py), so it must
+# be shared by every worker process on the host
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'conditional': {
+        'BACKEND': os.getenv('CONDITIONAL_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CONDITIONAL_CACHE_LOCATION', str(BASE_DIR / 'var' / 'conditional_cache')),
+    },
+}
+
+# Recommendation engine settings
+RECOMMENDATIONS = {
+    # Directory holding precomputed model artifacts (.npy files + meta.json)
+    'MODEL_DIR': os.getenv('RECOMMENDER_MODEL_DIR', str(BASE_DIR / 'var' / 'recommender')),
+    # Implicit-feedback weight of each UserActivity.Action
+    'ACTION_WEIGHTS': {'view': 1.0, 'add_to_cart': 3.0, 'checkout': 4.0, 'purchase': 5.0},
+    # Neighbours stored per book in the precomputed similarity table
+    'SIMILAR_TOP_K': int(os.getenv('RECOMMENDER_SIMILAR_TOP_K', '50')),
+    # Rows fetched per round trip when streaming UserActivity
+    'READ_CHUNK_SIZE': int(os.getenv('RECOMMENDER_READ_CHUNK_SIZE', '50000')),
+    # Item rows scored per sparse matrix product (bounds peak memory)
+    'SIMILARITY_BLOCK_SIZE': int(os.getenv('RECOMMENDER_SIMILARITY_BLOCK_SIZE', '2048')),
+    # Content neighbours: books kept per row by text similarity before the author/category re-weighting
+    'CONTENT_CANDIDATES': int(os.getenv('RECOMMENDER_CONTENT_CANDIDATES', '200')),
+    # Implicit ALS hyper-parameters (confidence = 1 + ALS_ALPHA * weight)
+    'ALS_FACTORS': int(os.getenv('RECOMMENDER_ALS_FACTORS', '64')),
+    'ALS_ITERATIONS': int(os.getenv('RECOMMENDER_ALS_ITERATIONS', '15')),
+    'ALS_REGULARIZATION': float(os.getenv('RECOMMENDER_ALS_REGULARIZATION', '0.1')),
+    'ALS_ALPHA': float(os.getenv('RECOMMENDER_ALS_ALPHA', '10')),
+    # Inverted lists scanned per ANN query (recall vs. latency)
+    'ANN_NPROBE': int(os.getenv('RECOMMENDER_ANN_NPROBE', '16')),
+    # Per-customer "for you" cache: max customers held (LRU) and books per entry
+    'CUSTOMER_CACHE_SIZE': int(os.getenv('RECOMMENDER_CUSTOMER_CACHE_SIZE', '100000')),
+    'CUSTOMER_CACHE_TOP_N': int(os.getenv('RECOMMENDER_CUSTOMER_CACHE_TOP_N', '50')),
+    # Trending: half-life of an activity's contribution, and books kept per category list
+    'TRENDING_HALF_LIFE_HOURS': float(os.getenv('RECOMMENDER_TRENDING_HALF_LIFE_HOURS', '24')),
+    'TRENDING_TOP_N': int(os.getenv('RECOMMENDER_TRENDING_TOP_N', '100')),
+    # Session model: idle gap that splits a SessionID into visits, and items blended per query
+    'SESSION_GAP_MINUTES': float(os.getenv('RECOMMENDER_SESSION_GAP_MINUTES', '30')),
+    'SESSION_CONTEXT': int(os.getenv('RECOMMENDER_SESSION_CONTEXT', '3')),
+    # Bought-together rules: minimum baskets containing an itemset, minimum rule confidence
+    'BASKET_MIN_SUPPORT': int(os.getenv('RECOMMENDER_BASKET_MIN_SUPPORT', '5')),
+    'BASKET_MIN_CONFIDENCE': float(os.getenv('RECOMMENDER_BASKET_MIN_CONFIDENCE', '0.05')),
+    # Full rebuilds train from 'db' (UserActivity) or 'archive' (export_activity_archive files)
+    'INTERACTIONS_SOURCE': os.getenv('RECOMMENDER_INTERACTIONS_SOURCE', 'db'),
+}
+
+# Activity logging: 'sync' inserts inside the request; 'buffered' enqueues and a
+# background thread bulk-inserts every BATCH_SIZE events or FLUSH_INTERVAL seconds
+ACTIVITY_INGEST = {
+    'MODE': os.getenv('ACTIVITY_INGEST_MODE', 'sync'),
+    'QUEUE_SIZE': int(os.getenv('ACTIVITY_INGEST_QUEUE_SIZE', '10000')),
+    'BATCH_SIZE': int(os.getenv('ACTIVITY_INGEST_BATCH_SIZE', '500')),
+    'FLUSH_INTERVAL': float(os.getenv('ACTIVITY_INGEST_FLUSH_INTERVAL', '1.0')),
+    # POST /activities/bulk/: events accepted per request, rows per multi-row INSERT
+    'BULK_MAX_EVENTS': int(os.getenv('ACTIVITY_BULK_MAX_EVENTS', '20000')),
+    'BULK_CHUNK_SIZE': int(os.getenv('ACTIVITY_BULK_CHUNK_SIZE', '1000')),
+    # Columnar day files written by export_activity_archive, read by offline training
+    'ARCHIVE_DIR': os.getenv('ACTIVITY_ARCHIVE_DIR', str(BASE_DIR / 'var' / 'activity_archive')),
+    # Repeats of (customer, book, action) within DEDUPE_WINDOW seconds are not written (0 disables)
+    'DEDUPE_WINDOW': float(os.getenv('ACTIVITY_DEDUPE_WINDOW', '10')),
+    'DEDUPE_ACTIONS': tuple(os.getenv('ACTIVITY_DEDUPE_ACTIONS', 'view').split(',')),
+    'DEDUPE_MAX_KEYS': int(os.getenv('ACTIVITY_DEDUPE_MAX_KEYS', '100000')),
+    # Spool: events go to local segment files while inserts fail or exceed the latency
+    # budget (SLOW_LIMIT times in a row); replay_activity_spool drains them back
+    'SPOOL_DIR': os.getenv('ACTIVITY_SPOOL_DIR', str(BASE_DIR / 'var' / 'activity_spool')),
+    'SPOOL_LATENCY_BUDGET_MS': float(os.getenv('ACTIVITY_SPOOL_LATENCY_BUDGET_MS', '250')),
+    'SPOOL_COOLDOWN': float(os.getenv('ACTIVITY_SPOOL_COOLDOWN', '30')),
+    'SPOOL_FSYNC_INTERVAL': float(os.getenv('ACTIVITY_SPOOL_FSYNC_INTERVAL', '0.5')),
+    'SPOOL_SEGMENT_BYTES': int(os.getenv('ACTIVITY_SPOOL_SEGMENT_BYTES', str(4 * 1024 * 1024))),
+    # Incremental readers of UserActivity (rollups, similarity, ANN, trending) fold only
+    # ActivityIDs that were visible this long ago, so rows committing after a higher id
+    # are not skipped (see apps/activities/services/watermarks.py)
+    'SETTLE_SECONDS': float(os.getenv('ACTIVITY_SETTLE_SECONDS', '30')),
+}
+
+# Book search: BM25 over an inverted index of Title + Description (see
+# apps/catalog/services/search_index.py); LIKE search is used until it is built
+CATALOG_SEARCH = {
+    'ENABLED': os.getenv('CATALOG_SEARCH_ENABLED', '1') == '1',
+    # A title occurrence counts as this many description occurrences
+    'TITLE_BOOST': float(os.getenv('CATALOG_SEARCH_TITLE_BOOST', '3')),
+    # Ranked hits handed to the queryset (and paginated) per search
+    'MAX_RESULTS': int(os.getenv('CATALOG_SEARCH_MAX_RESULTS', '1000')),
+    'BM25_K1': float(os.getenv('CATALOG_SEARCH_BM25_K1', '1.2')),
+    'BM25_B': float(os.getenv('CATALOG_SEARCH_BM25_B', '0.75')),
+    # Typos tolerated per query word when nothing matches exactly (words of 3-5 letters get one)
+    'FUZZY_MAX_DISTANCE': int(os.getenv('CATALOG_SEARCH_FUZZY_MAX_DISTANCE', '2')),
+    # Autocomplete ranks books by action-weighted activity over this many days
+    'AUTOCOMPLETE_POPULARITY_DAYS': int(os.getenv('CATALOG_AUTOCOMPLETE_POPULARITY_DAYS', '30')),
+    # Facets (apps/catalog/services/facets.py): lower edges of the price bands (VND),
+    # values listed per facet, and the largest match sent to SQL as a BookID IN list
+    'FACET_PRICE_BANDS': tuple(int(x) for x in os.getenv(
+        'CATALOG_FACET_PRICE_BANDS', '0,50000,100000,200000,500000').split(',')),
+    'FACET_TOP_VALUES': int(os.getenv('CATALOG_FACET_TOP_VALUES', '20')),
+    'FACET_MAX_IN_IDS': int(os.getenv('CATALOG_FACET_MAX_IN_IDS', '5000')),
+}
+
+# Celery beat: incremental recommendation model updates between full rebuilds
+CELERY_BEAT_SCHEDULE = {
+    'update-similar-books': {
+        'task': 'apps.recommendations.tasks.update_similar_books_task',
+        'schedule': float(os.getenv('RECOMMENDER_UPDATE_INTERVAL_SECONDS', '300')),
+    },
+    'content-model-new-books': {
+        'task': 'apps.recommendations.tasks.add_new_books_to_content_model_task',
+        'schedule': float(os.getenv('RECOMMENDER_UPDATE_INTERVAL_SECONDS', '300')),
+    },
+    'ann-index-new-books': {
+        'task': 'apps.recommendations.tasks.add_new_books_to_ann_index_task',
+        'schedule': float(os.getenv('RECOMMENDER_UPDATE_INTERVAL_SECONDS', '300')),
+    },
+    'trending-checkpoint': {
+        'task': 'apps.recommendations.tasks.update_trending_task',
+        'schedule': float(os.getenv('RECOMMENDER_UPDATE_INTERVAL_SECONDS', '300')),
+    },
+    'activity-rollups': {
+        'task': 'apps.activities.tasks.update_rollups_task',
+        'schedule': float(os.getenv('ACTIVITY_ROLLUP_INTERVAL_SECONDS', '60')),
+    },
+    'activity-spool-replay': {
+        'task': 'apps.activities.tasks.replay_activity_spool_task',
+        'schedule': float(os.getenv('ACTIVITY_SPOOL_REPLAY_INTERVAL_SECONDS', '30')),
+    },
+    'activity-archive': {
+        'task': 'apps.activities.tasks.export_activity_archive_task',
+        'schedule': 3600.0,
+    },
+    'catalog-search-index': {
+        'task': 'apps.catalog.tasks.rebuild_search_index_task',
+        'schedule': float(os.getenv('CATALOG_SEARCH_REBUILD_INTERVAL_SECONDS', '3600')),
+    },
+    'catalog-autocomplete': {
+        'task': 'apps.catalog.tasks.rebuild_autocomplete_task',
+        'schedule': float(os.getenv('CATALOG_SEARCH_REBUILD_INTERVAL_SECONDS', '3600')),
+    },
+}
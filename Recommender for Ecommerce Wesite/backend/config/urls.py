@@ -17,6 +17,7 @@ urlpatterns = [
     # path("api/v1/cart/", include("apps.cart.api.v1.urls")),
     path("api/v1/orders/", include("apps.orders.api.v1.urls")),
     path("api/v1/payments/", include("apps.payments.api.v1.urls")),
+    path("api/v1/recommendations/", include("apps.recommendations.api.v1.urls")),
     
     # CSRF endpoint
     path("api/csrf/", ensure_csrf_cookie(csrf_view), name="csrf"),
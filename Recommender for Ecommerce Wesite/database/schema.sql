@@ -47,6 +47,9 @@ CREATE TABLE IF NOT EXISTS book (
     CategoryID INT,
     Description TEXT,
     ImageURL VARCHAR(500),
+    -- keyset pagination by ?ordering= (InnoDB appends BookID to secondary indexes)
+    INDEX idx_book_title (Title),
+    INDEX idx_book_price (Price),
     FOREIGN KEY (AuthorID) REFERENCES author(AuthorID),
     FOREIGN KEY (PublisherID) REFERENCES publisher(PublisherID),
     FOREIGN KEY (CategoryID) REFERENCES category(CategoryID)
@@ -74,6 +77,7 @@ CREATE TABLE IF NOT EXISTS orders (
     OrderDate DATETIME DEFAULT CURRENT_TIMESTAMP,
     TotalAmount DECIMAL(10,2) NOT NULL,
     Status VARCHAR(50) DEFAULT 'Pending', -- Pending, Paid, Shipped, Cancelled
+    INDEX idx_orders_customer_date (CustomerID, OrderDate),
     FOREIGN KEY (CustomerID) REFERENCES customer(CustomerID)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -113,6 +117,53 @@ CREATE TABLE IF NOT EXISTS useractivity (
     Action ENUM('view', 'add_to_cart', 'checkout', 'purchase') NOT NULL,
     ActivityTime DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     SessionID VARCHAR(50),
+    INDEX idx_useractivity_time (ActivityTime),
     FOREIGN KEY (CustomerID) REFERENCES customer(CustomerID),
     FOREIGN KEY (BookID) REFERENCES book(BookID)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ========================
+-- 10. Bảng gợi ý sách tính sẵn cho từng khách hàng (build_recommendations)
+-- ========================
+CREATE TABLE IF NOT EXISTS customerrecommendation (
+    RecommendationID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    CustomerID INT NOT NULL,
+    Position SMALLINT NOT NULL,
+    BookID INT NOT NULL,
+    Score FLOAT,
+    Source VARCHAR(20) NOT NULL,   -- als, popular
+    GeneratedAt DATETIME NOT NULL,
+    UNIQUE KEY uq_customerrecommendation (CustomerID, Position),
+    FOREIGN KEY (CustomerID) REFERENCES customer(CustomerID),
+    FOREIGN KEY (BookID) REFERENCES book(BookID)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ========================
+-- 11. Bảng tổng hợp hoạt động theo giờ / theo ngày (update_rollups)
+-- ========================
+CREATE TABLE IF NOT EXISTS activityrollup_hourly (
+    RollupID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    BookID INT NOT NULL,
+    Action VARCHAR(20) NOT NULL,
+    BucketStart DATETIME NOT NULL,   -- UTC, truncated to the hour
+    EventCount INT NOT NULL,
+    UNIQUE KEY uq_activityrollup_hourly (BookID, Action, BucketStart),
+    INDEX idx_activityrollup_hourly_bucket (BucketStart)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS activityrollup_daily (
+    RollupID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    BookID INT NOT NULL,
+    Action VARCHAR(20) NOT NULL,
+    BucketDate DATE NOT NULL,        -- UTC day
+    EventCount INT NOT NULL,
+    UNIQUE KEY uq_activityrollup_daily (BookID, Action, BucketDate),
+    INDEX idx_activityrollup_daily_bucket (BucketDate)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Vị trí (ActivityID) đã xử lý của từng job ETL
+CREATE TABLE IF NOT EXISTS etl_watermark (
+    Name VARCHAR(50) PRIMARY KEY,
+    LastID BIGINT NOT NULL DEFAULT 0,
+    UpdatedAt DATETIME
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;